@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module runs several tact configurations as a batch.
+
+The configurations are read from a YAML file of the form:
+
+    base: config.yaml     # path to, or contents of, a configuration file
+    workers: 4            # number of configurations run at once (optional)
+    log_dir: logs/        # directory for one log file per run (optional)
+    configs:              # options overriding the base configuration
+        - channel: ee
+          selection: "Channel == 1"
+        - channel: mumu
+          selection: "Channel == 0"
+    matrix:               # lists of values for options, given as dotted keys
+        classifier: [bdt_xgb, mlp]
+        bdt_xgb.n_estimators: [100, 500]
+
+One run is made for every combination of an entry in configs with a point in
+the matrix. Either may be omitted. If the matrix has several points, the plots,
+ROOT files and classifiers of each are written to a subdirectory of plot_dir,
+root_dir and mva_dir named after its values, e.g.
+plots/bdt_xgb.n_estimators=100,classifier=mlp/. Entries in configs must set
+different channels or output directories themselves.
+
+Input trees are read once in the parent process, before worker processes are
+forked, so that every run shares the same copy of the data and libraries.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import codecs
+import copy
+import itertools
+import multiprocessing
+import os
+import re
+import sys
+import traceback
+from os.path import expanduser
+
+from tact import config, resources
+from tact.util import deep_update
+from yaml import load
+
+try:
+    from yaml import CLoader as Loader
+except ImportError:
+    from yaml import Loader
+
+# Libraries imported before forking if any run uses the classifier
+CLASSIFIER_MODULES = {"mlp": "keras",
+                      "bdt_xgb": "xgboost",
+                      "bdt_lgbm": "lightgbm"}
+
+
+def expand_matrix(matrix):
+    """
+    Expand a matrix of options into a list of configuration overrides.
+
+    Parameters
+    ----------
+    matrix : dict
+        Map from options, with nested options separated by dots (e.g.
+        "mlp.model_params.epochs"), to lists of values.
+
+    Returns
+    -------
+    list of dicts
+        One set of nested options for each combination of values.
+    """
+
+    keys = sorted(matrix)
+    overrides = []
+
+    for values in itertools.product(*(matrix[k] for k in keys)):
+        override = {}
+        for key, value in zip(keys, values):
+            d = override
+            parts = key.split(".")
+            for part in parts[:-1]:
+                d = d.setdefault(part, {})
+            d[parts[-1]] = value
+        overrides.append(override)
+
+    return overrides
+
+
+def _point_name(point, prefix=""):
+    """
+    Name a point of a matrix after its options and values, e.g.
+    "bdt_xgb.n_estimators=100,classifier=mlp", usable as a directory name.
+    """
+
+    parts = []
+    for key in sorted(point):
+        if isinstance(point[key], dict):
+            parts.append(_point_name(point[key], prefix + key + "."))
+        else:
+            parts.append("{}{}={}".format(prefix, key, point[key]))
+
+    return re.sub(r"[^\w.,=+-]", "_", ",".join(parts))
+
+
+def read_batch(f):
+    """
+    Read a batch file.
+
+    Parameters
+    ----------
+    f : file
+        YAML batch file.
+
+    Returns
+    -------
+    cfgs : list of dicts
+        Configuration of each run.
+    workers : int or None
+        Number of runs made at once, if given.
+    log_dir : string or None
+        Directory for run logs, if given.
+    """
+
+    spec = load(f, Loader=Loader)
+
+    base = spec.get("base", {})
+    if not isinstance(base, dict):
+        with open(expanduser(base), 'r') as fb:
+            base = load(fb, Loader=Loader)
+
+    points = expand_matrix(spec.get("matrix") or {})
+
+    cfgs = []
+    for override in spec.get("configs") or [{}]:
+        for point in points:
+            cfg = config.make_config(
+                deep_update(deep_update(copy.deepcopy(base),
+                                        copy.deepcopy(override)), point))
+
+            # Points of the matrix write to their own subdirectories
+            if len(points) > 1:
+                for path_var in ("plot_dir", "root_dir", "mva_dir"):
+                    cfg[path_var] = os.path.join(cfg[path_var],
+                                                 _point_name(point), "")
+
+            cfgs.append(cfg)
+
+    # Runs would overwrite each other's output if these coincide
+    outputs = set()
+    for cfg in cfgs:
+        for output in (("plot", cfg["plot_dir"], cfg["channel"]),
+                       ("root", cfg["root_dir"], cfg["channel"]),
+                       ("mva", cfg["mva_dir"], cfg["classifier"],
+                        cfg["channel"])):
+            if output in outputs:
+                raise ValueError("Several runs write the same output: ",
+                                 output)
+            outputs.add(output)
+
+    log_dir = spec.get("log_dir")
+    if log_dir is not None:
+        log_dir = expanduser(log_dir)
+
+    return cfgs, spec.get("workers"), log_dir
+
+
+def preload(cfgs):
+    """
+    Read the input trees and import the classifier libraries used by a set of
+    runs.
+
+    Parameters
+    ----------
+    cfgs : list of dicts
+        Configuration of each run.
+
+    Returns
+    -------
+    None
+
+    Notes
+    -----
+    Trees are read once for each distinct input directory and selection, with
+    the branches needed by every run using them.
+    """
+
+    from tact import rootIO
+
+    columns = {}
+    for cfg in cfgs:
+        columns.setdefault((cfg["input_dir"], cfg["selection"]), set()) \
+            .update(cfg["features"] + ["EvtWeight"])
+
+    for (input_dir, selection), cols in sorted(columns.items()):
+        print("Preloading trees in", input_dir, "with selection", selection)
+        rootIO.preload_trees(input_dir, cols, selection=selection)
+
+    for module in sorted({CLASSIFIER_MODULES[cfg["classifier"]]
+                          for cfg in cfgs
+                          if cfg["classifier"] in CLASSIFIER_MODULES}):
+        __import__(module)
+
+
+def _run_one(run, cfg, log):
+    """
+    Call run(cfg), writing output to the file log if not None.
+
+    Returns the formatted traceback if run raised an exception, else None.
+    """
+
+    if log is not None:
+        sys.stdout = sys.stderr = codecs.open(log, 'w', 'utf-8',
+                                              'strict', 1)
+
+    try:
+        run(cfg)
+    except Exception:
+        traceback.print_exc()
+        return traceback.format_exc()
+    finally:
+        sys.stdout.flush()
+
+    return None
+
+
+def run_batch(cfgs, run, workers=None, log_dir=None):
+    """
+    Make a run for each configuration using a pool of worker processes.
+
+    Parameters
+    ----------
+    cfgs : list of dicts
+        Configuration of each run.
+    run : callable
+        Function taking a configuration as its argument and performing a
+        run. Must be picklable.
+    workers : int, optional
+        Number of runs made at once. If None, the number of available cores
+        or the number of runs, whichever is smaller.
+    log_dir : string, optional
+        Directory in which the output of each run is written, to a file named
+        after its index and channel. If None, all output goes to stdout.
+
+    Returns
+    -------
+    failed : list of (int, string)
+        Index and traceback of each failed run.
+
+    Notes
+    -----
+    Each run gets a fresh worker process, forked after the inputs have been
+    preloaded. Runs which do not set resources.cores are given an equal share
+    of the available cores.
+    """
+
+    from tact import rootIO
+
+    if workers is None:
+        workers = min(len(cfgs), resources.available_cores())
+    workers = max(1, workers)
+
+    cfgs = copy.deepcopy(cfgs)
+    for cfg in cfgs:
+        if cfg["resources"]["cores"] is None:
+            cfg["resources"]["cores"] = max(
+                1, resources.available_cores() // workers)
+
+    if log_dir is not None:
+        rootIO.makedirs(os.path.join(log_dir, ""))
+
+    preload(cfgs)
+
+    print("Making", len(cfgs), "runs using", workers, "workers")
+
+    pool = multiprocessing.Pool(workers, maxtasksperchild=1)
+    results = []
+    for i, cfg in enumerate(cfgs):
+        log = (None if log_dir is None else os.path.join(
+            log_dir, "{}_{}.log".format(i, cfg["channel"])))
+        results.append(pool.apply_async(_run_one, (run, cfg, log)))
+    pool.close()
+
+    failed = []
+    for i, result in enumerate(results):
+        try:
+            tb = result.get()
+        except Exception:  # worker died, or result could not be pickled
+            tb = traceback.format_exc()
+        if tb is not None:
+            failed.append((i, tb))
+        print("Run {} (channel {}, classifier {}) {}".format(
+            i, cfgs[i]["channel"], cfgs[i]["classifier"],
+            "failed" if tb else "finished"))
+
+    pool.join()
+
+    for i, tb in failed:
+        print("Run", i, "failed:", file=sys.stderr)
+        print(tb, file=sys.stderr)
+
+    return failed
@@ -9,9 +9,13 @@ in particular recursive binning algorithms.
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+from collections import namedtuple
+
 import numpy as np
 from tact import util
 
+FlatKMeansTree = namedtuple("FlatKMeansTree", "centers left right")
+
 
 def _meets_num_threshold(xw, cat, s_num_thresh=1, b_num_thresh=1,
                          s_err_thresh=0.3, b_err_thresh=0.3):
@@ -45,6 +49,45 @@ def _meets_num_threshold(xw, cat, s_num_thresh=1, b_num_thresh=1,
         or (xw[cat == 1] ** 2).sum() ** 0.5 / sums > b_err_thresh
 
 
+def _cumulative_sums(x, cat, xw):
+    """
+    Sort x, returning it along with the cumulative sums of signal weights,
+    squared signal weights, background weights, and squared background
+    weights in that order. Each cumulative sum starts with a zero, so that the
+    sum over the sorted events [i, j) is c[j] - c[i].
+    """
+
+    idx = np.argsort(np.asarray(x))
+    xs = np.asarray(x)[idx]
+    w = np.asarray(xw, dtype=np.float64)[idx]
+    cat = np.asarray(cat)[idx]
+
+    cumsums = []
+    for label in (1, 0):
+        wl = np.where(cat == label, w, 0)
+        for p in (1, 2):
+            cumsums.append(np.concatenate(([0.], np.cumsum(wl ** p))))
+
+    return xs, cumsums
+
+
+def _range_meets_threshold(cumsums, i, j, s_num_thresh=1, b_num_thresh=1,
+                           s_err_thresh=0.3, b_err_thresh=0.3):
+    """
+    Equivalent to _meets_num_threshold for the sorted events [i, j), given the
+    cumulative sums returned by _cumulative_sums. i and j may be arrays, in
+    which case an array is returned.
+    """
+
+    sums, sums2, sumb, sumb2 = (c[j] - c[i] for c in cumsums)
+
+    # Guard against rounding making sums of squares slightly negative
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (sumb < b_num_thresh) | (sums < s_num_thresh) \
+            | (np.sqrt(np.maximum(sumb2, 0)) / sumb > s_err_thresh) \
+            | (np.sqrt(np.maximum(sums2, 0)) / sums > b_err_thresh)
+
+
 def _recursive_median_tree(x, cat, xw=None, s_num_thresh=1, b_num_thresh=1,
                            s_err_thresh=0.3, b_err_thresh=0.3):
     """
@@ -74,31 +117,48 @@ def _recursive_median_tree(x, cat, xw=None, s_num_thresh=1, b_num_thresh=1,
     Returns
     -------
     BinaryTree
-        BinaryTree containing subsample medians.
+        BinaryTree containing subsample medians. Empty if the sample is not
+        split.
+
+    Notes
+    -----
+    x is sorted once, after which every subsample is a contiguous range of
+    the sorted events. Its median is then found by indexing, and the sums of
+    weights needed by the thresholds from cumulative sums, so each split
+    costs O(log N). Subsamples are split in a loop rather than recursively.
     """
 
     if xw is None:
         xw = np.ones(len(x))
 
-    median = np.median(x)
-    mask = (x < median)
-
-    if _meets_num_threshold(
-            xw[mask], cat[mask], s_num_thresh, b_num_thresh,
-            s_err_thresh, b_err_thresh) or \
-            _meets_num_threshold(
-                xw[~mask], cat[~mask], s_num_thresh, b_num_thresh,
-                s_err_thresh, b_err_thresh):
-        return None
+    xs, cumsums = _cumulative_sums(x, cat, xw)
 
     tree = util.BinaryTree()
-    tree.val = median
-    tree.left = _recursive_median_tree(x[mask], cat[mask], xw[mask],
-                                       s_num_thresh, b_num_thresh,
-                                       s_err_thresh, b_err_thresh)
-    tree.right = _recursive_median_tree(x[~mask], cat[~mask], xw[~mask],
-                                        s_num_thresh, b_num_thresh,
-                                        s_err_thresh, b_err_thresh)
+    stack = [(0, len(xs), None, False)]
+
+    while stack:
+        i, j, parent, right = stack.pop()
+        n = j - i
+
+        if n == 0:
+            continue
+
+        # Subsamples are sorted, so the median is the middle event or the mean
+        # of the middle two
+        median = np.mean(xs[i + (n - 1) // 2:i + n // 2 + 1])
+        split = i + np.searchsorted(xs[i:j], median, side="left")
+
+        if _range_meets_threshold(cumsums, i, split, s_num_thresh,
+                                  b_num_thresh, s_err_thresh,
+                                  b_err_thresh) or \
+                _range_meets_threshold(cumsums, split, j, s_num_thresh,
+                                       b_num_thresh, s_err_thresh,
+                                       b_err_thresh):
+            continue
+
+        node = tree.add(median, parent, right)
+        stack.append((split, j, node, True))
+        stack.append((i, split, node, False))
 
     return tree
 
@@ -139,12 +199,250 @@ def recursive_median(x, cat, xw=None, s_num_thresh=1, b_num_thresh=1,
     tree = _recursive_median_tree(x, cat, xw, s_num_thresh, b_num_thresh,
                                   s_err_thresh, b_err_thresh)
 
+    # Medians of lower subsamples are in left subtrees
     bins = ([np.min(x)] +
-            sorted(m for m in util.nodes(tree) if m is not None) +
+            tree.inorder() +
             [np.max(x)])
     return bins
 
 
+def squared_significance(s, b, kind="asimov"):
+    """
+    Compute the figure of merit of bins containing s signal and b background
+    events.
+
+    Parameters
+    ----------
+    s, b : array-like
+        Signal and background yield of each bin.
+    kind : "asimov" or "s_sqrt_b", optional
+        Figure of merit
+            asimov: square of the Asimov significance,
+                    2 ((s + b) ln(1 + s / b) - s) (default).
+            s_sqrt_b: s ** 2 / b.
+
+    Returns
+    -------
+    array
+        Figure of merit of each bin, -inf where b <= 0 or it is undefined.
+        Summing over bins gives the square of the combined significance.
+    """
+
+    s = np.asarray(s, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if kind == "asimov":
+            fom = 2 * ((s + b) * np.log1p(s / b) - s)
+        elif kind == "s_sqrt_b":
+            fom = s ** 2 / b
+        else:
+            raise ValueError("Unrecognised figure of merit: ", kind)
+
+    return np.where((b > 0) & ~np.isnan(fom), fom, -np.inf)
+
+
+def optimal(x, cat, xw=None, bins=20, fine_bins=200, range=(0, 1),
+            figure_of_merit="asimov", s_num_thresh=1, b_num_thresh=1,
+            s_err_thresh=0.3, b_err_thresh=0.3):
+    """
+    Find the binning maximising the combined significance.
+
+    The data are first histogrammed in fine_bins equal-width bins. Bins of the
+    result are formed from adjacent fine bins, choosing the partition which
+    maximises the summed figure of merit out of those with at most the given
+    number of bins, each meeting the same thresholds as the recursive binning
+    algorithms.
+
+    Parameters
+    ----------
+    x : array-like, shape=N
+        Data to be binned.
+    cat : 1D array, shape=N
+        Array containing labels describing whether an entry is signal (1 or
+        True) or background (0 or False).
+    xw : array-like, shape=N, optional
+        Weights for samples in x. If None, equal weights are used.
+    bins : int, optional
+        Maximum number of bins.
+    fine_bins : int, optional
+        Number of bins in the initial histogram. Bin edges are chosen from
+        its edges.
+    range : (float, float), optional
+        Lower and upper range of the bins.
+    figure_of_merit : "asimov" or "s_sqrt_b", optional
+        Figure of merit of each bin, see squared_significance.
+    s_num_thresh, b_num_thresh, float, optional
+        Minimum number of samples in a bin in signal or background.
+    s_err_thresh, b_err_thresh, float, optional
+        Maximum percentage error in a bin in signal or background.
+
+    Returns
+    -------
+    bins : array
+        Array of bin edges, including range[0] and range[1]. If no binning
+        meets the thresholds, only these are returned.
+
+    Notes
+    -----
+    The best binning is found by dynamic programming over the fine bin edges,
+    in O(fine_bins ** 2 * bins) time independent of N.
+    """
+
+    if xw is None:
+        xw = np.ones(len(x))
+
+    x = np.asarray(x)
+    xw = np.asarray(xw, dtype=np.float64)
+    cat = np.asarray(cat)
+
+    edges = np.linspace(range[0], range[1], fine_bins + 1)
+
+    cumsums = []
+    for label in (1, 0):
+        for p in (1, 2):
+            h, _ = np.histogram(x[cat == label], bins=edges,
+                                weights=xw[cat == label] ** p)
+            cumsums.append(np.concatenate(([0.], np.cumsum(h))))
+
+    # Merit of a bin covering fine bins [i, j), -inf if not allowed
+    i = np.arange(fine_bins + 1).reshape(-1, 1)
+    j = np.arange(fine_bins + 1).reshape(1, -1)
+    merit = squared_significance(cumsums[0][j] - cumsums[0][i],
+                                 cumsums[2][j] - cumsums[2][i],
+                                 figure_of_merit)
+    merit[(j <= i) | _range_meets_threshold(
+        cumsums, i, j, s_num_thresh, b_num_thresh, s_err_thresh,
+        b_err_thresh)] = -np.inf
+
+    # best[j] is the greatest merit of k bins covering fine bins [0, j), and
+    # prev[k][j] the start of the last of those bins
+    best = np.full(fine_bins + 1, -np.inf)
+    best[0] = 0
+    prev = []
+    totals = []
+
+    for _ in xrange(bins):
+        candidates = best.reshape(-1, 1) + merit
+        prev.append(np.argmax(candidates, axis=0))
+        best = candidates[prev[-1], np.arange(fine_bins + 1)]
+        totals.append(best[-1])
+
+    if not np.isfinite(np.max(totals)):
+        return np.array(range, dtype=np.float64)
+
+    # Trace back the bins of the best partition
+    boundaries = [fine_bins]
+    for k in xrange(np.argmax(totals), -1, -1):
+        boundaries.append(prev[k][boundaries[-1]])
+
+    return edges[boundaries[::-1]]
+
+
+class _KMeans1D(object):
+    """
+    Two clusters in one dimension, with the cluster_centers_ attribute and
+    predict method of a fitted sklearn.cluster.KMeans.
+
+    Parameters
+    ----------
+    centers : (float, float)
+        Lower and upper cluster centres.
+    """
+
+    def __init__(self, centers):
+        self.cluster_centers_ = np.array(centers, dtype=np.float64) \
+            .reshape(2, 1)
+
+    def predict(self, X):
+        """
+        Predict the closest cluster each sample in X belongs to.
+
+        Parameters
+        ----------
+        X : array-like, shape=[n_samples, 1]
+            Data to predict.
+
+        Returns
+        -------
+        labels : array, shape=n_samples
+            0 for the lower cluster, 1 for the upper cluster.
+        """
+
+        return (np.asarray(X).reshape(-1) >
+                self.cluster_centers_.mean()).astype(np.intp)
+
+
+def _two_means_1d(x):
+    """
+    Find the exact two-means clustering of sorted one-dimensional data.
+
+    Returns the number of entries in the lower cluster and the two cluster
+    centres, or None if every entry of x is the same.
+
+    The lower cluster is always a prefix of the sorted data, so the partition
+    minimising the within-cluster sum of squares is the one maximising
+    SL ** 2 / nL + SR ** 2 / nR, where SL and SR are the sums of x in each
+    cluster and nL and nR their sizes. This is evaluated for every prefix
+    from cumulative sums.
+    """
+
+    n = len(x)
+    # Centre the data to limit rounding error in the sums
+    xc = x - x.mean()
+    sl = np.cumsum(xc)[:-1]
+    sr = xc.sum() - sl
+    nl = np.arange(1, n)
+
+    # Clusters may only be separated between distinct values
+    valid = x[1:] > x[:-1]
+    if not valid.any():
+        return None
+
+    score = np.where(valid, sl ** 2 / nl + sr ** 2 / (n - nl), -np.inf)
+    k = np.argmax(score) + 1
+
+    return k, (x[:k].mean(), x[k:].mean())
+
+
+def _recursive_kmeans_tree_1d(x, cat, xw, s_num_thresh=1, b_num_thresh=1,
+                              s_err_thresh=0.3, b_err_thresh=0.3):
+    """
+    Equivalent to _recursive_kmeans_tree for one-dimensional x, using the
+    exact two-means split of each cluster instead of sklearn.cluster.KMeans.
+    """
+
+    xs, cumsums = _cumulative_sums(x, cat, xw)
+
+    tree = util.BinaryTree()
+    stack = [(0, len(xs), None, False)]
+
+    while stack:
+        i, j, parent, right = stack.pop()
+
+        result = _two_means_1d(xs[i:j]) if j - i > 1 else None
+
+        if result is None:
+            continue
+
+        k, centers = result
+        split = i + k
+
+        if _range_meets_threshold(cumsums, i, split, s_num_thresh,
+                                  b_num_thresh, s_err_thresh,
+                                  b_err_thresh) or \
+                _range_meets_threshold(cumsums, split, j, s_num_thresh,
+                                       b_num_thresh, s_err_thresh,
+                                       b_err_thresh):
+            continue
+
+        node = tree.add(_KMeans1D(centers), parent, right)
+        stack.append((split, j, node, True))
+        stack.append((i, split, node, False))
+
+    return tree
+
+
 def _recursive_kmeans_tree(x, cat, xw=None, s_num_thresh=1, b_num_thresh=1,
                            s_err_thresh=0.3, b_err_thresh=0.3, **kwargs):
     """
@@ -171,39 +469,59 @@ def _recursive_kmeans_tree(x, cat, xw=None, s_num_thresh=1, b_num_thresh=1,
         Maximum percentage error in a bin in signal or background before
         splitting is stopped.
     kwargs
-        Additional keyword arguments passed to sklearn.cluster.KMeans
+        Additional keyword arguments passed to sklearn.cluster.KMeans. Not used
+        if n_features == 1.
 
     Returns
     -------
     kmtree : BinaryTree
-        BinaryTree containing trained k-means clusterers.
+        BinaryTree containing trained k-means clusterers, with the cluster
+        labelled 0 in the left subtree of each node. Empty if the sample is
+        not split.
+
+    Notes
+    -----
+    If n_features == 1, the optimal split of each cluster is found exactly
+    (see _two_means_1d) and the tree contains _KMeans1D objects, whose lower
+    cluster is always labelled 0. Weights are only used in the thresholds, as
+    by sklearn.cluster.KMeans.
     """
 
+    if xw is None:
+        xw = np.ones(len(x))
+
+    x = np.asarray(x)
+    if x.ndim == 1 or x.shape[1] == 1:
+        return _recursive_kmeans_tree_1d(x.reshape(-1), cat, xw,
+                                         s_num_thresh, b_num_thresh,
+                                         s_err_thresh, b_err_thresh)
+
     from sklearn.cluster import KMeans
 
+    xw = np.asarray(xw)
+    cat = np.asarray(cat)
+
     tree = util.BinaryTree()
-    if x is None:
-        xw = np.ones(len(x))
+    stack = [(np.arange(len(x)), None, False)]
 
-    km = KMeans(n_clusters=2, **kwargs)
-    km.fit(x)
-    mask = (km.predict(x) == 0)
+    while stack:
+        idx, parent, right = stack.pop()
 
-    if _meets_num_threshold(
-            xw[mask], cat[mask], s_num_thresh, b_num_thresh,
-            s_err_thresh, b_err_thresh) or \
-            _meets_num_threshold(
-                xw[~mask], cat[~mask], s_num_thresh, b_num_thresh,
-                s_err_thresh, b_err_thresh):
-        return None
+        km = KMeans(n_clusters=2, **kwargs)
+        km.fit(x[idx])
+        mask = (km.predict(x[idx]) == 0)
 
-    tree.val = km
-    tree.left = _recursive_kmeans_tree(x[mask], cat[mask], xw[mask],
-                                       s_num_thresh, b_num_thresh,
-                                       s_err_thresh, b_err_thresh)
-    tree.right = _recursive_kmeans_tree(x[~mask], cat[~mask], xw[~mask],
-                                        s_num_thresh, b_num_thresh,
-                                        s_err_thresh, b_err_thresh)
+        if _meets_num_threshold(
+                xw[idx[mask]], cat[idx[mask]], s_num_thresh, b_num_thresh,
+                s_err_thresh, b_err_thresh) or \
+                _meets_num_threshold(
+                    xw[idx[~mask]], cat[idx[~mask]], s_num_thresh,
+                    b_num_thresh, s_err_thresh, b_err_thresh):
+            continue
+
+        node = tree.add(km, parent, right)
+        stack.append((idx[~mask], node, True))
+        stack.append((idx[mask], node, False))
 
     return tree
 
@@ -226,7 +544,7 @@ def kmeans_bin_edges(tree):
     """
 
     return np.fromiter(sorted(np.mean(km.cluster_centers_)
-                              for km in util.nodes(tree) if km is not None),
+                              for km in util.nodes(tree)),
                        np.float)
 
 
@@ -257,7 +575,8 @@ def recursive_kmeans(x, cat, xw=None, s_num_thresh=1, b_num_thresh=1,
         Maximum percentage error in a bin in signal or background before
         splitting is stopped.
     kwargs
-        Additional keyword arguments passed to sklearn.cluster.KMeans
+        Additional keyword arguments passed to sklearn.cluster.KMeans. Not used
+        if n_features == 1, in which case an exact algorithm is used.
 
     Returns
     -------
@@ -280,6 +599,38 @@ def recursive_kmeans(x, cat, xw=None, s_num_thresh=1, b_num_thresh=1,
         return kmtree
 
 
+def flatten_kmeans_tree(tree):
+    """
+    Convert a tree of trained k-means clusterers into arrays.
+
+    Parameters
+    ----------
+    tree : BinaryTree or None
+        BinaryTree containing k-means classifiers, as returned by
+        recursive_kmeans.
+
+    Returns
+    -------
+    FlatKMeansTree
+        Cluster centres of each node, shape [n_nodes, 2, n_features], and the
+        indices of the left and right children of each node, -1 where there is
+        no child. Node 0 is the root. If tree is None or empty, there are no
+        nodes.
+    """
+
+    if tree is None:
+        tree = util.BinaryTree()
+
+    centers = [np.asarray(km.cluster_centers_, dtype=np.float64)
+               for km in tree.values]
+    n_features = centers[0].shape[1] if centers else 1
+
+    return FlatKMeansTree(
+        np.array(centers).reshape(-1, 2, n_features),
+        np.array(tree.left, dtype=np.intp),
+        np.array(tree.right, dtype=np.intp))
+
+
 def predict_kmeans_tree(tree, X):
     """
     Predict cluster membership for each sample in X according to a previously
@@ -287,8 +638,9 @@ def predict_kmeans_tree(tree, X):
 
     Parameters
     ----------
-    tree : BinaryTree
-        BinaryTree containing k-means classifiers.
+    tree : BinaryTree or FlatKMeansTree
+        BinaryTree containing k-means classifiers, or the same flattened by
+        flatten_kmeans_tree.
     X : array-like, shape=[n_samples, n_features]
         Data to run prediction on.
 
@@ -301,45 +653,183 @@ def predict_kmeans_tree(tree, X):
     -----
     The provided labels are guaranteed to be consistent and unique for each
     cluster, but not consecutive.
+
+    The label of a sample is initially 0. It is increased by 2^d every time it
+    takes the right path from a node, where d is the depth of that node.
+
+    Every sample is moved down one level of the tree at a time, choosing the
+    closer of the two cluster centres at its current node. In one dimension,
+    samples are compared with the midpoint of the centres, as for the bin
+    edges returned by kmeans_bin_edges.
     """
 
-    def predict_kmeans_tree_event(t, x):
-        """
-        Predict cluster membership for a single sample x according to a
-        previously trained recursive k-means clusterer.
+    if not isinstance(tree, FlatKMeansTree):
+        tree = flatten_kmeans_tree(tree)
 
-        Parameters
-        ----------
-        t : BinaryTree
-            BinaryTree containing k-means classifiers.
-        x : shape=n_features
-            Data to run prediction on.
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim == 1:
+        X = X.reshape(-1, 1)
 
-        Returns
-        -------
-        label : array, shape=n_samples
-            Integer label describing the cluster the sample belongs to.
+    labels = np.zeros(len(X), dtype=np.int64)
 
-        Notes
-        -----
-        The label of a sample is initially 0. It is increased by 2^d every time
-        it takes the right path from a node, where d is the depth of that node.
-        """
+    if not len(tree.centers):
+        return labels
+
+    node = np.zeros(len(X), dtype=np.intp)
+    idx = np.arange(len(X))
+    depth = 0
+
+    while len(idx):
+        c = tree.centers[node[idx]]
+
+        if X.shape[1] == 1:
+            branch = X[idx, 0] > c[:, :, 0].mean(axis=1)
+        else:
+            x = X[idx]
+            branch = (((x - c[:, 1]) ** 2).sum(axis=1) <
+                      ((x - c[:, 0]) ** 2).sum(axis=1))
+
+        labels[idx] += branch.astype(np.int64) << depth
+        node[idx] = np.where(branch, tree.right[node[idx]],
+                             tree.left[node[idx]])
+
+        idx = idx[node[idx] != -1]
+        depth += 1
+
+    return labels
+
+
+def bin_edges(x, cat, xw=None, strategy="equal", bins=20, range=(0, 1),
+              fine_bins=200, figure_of_merit="asimov", s_num_thresh=1,
+              b_num_thresh=1, s_err_thresh=0.3, b_err_thresh=0.3):
+    """
+    Find the bin edges given by a binning strategy.
+
+    Parameters
+    ----------
+    x : array-like, shape=N
+        Data to be binned.
+    cat : 1D array, shape=N
+        Array containing labels describing whether an entry is signal (1 or
+        True) or background (0 or False).
+    xw : array-like, shape=N, optional
+        Weights for samples in x. If None, equal weights are used.
+    strategy : string, optional
+        Binning strategy: "equal", "quantile", "recursive_median",
+        "recursive_kmeans" or "optimal".
+    bins : int, optional
+        Number of bins for the equal and quantile strategies, maximum number
+        of bins for the optimal strategy.
+    range : (float, float), optional
+        Lower and upper edges of the outermost bins.
+    fine_bins, figure_of_merit
+        Passed to optimal.
+    s_num_thresh, b_num_thresh, s_err_thresh, b_err_thresh : float, optional
+        Thresholds passed to the recursive and optimal strategies.
+
+    Returns
+    -------
+    array
+        Bin edges, starting at range[0] and ending at range[1].
+    """
+
+    x = np.asarray(x)
+    if xw is None:
+        xw = np.ones(len(x))
+    xw = np.asarray(xw)
+    cat = np.asarray(cat)
+
+    thresholds = dict(s_num_thresh=s_num_thresh, b_num_thresh=b_num_thresh,
+                      s_err_thresh=s_err_thresh, b_err_thresh=b_err_thresh)
+
+    if strategy == "equal":
+        edges = np.linspace(range[0], range[1], bins + 1)
+    elif strategy == "quantile":
+        # Weighted quantiles, with coinciding edges removed
+        from tact.metrics import ECDF  # imports scikit-learn
+
+        edges = np.unique(ECDF(x, xw).quantile(np.linspace(0, 1, bins + 1)))
+    elif strategy == "recursive_median":
+        edges = np.asarray(recursive_median(x, cat, xw, **thresholds),
+                           dtype=np.float64)
+    elif strategy == "recursive_kmeans":
+        _, edges = recursive_kmeans(x.reshape(-1, 1), cat, xw=xw,
+                                    bin_edges=True, **thresholds)
+    elif strategy == "optimal":
+        edges = optimal(x, cat, xw, bins=bins, fine_bins=fine_bins,
+                        range=range, figure_of_merit=figure_of_merit,
+                        **thresholds)
+    else:
+        raise ValueError("Unrecognised value for option 'strategy': ",
+                         strategy)
+
+    edges = np.array(edges, dtype=np.float64)
+    if len(edges) < 2:
+        edges = np.array(range, dtype=np.float64)
+    edges[0] = range[0]
+    edges[-1] = range[1]
+    return edges
+
+
+def expected_significance(x, cat, xw, edges, figure_of_merit="asimov"):
+    """
+    Compute the combined expected significance of several binnings of the
+    same data.
+
+    Parameters
+    ----------
+    x : array-like, shape=N
+        Data to be binned.
+    cat : 1D array, shape=N
+        Array containing labels describing whether an entry is signal (1 or
+        True) or background (0 or False).
+    xw : array-like, shape=N, optional
+        Weights for samples in x. If None, equal weights are used.
+    edges : list of arrays
+        Bin edges of each binning. Each bin includes its lower edge and
+        excludes its upper edge, and events outside the outermost edges are
+        ignored.
+    figure_of_merit : "asimov" or "s_sqrt_b", optional
+        Figure of merit summed over bins, see squared_significance.
+
+    Returns
+    -------
+    significance : array, shape=len(edges)
+        Square root of the summed figure of merit of each binning, NaN if any
+        bin of the binning contains no background.
+    min_s, min_b : array, shape=len(edges)
+        Smallest signal and background yield in a bin of each binning.
+
+    Notes
+    -----
+    The data are sorted once. All binnings are then evaluated together by
+    looking up the cumulative yields at every edge.
+    """
+
+    x = np.asarray(x)
+    if xw is None:
+        xw = np.ones(len(x))
+
+    xs, cumsums = _cumulative_sums(x, cat, xw)
+
+    flat = np.concatenate([np.asarray(e, dtype=np.float64) for e in edges])
+    starts = np.cumsum([0] + [len(e) for e in edges[:-1]])
 
-        depth = 0
-        cluster = 0
-        while t is not None:
-            branch = t.val.predict(x)
-            cluster += branch * 2 ** depth
+    idx = np.searchsorted(xs, flat, side="left")
+    s = np.diff(cumsums[0][idx])
+    b = np.diff(cumsums[2][idx])
 
-            depth += 1
+    # Differences between the last edge of one binning and the first edge of
+    # the next do not correspond to bins
+    valid = np.ones(len(s), dtype=bool)
+    valid[starts[1:] - 1] = False
 
-            if branch == 0:
-                t = t.left
-            elif branch == 1:
-                t = t.right
+    fom = np.where(valid, squared_significance(s, b, figure_of_merit), 0)
+    with np.errstate(invalid="ignore"):
+        significance = np.sqrt(np.add.reduceat(fom, starts))
+    significance[np.isinf(significance)] = np.nan
 
-        return cluster
+    min_s = np.minimum.reduceat(np.where(valid, s, np.inf), starts)
+    min_b = np.minimum.reduceat(np.where(valid, b, np.inf), starts)
 
-    return np.apply_along_axis(
-        lambda x: predict_kmeans_tree_event(tree, x.reshape(1, -1)), 1, X)
+    return significance, min_s, min_b
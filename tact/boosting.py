@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module contains a histogram-based gradient boosted decision tree
+classifier.
+
+Features are discretised once into at most 256 quantile bins before training.
+Split finding then only requires histograms of the loss gradients and
+hessians in each node, built with np.bincount in a single pass over the
+node's events, rather than sorting every feature at every split as
+scikit-learn's GradientBoostingClassifier does. The histogram of the larger
+child of each split is obtained by subtracting that of the smaller child from
+its parent's.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+from scipy.special import expit
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.utils import check_random_state
+
+
+class HistGradientBoostingClassifier(BaseEstimator, ClassifierMixin):
+    """
+    Binary gradient boosted decision tree classifier operating on binned
+    features.
+
+    Parameters
+    ----------
+    n_estimators : int, optional
+        Number of boosting stages.
+    learning_rate : float, optional
+        Shrinkage applied to the contribution of each tree.
+    max_depth : int, optional
+        Maximum depth of each tree.
+    max_bins : int, optional
+        Maximum number of bins per feature. Must be no more than 256.
+    min_samples_leaf : int, optional
+        Minimum number of training events in a leaf.
+    l2_regularization : float, optional
+        L2 regularisation applied to leaf values.
+    subsample_for_bins : int, optional
+        Number of events used to determine bin edges.
+    n_jobs : int, optional
+        Number of threads used to find bin edges and bin features, which sort
+        and search with numpy functions releasing the GIL. If -1, the number
+        of cores is used. Tree growing, which dominates training, is
+        single-threaded: histograms are filled in the calling thread, as
+        np.bincount holds the GIL.
+    random_state : int, RandomState instance or None, optional
+        Seed used when subsampling events to determine bin edges.
+    warm_start : bool, optional
+        If True, reuse the bin edges and trees from the previous call to fit
+        and add stages until there are n_estimators in total.
+
+    Notes
+    -----
+    Bin edges are placed at quantiles of each feature, or between every
+    distinct value if there are fewer of these than max_bins. NaN values are
+    placed in the highest bin.
+
+    Leaf values are Newton steps on the weighted binary log-loss. Nodes whose
+    summed hessian is not positive, which can happen when training with
+    negative sample weights, are never split. The initial score is the
+    log-odds of the weighted fraction of positive events, clipped to
+    [eps, 1 - eps] since negative weights can take it outside (0, 1).
+    """
+
+    def __init__(self, n_estimators=100, learning_rate=0.1, max_depth=3,
+                 max_bins=256, min_samples_leaf=20, l2_regularization=0.,
+                 subsample_for_bins=200000, n_jobs=1, random_state=None,
+                 warm_start=False):
+        self.n_estimators = n_estimators
+        self.learning_rate = learning_rate
+        self.max_depth = max_depth
+        self.max_bins = max_bins
+        self.min_samples_leaf = min_samples_leaf
+        self.l2_regularization = l2_regularization
+        self.subsample_for_bins = subsample_for_bins
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.warm_start = warm_start
+
+    def _map(self, f, iterable):
+        """Map f over iterable, using n_jobs threads"""
+
+        n_jobs = cpu_count() if self.n_jobs == -1 else self.n_jobs
+
+        if n_jobs == 1:
+            return [f(i) for i in iterable]
+
+        pool = ThreadPool(n_jobs)
+        try:
+            return pool.map(f, iterable)
+        finally:
+            pool.close()
+
+    def _find_bin_edges(self, X):
+        """Determine the bin edges for each column of X"""
+
+        rng = check_random_state(self.random_state)
+
+        if len(X) > self.subsample_for_bins:
+            X = X[rng.choice(len(X), self.subsample_for_bins, replace=False)]
+
+        def edges(x):
+            x = np.unique(x[~np.isnan(x)])
+            if len(x) <= self.max_bins:
+                return (x[:-1] + x[1:]) / 2
+            return np.unique(np.percentile(
+                x, np.linspace(0, 100, self.max_bins + 1)[1:-1]))
+
+        return self._map(edges, X.T)
+
+    def _bin(self, X):
+        """
+        Return the bin of each entry of X as an array of shape
+        [n_features, n_samples].
+        """
+
+        X = np.asarray(X, dtype=np.float64)
+
+        if X.shape[1] != len(self.bin_edges_):
+            raise ValueError("Expected ", len(self.bin_edges_),
+                             " features, got ", X.shape[1])
+
+        return np.array(self._map(
+            lambda f: np.searchsorted(self.bin_edges_[f], X[:, f],
+                                      side="right").astype(np.uint8),
+            range(X.shape[1])))
+
+    def _histogram(self, codes, g, h, idx):
+        """
+        Build the gradient, hessian, and count histograms of every feature for
+        the events in idx.
+        """
+
+        gi = g[idx]
+        hi = h[idx]
+
+        def feature_histogram(c):
+            c = c[idx]
+            return (np.bincount(c, weights=gi, minlength=self.max_bins),
+                    np.bincount(c, weights=hi, minlength=self.max_bins),
+                    np.bincount(c, minlength=self.max_bins))
+
+        return np.array([feature_histogram(c) for c in codes]).swapaxes(0, 1)
+
+    def _find_split(self, hist):
+        """
+        Find the best split given the histograms of a node.
+
+        Returns (feature, bin, gain), or None if the node should not be split.
+        """
+
+        # Every feature's histogram sums to the node totals
+        G, H, C = hist[:, 0].sum(axis=1)
+        lam = self.l2_regularization
+
+        if H + lam <= 0 or C < 2 * self.min_samples_leaf:
+            return None
+
+        GL, HL, CL = np.cumsum(hist[:, :, :-1], axis=2)
+        GR, HR, CR = G - GL, H - HL, C - CL
+
+        valid = ((CL >= self.min_samples_leaf) & (CR >= self.min_samples_leaf)
+                 & (HL + lam > 0) & (HR + lam > 0))
+
+        if not valid.any():
+            return None
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gain = GL ** 2 / (HL + lam) + GR ** 2 / (HR + lam)
+        gain = np.where(valid, gain - G ** 2 / (H + lam), -np.inf)
+
+        f, b = np.unravel_index(np.argmax(gain), gain.shape)
+
+        if gain[f, b] <= 0:
+            return None
+
+        return f, b, gain[f, b]
+
+    def _grow_tree(self, codes, g, h, raw):
+        """
+        Grow a single tree on the binned training data, adding its predictions
+        to raw.
+
+        Returns the feature, threshold bin, left child, right child, and
+        value of each node, with -1 marking absent children.
+        """
+
+        lam = self.l2_regularization
+        feature, threshold, left, right, value = [], [], [], [], []
+
+        def add_node():
+            for l in (feature, threshold, left, right):
+                l.append(-1)
+            value.append(0.)
+            return len(value) - 1
+
+        idx = np.arange(codes.shape[1])
+        level = [(add_node(), idx, self._histogram(codes, g, h, idx))]
+
+        for depth in range(self.max_depth + 1):
+            next_level = []
+
+            for node, idx, hist in level:
+                split = (None if depth == self.max_depth
+                         else self._find_split(hist))
+
+                if split is None:
+                    G, H, _ = hist[:, 0].sum(axis=1)
+                    if H + lam > 0:
+                        value[node] = -self.learning_rate * G / (H + lam)
+                    raw[idx] += value[node]
+                    continue
+
+                f, b, gain = split
+                self.total_gain_[f] += gain
+
+                mask = codes[f, idx] <= b
+                children = (idx[mask], idx[~mask])
+
+                # Subtract the smaller child's histogram from its parent's
+                small = int(len(children[1]) < len(children[0]))
+                hists = [None, None]
+                hists[small] = self._histogram(codes, g, h, children[small])
+                hists[1 - small] = hist - hists[small]
+
+                feature[node] = f
+                threshold[node] = b
+                left[node] = add_node()
+                right[node] = add_node()
+
+                next_level.append((left[node], children[0], hists[0]))
+                next_level.append((right[node], children[1], hists[1]))
+
+            level = next_level
+
+        return (np.array(feature, dtype=np.intp),
+                np.array(threshold, dtype=np.intp),
+                np.array(left, dtype=np.intp),
+                np.array(right, dtype=np.intp),
+                np.array(value))
+
+    def fit(self, X, y, sample_weight=None):
+        """
+        Build a boosted ensemble of trees from the training set (X, y).
+
+        Parameters
+        ----------
+        X : array-like, shape = [n_samples, n_features]
+            Training features.
+        y : array-like, shape = [n_samples]
+            Target values. There must be exactly two classes.
+        sample_weight : array-like, shape = [n_samples], optional
+            Sample weights. If None, then samples are equally weighted.
+
+        Returns
+        -------
+        self : object
+        """
+
+        if self.max_bins > 256:
+            raise ValueError("max_bins must be no more than 256, is: ",
+                             self.max_bins)
+
+        X = np.asarray(X, dtype=np.float64)
+        classes, y = np.unique(y, return_inverse=True)
+        sample_weight = (np.ones(len(X)) if sample_weight is None
+                         else np.asarray(sample_weight, dtype=np.float64))
+
+        if len(classes) != 2:
+            raise ValueError("Exactly two classes are required, found: ",
+                             len(classes))
+
+        if not (self.warm_start and hasattr(self, "roots_")):
+            self.classes_ = classes
+            self.bin_edges_ = self._find_bin_edges(X)
+
+            total = sample_weight.sum()
+            p = np.dot(y, sample_weight) / total if total != 0 else 0.5
+            eps = np.finfo(np.float64).eps
+            p = np.clip(p, eps, 1 - eps)
+            self.init_score_ = np.log(p / (1 - p))
+
+            self.roots_ = np.zeros(0, dtype=np.intp)
+            self.feature_ = np.zeros(0, dtype=np.intp)
+            self.threshold_ = np.zeros(0, dtype=np.intp)
+            self.children_left_ = np.zeros(0, dtype=np.intp)
+            self.children_right_ = np.zeros(0, dtype=np.intp)
+            self.value_ = np.zeros(0)
+            self.total_gain_ = np.zeros(X.shape[1])
+        elif not np.array_equal(classes, self.classes_):
+            raise ValueError("Classes differ from those previously fitted")
+
+        codes = self._bin(X)
+        raw = self._raw_predict(codes)
+
+        trees = []
+        n_nodes = len(self.value_)
+
+        for _ in range(self.n_estimators - len(self.roots_)):
+            p = expit(raw)
+            g = (p - y) * sample_weight
+            h = p * (1 - p) * sample_weight
+
+            feature, threshold, left, right, value = self._grow_tree(
+                codes, g, h, raw)
+
+            # Offset child indices so the tree can be stored with the others
+            left[left != -1] += n_nodes
+            right[right != -1] += n_nodes
+            trees.append((n_nodes, feature, threshold, left, right, value))
+            n_nodes += len(value)
+
+        if trees:
+            roots, feature, threshold, left, right, value = zip(*trees)
+            self.roots_ = np.concatenate((self.roots_, roots)).astype(np.intp)
+            self.feature_ = np.concatenate((self.feature_,) + feature)
+            self.threshold_ = np.concatenate((self.threshold_,) + threshold)
+            self.children_left_ = np.concatenate((self.children_left_,) + left)
+            self.children_right_ = np.concatenate(
+                (self.children_right_,) + right)
+            self.value_ = np.concatenate((self.value_,) + value)
+
+        return self
+
+    @property
+    def feature_importances_(self):
+        """Total split gain of each feature, normalised to unity"""
+
+        total = self.total_gain_.sum()
+
+        return self.total_gain_ / (total if total > 0 else 1)
+
+    def _raw_predict(self, codes):
+        """Sum the initial score and tree outputs for binned data"""
+
+        raw = np.full(codes.shape[1], self.init_score_)
+
+        for root in self.roots_:
+            node = np.full(codes.shape[1], root, dtype=np.intp)
+            idx = np.arange(codes.shape[1]
+                            if self.children_left_[root] != -1 else 0)
+
+            # Advance every event still on a branch node one level at a time
+            while len(idx):
+                n = node[idx]
+                left = codes[self.feature_[n], idx] <= self.threshold_[n]
+                node[idx] = np.where(left, self.children_left_[n],
+                                     self.children_right_[n])
+                idx = idx[self.children_left_[node[idx]] != -1]
+
+            raw += self.value_[node]
+
+        return raw
+
+    def decision_function(self, X):
+        """
+        Compute the log-odds of the positive class for X.
+
+        Parameters
+        ----------
+        X : array-like, shape = [n_samples, n_features]
+            Input samples.
+
+        Returns
+        -------
+        score : array, shape = [n_samples]
+            Log-odds of each sample belonging to classes_[1].
+        """
+
+        return self._raw_predict(self._bin(X))
+
+    def predict_proba(self, X):
+        """
+        Predict class probabilities for X.
+
+        Parameters
+        ----------
+        X : array-like, shape = [n_samples, n_features]
+            Input samples.
+
+        Returns
+        -------
+        p : array, shape = [n_samples, 2]
+            Class probabilities of the input samples.
+        """
+
+        p = expit(self.decision_function(X))
+
+        return np.column_stack((1 - p, p))
+
+    def predict(self, X):
+        """
+        Predict class for X.
+
+        Parameters
+        ----------
+        X : array-like, shape = [n_samples, n_features]
+            Input samples.
+
+        Returns
+        -------
+        y : array, shape = [n_samples]
+            Predicted classes.
+        """
+
+        return self.classes_.take((self.decision_function(X) > 0)
+                                  .astype(np.intp))
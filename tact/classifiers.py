@@ -13,26 +13,508 @@ Classifiers are saved do disk using dill as Python's pickle module does not
 correctly serialise Keras classifiers. It should be noted that Keras does not
 recommend pickling for neural network serialisation, but no issues have been
 observed so far using the dill library.
+
+Classifiers may alternatively be saved with joblib so that their large arrays
+can be memory-mapped read-only when loaded. Processes loading the same file
+then share a single physical copy of the model through the page cache. For
+random forests and bdt_grad the final step of the pipeline is replaced by a
+FlatForest or FlatGradientBoosting, which stores every tree in a set of flat
+node arrays. The trees of bdt_hist are already numpy arrays and are mapped as
+they are. XGBoost and LightGBM boosters are pickled as serialised models,
+which are read into private memory, so bdt_xgb and bdt_lgbm gain nothing from
+memory-mapping, and Keras classifiers cannot be saved this way at all.
 """
 
 
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import copy
+import os
+import shutil
 import sys
+import tempfile
 from collections import namedtuple
 
+import numpy as np
 from sklearn.pipeline import make_pipeline
+from tact.util import cache_key
+
+SavedClassifier = namedtuple("SavedClassifier", "cfg mva")
+
+# LightGBM parameters (including scikit-learn API aliases) which affect the
+# construction of a Dataset
+LGBM_DATASET_PARAMS = frozenset((
+    "max_bin", "min_data_in_bin", "bin_construct_sample_cnt",
+    "subsample_for_bin", "min_data_in_leaf", "min_child_samples",
+    "use_missing", "zero_as_missing", "data_random_seed", "random_state",
+    "seed", "categorical_feature"))
+
+
+class FlatForest(object):
+    """
+    Read-only random forest with every tree stored in flat node arrays.
+
+    The node tables of all trees in a fitted scikit-learn forest are
+    concatenated into contiguous arrays. Unlike scikit-learn's own Tree
+    objects, which copy their nodes into private memory when unpickled, these
+    arrays can be memory-mapped directly from a file written by joblib.
+
+    Parameters
+    ----------
+    forest : RandomForestClassifier or ExtraTreesClassifier
+        Trained single-output forest.
+    """
+
+    def __init__(self, forest):
+        if forest.n_outputs_ != 1:
+            raise ValueError("Only single-output forests can be flattened")
+
+        trees = [e.tree_ for e in forest.estimators_]
+
+        value = np.concatenate([t.value[:, 0, :] for t in trees])
+        normaliser = value.sum(axis=1, keepdims=True)
+        normaliser[normaliser == 0] = 1
+
+        self._flatten(trees)
+        self.value = value / normaliser
+        self.classes_ = forest.classes_
+        self.n_classes_ = forest.n_classes_
+        self.feature_importances_ = forest.feature_importances_
+
+    def _flatten(self, trees):
+        """
+        Concatenate the node tables of scikit-learn Tree objects.
+        """
+
+        offsets = np.cumsum([0] + [t.node_count for t in trees])
+
+        def concat_children(attr):
+            return np.concatenate(
+                [np.where(getattr(t, attr) < 0, -1, getattr(t, attr) + o)
+                 for t, o in zip(trees, offsets)]).astype(np.intp)
+
+        self.roots = offsets[:-1].astype(np.intp)
+        self.children_left = concat_children("children_left")
+        self.children_right = concat_children("children_right")
+        self.feature = np.concatenate([t.feature for t in trees])
+        self.threshold = np.concatenate([t.threshold for t in trees])
+
+    def _leaves(self, X):
+        """
+        Yield, for each tree in turn, the leaf reached by every sample of X.
+        """
+
+        # Trees compare single precision features, as in scikit-learn
+        X = np.asarray(X, dtype=np.float32)
+
+        for root in self.roots:
+            node = np.full(len(X), root, dtype=np.intp)
+            idx = np.arange(len(X) if self.children_left[root] != -1 else 0)
+
+            # Advance every event still on a branch node one level at a time
+            while len(idx):
+                n = node[idx]
+                left = X[idx, self.feature[n]] <= self.threshold[n]
+                node[idx] = np.where(left, self.children_left[n],
+                                     self.children_right[n])
+                idx = idx[self.children_left[node[idx]] != -1]
+
+            yield node
+
+    def predict_proba(self, X):
+        """
+        Predict class probabilities for X as the mean predicted class
+        probabilities of the trees in the forest.
+
+        Parameters
+        ----------
+        X : array-like, shape = [n_samples, n_features]
+            Input samples.
+
+        Returns
+        -------
+        p : array, shape = [n_samples, n_classes]
+            Class probabilities of the input samples.
+        """
+
+        proba = np.zeros((len(X), self.n_classes_))
+
+        for node in self._leaves(X):
+            proba += self.value[node]
+
+        return proba / len(self.roots)
+
+    def predict(self, X):
+        """
+        Predict class for X.
+
+        Parameters
+        ----------
+        X : array-like, shape = [n_samples, n_features]
+            Input samples.
+
+        Returns
+        -------
+        y : array, shape = [n_samples]
+            Predicted classes.
+        """
+
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+
+class FlatGradientBoosting(FlatForest):
+    """
+    Read-only binary gradient boosted classifier with every tree stored in
+    flat node arrays, as in FlatForest.
+
+    Parameters
+    ----------
+    bdt : GradientBoostingClassifier
+        Trained binary classifier using the default loss and initial
+        estimator.
+    """
+
+    def __init__(self, bdt):
+        if (bdt.estimators_.shape[1] != 1 or bdt.init is not None or
+                bdt.loss not in ("deviance", "log_loss")):
+            raise ValueError("Only binary gradient boosting classifiers with "
+                             "the default loss and init can be flattened")
+
+        trees = [e.tree_ for e in bdt.estimators_[:, 0]]
+
+        self._flatten(trees)
+        self.value = bdt.learning_rate * np.concatenate(
+            [t.value[:, 0, 0] for t in trees])
+        self.classes_ = bdt.classes_
+        self.n_classes_ = bdt.n_classes_
+        self.feature_importances_ = bdt.feature_importances_
+
+        # The default initial estimator predicts the same log-odds everywhere,
+        # so read it off at any one point
+        x = np.zeros((1, len(self.feature_importances_)))
+        self.init_score = bdt.decision_function(x).ravel()[0] - sum(
+            self.value[node][0] for node in self._leaves(x))
+
+    def predict_proba(self, X):
+        """
+        Predict class probabilities for X from the summed scores of the trees.
+
+        Parameters
+        ----------
+        X : array-like, shape = [n_samples, n_features]
+            Input samples.
+
+        Returns
+        -------
+        p : array, shape = [n_samples, 2]
+            Class probabilities of the input samples.
+        """
+
+        from scipy.special import expit
+
+        score = np.full(len(X), self.init_score)
+
+        for node in self._leaves(X):
+            score += self.value[node]
+
+        p = expit(score)
+
+        return np.column_stack((1 - p, p))
+
+
+def flatten_forests(mva):
+    """
+    Replace a random forest or gradient boosted classifier at the end of a
+    pipeline with a FlatForest or FlatGradientBoosting.
+
+    Parameters
+    ----------
+    mva : Pipeline
+        Trained classifier.
+
+    Returns
+    -------
+    Pipeline
+        Shallow copy of mva with its final step flattened if it is a forest or
+        scikit-learn gradient boosted classifier, otherwise mva itself.
+    """
+
+    from sklearn.ensemble import GradientBoostingClassifier
+    from sklearn.ensemble.forest import ForestClassifier
+
+    try:
+        name, est = mva.steps[-1]
+    except AttributeError:
+        return mva
+
+    if isinstance(est, ForestClassifier):
+        flat = FlatForest(est)
+    elif isinstance(est, GradientBoostingClassifier):
+        flat = FlatGradientBoosting(est)
+    else:
+        return mva
+
+    mva = copy.copy(mva)
+    mva.steps = mva.steps[:-1] + [(name, flat)]
+
+    return mva
+
+
+class BoosterClassifier(object):
+    """
+    Binary classifier wrapping a booster trained with the native XGBoost or
+    LightGBM API.
+
+    Subclasses implement decision(X), returning the probability of each
+    sample belonging to classes_[1].
+
+    Parameters
+    ----------
+    booster : xgboost.Booster or lightgbm.Booster
+        Trained booster with a binary logistic objective.
+    classes : array-like, optional
+        Class labels.
+    """
+
+    def __init__(self, booster, classes=(0, 1)):
+        self.booster_ = booster
+        self.classes_ = np.asarray(classes)
+
+    def get_booster(self):
+        """Return the underlying booster"""
+
+        return self.booster_
+
+    def predict_proba(self, X):
+        """
+        Predict class probabilities for X.
+
+        Parameters
+        ----------
+        X : array-like, shape = [n_samples, n_features]
+            Input samples.
+
+        Returns
+        -------
+        p : array, shape = [n_samples, 2]
+            Class probabilities of the input samples.
+        """
+
+        p = self.decision(X)
+
+        return np.column_stack((1 - p, p))
+
+    def predict(self, X):
+        """
+        Predict class for X.
+
+        Parameters
+        ----------
+        X : array-like, shape = [n_samples, n_features]
+            Input samples.
+
+        Returns
+        -------
+        y : array, shape = [n_samples]
+            Predicted classes.
+        """
+
+        return self.classes_.take((self.decision(X) > 0.5).astype(np.intp))
+
+
+class XGBBoosterClassifier(BoosterClassifier):
+    """
+    Binary classifier wrapping a booster trained with xgboost.train.
+
+    Parameters
+    ----------
+    booster : xgboost.Booster
+        Trained booster with a binary logistic objective.
+    n_features : int
+        Number of features the booster was trained on.
+    classes : array-like, optional
+        Class labels.
+    """
+
+    def __init__(self, booster, n_features, classes=(0, 1)):
+        super(XGBBoosterClassifier, self).__init__(booster, classes)
+        self.n_features_ = n_features
+
+    def decision(self, X):
+        from xgboost import DMatrix
+
+        return self.booster_.predict(DMatrix(np.asarray(X)))
+
+    @property
+    def feature_importances_(self):
+        """Number of splits on each feature, normalised to unity"""
+
+        fscore = self.booster_.get_fscore()
+        importances = np.array([fscore.get("f{}".format(i), 0.)
+                                for i in range(self.n_features_)])
+
+        return importances / max(importances.sum(), 1)
+
+
+class LGBMBoosterClassifier(BoosterClassifier):
+    """
+    Binary classifier wrapping a booster trained with lightgbm.train.
+    """
+
+    def decision(self, X):
+        return self.booster_.predict(np.asarray(X))
+
+    @property
+    def feature_importances_(self):
+        """Number of splits on each feature"""
+
+        return self.booster_.feature_importance()
+
+
+def cached_dataset(path, construct, load):
+    """
+    Load a binary training dataset, constructing and saving it first if it
+    does not already exist.
+
+    Parameters
+    ----------
+    path : string
+        Path of the binary dataset.
+    construct : callable
+        Callable taking no arguments and returning a dataset with a
+        save_binary method, such as a lightgbm.Dataset or xgboost.DMatrix.
+    load : callable
+        Callable taking path and returning the saved dataset.
+
+    Returns
+    -------
+    Dataset constructed by construct or load.
+
+    Notes
+    -----
+    The dataset is written to a temporary file which is then renamed, so
+    concurrent runs never read a partially written dataset.
+    """
+
+    if os.path.exists(path):
+        print("Loading cached dataset", path)
+        return load(path)
+
+    dataset = construct()
+
+    tmp = "{}.{}.tmp".format(path, os.getpid())
+    dataset.save_binary(tmp)
+    os.rename(tmp, path)
+
+    return dataset
+
 
-def get_preprocessor_flags(pre, sample_weight):
+def fit_preprocessors(pre, X, y, sample_weight=None, transform=True):
+    """
+    Fit a list of preprocessing steps in sequence and return the
+    transformed data.
+
+    Parameters
+    ----------
+    pre : list
+        List containing preprocessing steps.
+    X : array-like, shape = [n_samples, n_features]
+        Training data.
+    y : array-like, shape = [n_samples]
+        Target values.
+    sample_weight : array-like, shape = [n_samples], optional
+        Sample weights, passed to the steps whose fit method accepts them.
+    transform : bool, optional
+        If False, the last step is only fitted, so that the fully transformed
+        data is never held in memory, and None is returned.
+
+    Returns
+    -------
+    X : array-like or None
+        Transformed data.
+    """
+
+    try:
+        from inspect import getfullargspec as getargspec
+    except ImportError:  # Python 2
+        from inspect import getargspec
+
+    for i, p in enumerate(pre):
+        flags = ({"sample_weight": sample_weight}
+                 if sample_weight is not None
+                 and "sample_weight" in getargspec(p.fit)[0] else {})
+        p.fit(X, y, **flags)
+        if transform or i < len(pre) - 1:
+            X = p.transform(X)
+
+    return X if transform else None
+
+
+def warm_start_steps(mva, cls, deep_copy=True):
+    """
+    Split a previously trained pipeline into its preprocessing steps and
+    final estimator, so training can be continued.
+
+    Parameters
+    ----------
+    mva : Pipeline
+        Trained classifier.
+    cls : type or tuple of types
+        Class the final estimator is expected to be an instance of.
+    deep_copy : bool, optional
+        Whether to return deep copies of the steps, so that continuing
+        training leaves mva untouched. Estimators which cannot be deep copied,
+        such as Keras classifiers, must then be copied by the caller.
+
+    Returns
+    -------
+    pre : list
+        Trained preprocessing steps.
+    est
+        Trained final estimator.
+    """
+
+    steps = [step for _, step in mva.steps]
+    if deep_copy:
+        steps = copy.deepcopy(steps)
+    pre, est = steps[:-1], steps[-1]
+
+    if isinstance(est, FlatForest):
+        raise ValueError("Cannot warm start a classifier flattened when saved "
+                         "with classifier_mmap: ", type(est).__name__)
+    if not isinstance(est, cls):
+        raise ValueError("Cannot warm start ",
+                         getattr(cls, "__name__", cls), " from ",
+                         type(est).__name__)
+
+    return pre, est
+
+
+def transform(pre, X):
+    """
+    Apply a list of trained preprocessing steps to X.
+
+    Parameters
+    ----------
+    pre : list
+        List containing trained preprocessing steps.
+    X : array-like, shape = [n_samples, n_features]
+        Data to be transformed.
 
-    from inspect import getargspec
+    Returns
+    -------
+    X : array-like
+        Transformed data.
+    """
+
+    for p in pre:
+        X = p.transform(X)
 
-    return {(type(p).__name__.lower() + "__sample_weight"): sample_weight
-            for p in pre if "sample_weight" in getargspec(p.fit)[0]}
+    return X
 
 
-def evaluate_mva(df, mva):
+def evaluate_mva(df, mva, batch_size=None):
     """
     Evaluate the response of a trained classifier.
 
@@ -42,6 +524,9 @@ def evaluate_mva(df, mva):
         DataFrame containing features.
     mva
         Trained classifier.
+    batch_size : int, optional
+        If given, the classifier is evaluated on at most this many events at
+        a time, limiting the memory used by intermediate results.
 
     Returns
     -------
@@ -54,9 +539,15 @@ def evaluate_mva(df, mva):
     predict_proba method. By default this is passed the df DataFrame directly
     but in some cases this is not supported and df is passed as a numpy array.
     In the former case this function returns a Pandas Series and in the latter
-    a 1D array. This fallback has only been tested for Keras classifiers.
+    a 1D array. This fallback has only been tested for Keras classifiers. If
+    df is evaluated in batches, an array is always returned.
     """
 
+    if batch_size is not None and len(df) > batch_size:
+        return np.concatenate([np.asarray(evaluate_mva(df[i:i + batch_size],
+                                                       mva))
+                               for i in range(0, len(df), batch_size)])
+
     # Keras doesn't like DataFrames, error thrown depends on Keras version
     try:
         return mva.predict_proba(df)[:, 1]
@@ -66,7 +557,8 @@ def evaluate_mva(df, mva):
 
 def mlp(df_train, pre, y, serialized_model, sample_weight=None,
         model_params={}, early_stopping_params=None, compile_params={},
-        lr_reduction_params=None):
+        lr_reduction_params=None, warm_start=None, validation_split=0.25,
+        chunk_size=100000, memmap_dir=None):
     """
     Train using a multi-layer perceptron (MLP).
 
@@ -85,12 +577,28 @@ def mlp(df_train, pre, y, serialized_model, sample_weight=None,
         Sample weights. If None, then samples are equally weighted.
     model_params : dict
         Keyword arguments passed to
-        keras.wrappers.scikit_learn.KerasClassifier.
+        keras.wrappers.scikit_learn.KerasClassifier. Callbacks given here are
+        used with those configured below, and shuffle sets whether the
+        training batches are redrawn every epoch. validation_data cannot be
+        given.
     early_stopping_params : dict
         Keyword arguments passed to keras.callbacks.EarlyStopping. If None, no
         early stopping mechanism is used.
     compile_params : dict
         Keyword arguments passed to keras.models.Sequential.compile.
+    warm_start : Pipeline, optional
+        Previously trained MLP pipeline. If given, a copy of its network,
+        compiled with compile_params, is trained for a further number of
+        epochs given in model_params, and its trained preprocessing steps are
+        used in place of pre.
+    validation_split : float, optional
+        Fraction of the training sample randomly set aside for validation.
+    chunk_size : int, optional
+        Number of events preprocessed at a time. Training samples no larger
+        than this are kept in memory rather than memory-mapped.
+    memmap_dir : string, optional
+        Directory in which the temporary memory-mapped array is created. If
+        None, the system default is used, which may be held in memory.
 
     Returns
     -------
@@ -106,14 +614,23 @@ def mlp(df_train, pre, y, serialized_model, sample_weight=None,
 
     Keras should outperform scikit-learn's internal MLP implementation in most
     cases, and supports sample weights while training.
+
+    The preprocessed training features are written in chunks to a temporary
+    memory-mapped float32 array, from which batches are drawn by a generator.
+    Shuffling permutes indices, so the training data is never copied in
+    memory. The array is deleted once training finishes.
     """
 
+    from keras.models import Sequential
+    from keras.utils import Sequence
+    from keras.wrappers.scikit_learn import KerasClassifier
+
     def build_model():
         from keras.layers import deserialize
 
         # Set input layer shape
         serialized_model["config"][0]["config"]["batch_input_shape"] \
-            = (None, df_train.shape[1])
+            = (None, X.shape[1])
 
         model = deserialize(serialized_model)
 
@@ -121,7 +638,28 @@ def mlp(df_train, pre, y, serialized_model, sample_weight=None,
 
         return model
 
-    from keras.wrappers.scikit_learn import KerasClassifier
+    class BatchSequence(Sequence):
+        """
+        Batches of features, targets, and weights drawn from the training
+        arrays by index, reshuffled by permuting the indices every epoch.
+        """
+
+        def __init__(self, idx, shuffle=False):
+            self.idx = idx
+            self.shuffle = shuffle
+            self.on_epoch_end()
+
+        def __len__(self):
+            return (len(self.idx) + batch_size - 1) // batch_size
+
+        def __getitem__(self, i):
+            # Sorted indices read the memory map sequentially
+            batch = np.sort(self.idx[i * batch_size:(i + 1) * batch_size])
+            return X[batch], y[batch], sample_weight[batch]
+
+        def on_epoch_end(self):
+            if self.shuffle:
+                np.random.shuffle(self.idx)
 
     callbacks = []
 
@@ -133,34 +671,79 @@ def mlp(df_train, pre, y, serialized_model, sample_weight=None,
         from keras.callbacks import EarlyStopping
         callbacks.append(EarlyStopping(**early_stopping_params))
 
-    ann = KerasClassifier(build_fn=build_model, **model_params)
+    if warm_start is not None:
+        from keras.models import clone_model
 
-    mva = make_pipeline(*(pre + [ann]))
+        pre, saved = warm_start_steps(warm_start, KerasClassifier,
+                                      deep_copy=False)
+        pre = copy.deepcopy(pre)
 
-    # Keras does not like pandas
-    try:
-        df_train = df_train.as_matrix()
-    except AttributeError:
-        pass
-    try:
-        y = y.as_matrix()
-    except AttributeError:
-        pass
-    try:
-        sample_weight = sample_weight.as_matrix()
-    except AttributeError:
-        pass
-
-    mva.fit(df_train, y,
-            kerasclassifier__sample_weight=sample_weight,
-            kerasclassifier__callbacks=callbacks,
-            kerasclassifier__validation_split=0.25,
-            **get_preprocessor_flags(pre, sample_weight))
-
-    return mva
+        def build_model():
+            model = clone_model(saved.model)
+            model.set_weights(saved.model.get_weights())
+            model.compile(**compile_params)
 
+            return model
+    else:
+        fit_preprocessors(pre, df_train, y, sample_weight=sample_weight,
+                          transform=False)
 
-def bdt_grad(df_train, pre, y, sample_weight=None, **kwargs):
+    ann = KerasClassifier(build_fn=build_model, **model_params)
+    batch_size = ann.sk_params.get("batch_size", 32)
+
+    # Parameters of fit_generator also set below
+    fit_params = ann.filter_sk_params(Sequential.fit_generator)
+    if "validation_data" in fit_params:
+        raise ValueError("Unsupported option in model_params, use "
+                         "validation_split instead: ", "validation_data")
+    callbacks.extend(fit_params.pop("callbacks", None) or [])
+    shuffle = fit_params.pop("shuffle", True)
+
+    n = len(df_train)
+    classes = np.unique(y)
+    y = np.asarray(y, dtype=np.float32)
+    sample_weight = (np.ones(n, dtype=np.float32) if sample_weight is None
+                     else np.asarray(sample_weight, dtype=np.float32))
+
+    tmp_dir = None
+    try:
+        if n <= chunk_size:
+            X = np.asarray(transform(pre, np.asarray(df_train)),
+                           dtype=np.float32)
+        else:
+            # Write the preprocessed features to a memory-mapped array in
+            # chunks so the training data is never duplicated in memory
+            tmp_dir = tempfile.mkdtemp(dir=memmap_dir)
+            X = None
+            for start in range(0, n, chunk_size):
+                chunk = transform(pre, np.asarray(df_train[start:start +
+                                                           chunk_size]))
+                if X is None:
+                    X = np.lib.format.open_memmap(
+                        os.path.join(tmp_dir, "X.npy"), mode="w+",
+                        dtype=np.float32, shape=(n, chunk.shape[1]))
+                X[start:start + len(chunk)] = chunk
+
+        idx = np.random.permutation(n)
+        n_val = int(round(validation_split * n))
+
+        ann.model = build_model()
+        ann.classes_ = classes
+        ann.n_classes_ = len(classes)
+        ann.model.fit_generator(
+            BatchSequence(idx[n_val:], shuffle=shuffle),
+            validation_data=BatchSequence(idx[:n_val]) if n_val else None,
+            callbacks=callbacks, shuffle=False, **fit_params)
+    finally:
+        X = None
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir)
+
+    return make_pipeline(*(pre + [ann]))
+
+
+def bdt_grad(df_train, pre, y, sample_weight=None, warm_start=None,
+             **kwargs):
     """
     Train using a gradient boosted decision tree using scikit-learn's
     internal implementation.
@@ -176,6 +759,11 @@ def bdt_grad(df_train, pre, y, sample_weight=None, **kwargs):
         For classification, labels must correspond to classes.
     sample_weight : array-like, shape = [n_training_samples]
         Sample weights. If None, then samples are equally weighted.
+    warm_start : Pipeline, optional
+        Previously trained pipeline. If given, boosting is continued from its
+        classifier with n_estimators additional stages, and its trained
+        preprocessing steps are used in place of pre. Classifiers saved with
+        mmap=True are flattened and cannot be warm started.
     kwargs : dict
         Additional keyword arguments passed to
         sklearn.ensemble.GradientBoostingClassifier.
@@ -189,6 +777,15 @@ def bdt_grad(df_train, pre, y, sample_weight=None, **kwargs):
 
     from sklearn.ensemble import GradientBoostingClassifier
 
+    if warm_start is not None:
+        pre, bdt = warm_start_steps(warm_start, GradientBoostingClassifier)
+        kwargs["n_estimators"] = bdt.n_estimators_ + kwargs.get(
+            "n_estimators", GradientBoostingClassifier().n_estimators)
+        bdt.set_params(warm_start=True, **kwargs)
+        bdt.fit(transform(pre, df_train), y, sample_weight=sample_weight)
+
+        return make_pipeline(*(pre + [bdt]))
+
     bdt = GradientBoostingClassifier(**kwargs)
 
     mva = make_pipeline(*(pre + [bdt]))
@@ -199,7 +796,72 @@ def bdt_grad(df_train, pre, y, sample_weight=None, **kwargs):
     return mva
 
 
-def bdt_xgb(df_train, pre, y, sample_weight=None, **kwargs):
+def bdt_hist(df_train, pre, y, sample_weight=None, warm_start=None,
+             **kwargs):
+    """
+    Train using a histogram-based gradient boosted decision tree.
+
+    Parameters
+    ----------
+    df_train : array-like, shape = [n_training_samples, n_features]
+        DataFrame containing training features.
+    pre : list
+        List containing preprocessing steps.
+    y : array-like, shape = [n_training_samples]
+        Target values (integers in classification, real numbers in regression).
+        For classification, labels must correspond to classes.
+    sample_weight : array-like, shape = [n_training_samples]
+        Sample weights. If None, then samples are equally weighted.
+    warm_start : Pipeline, optional
+        Previously trained pipeline. If given, boosting is continued from its
+        classifier with n_estimators additional stages, and its trained
+        preprocessing steps are used in place of pre.
+    kwargs : dict
+        Additional keyword arguments passed to
+        tact.boosting.HistGradientBoostingClassifier.
+
+    Returns
+    -------
+    Pipeline
+        Scikit-learn pipeline containing the trained classifier and
+        preprocessing steps.
+
+    Notes
+    -----
+    Features are binned once before training, so this is much faster than
+    bdt_grad on large samples while only requiring scikit-learn.
+
+    Training is single-threaded apart from binning: n_jobs threads find bin
+    edges and bin features, but the histograms from which trees are grown
+    are filled by np.bincount in the calling thread. Kernels releasing the
+    GIL (a stable argsort of the bin codes, or np.add.at) are 5 to 15 times
+    slower than np.bincount, so would only gain on many cores.
+    """
+
+    from tact.boosting import HistGradientBoostingClassifier
+
+    if warm_start is not None:
+        pre, bdt = warm_start_steps(warm_start,
+                                    HistGradientBoostingClassifier)
+        kwargs["n_estimators"] = len(bdt.roots_) + kwargs.get(
+            "n_estimators", HistGradientBoostingClassifier().n_estimators)
+        bdt.set_params(warm_start=True, **kwargs)
+        bdt.fit(transform(pre, df_train), y, sample_weight=sample_weight)
+
+        return make_pipeline(*(pre + [bdt]))
+
+    bdt = HistGradientBoostingClassifier(**kwargs)
+
+    mva = make_pipeline(*(pre + [bdt]))
+
+    mva.fit(df_train, y,
+            histgradientboostingclassifier__sample_weight=sample_weight)
+
+    return mva
+
+
+def bdt_xgb(df_train, pre, y, sample_weight=None, warm_start=None, cache=None,
+            **kwargs):
     """
     Train using a gradient boosted decision tree with the XGBoost library.
 
@@ -214,6 +876,19 @@ def bdt_xgb(df_train, pre, y, sample_weight=None, **kwargs):
         For classification, labels must correspond to classes.
     sample_weight : array-like, shape = [n_training_samples]
         Sample weights. If None, then samples are equally weighted.
+    warm_start : Pipeline, optional
+        Previously trained pipeline. If given, boosting is continued from its
+        booster with n_estimators additional rounds, and its trained
+        preprocessing steps are used in place of pre.
+    cache : string, optional
+        Path prefix identifying the training sample and its preprocessing,
+        including any warm started classifier. If given, the DMatrix
+        built from the preprocessed training data is saved to a binary file
+        starting with this prefix, and loaded from it by later calls instead
+        of being rebuilt. The booster is then trained with xgboost.train and
+        wrapped in an XGBBoosterClassifier. Only the conversion of the data is
+        saved: unlike LightGBM, XGBoost still bins the features (with
+        tree_method "hist" or "approx") in every call.
     kwargs : dict
         Additional keyword arguments passed to xgboost.XGBClassifier.
 
@@ -226,11 +901,51 @@ def bdt_xgb(df_train, pre, y, sample_weight=None, **kwargs):
     Notes
     -----
     Requires xgboost.
+
+    XGBoost recomputes its quantile sketch in every call to xgboost.train, so
+    the cache only removes the cost of converting the training data. Binned
+    data cannot be cached: xgboost 0.71 has no QuantileDMatrix, and later
+    versions cannot save one to a file.
     """
 
     from xgboost import XGBClassifier
 
     bdt = XGBClassifier(**kwargs)
+    init = None
+
+    if warm_start is not None:
+        pre, init = warm_start_steps(warm_start, (XGBClassifier,
+                                                  XGBBoosterClassifier))
+        init = init.get_booster()
+
+    if cache is not None:
+        import xgboost as xgb
+
+        X = (fit_preprocessors(pre, df_train, y) if warm_start is None
+             else transform(pre, df_train))
+
+        path = "{}xgb_{}.buffer".format(cache, cache_key(bdt.missing))
+        dtrain = cached_dataset(
+            path,
+            lambda: xgb.DMatrix(np.asarray(X), label=np.asarray(y),
+                                weight=(None if sample_weight is None
+                                        else np.asarray(sample_weight)),
+                                missing=bdt.missing),
+            xgb.DMatrix)
+
+        params = bdt.get_xgb_params()
+        params.pop("n_estimators", None)
+
+        booster = xgb.train(params, dtrain, bdt.n_estimators, xgb_model=init)
+
+        return make_pipeline(*(pre + [XGBBoosterClassifier(booster,
+                                                            X.shape[1])]))
+
+    if warm_start is not None:
+        bdt.fit(transform(pre, df_train), y, sample_weight=sample_weight,
+                xgb_model=init)
+
+        return make_pipeline(*(pre + [bdt]))
 
     mva = make_pipeline(*(pre + [bdt]))
 
@@ -242,7 +957,8 @@ def bdt_xgb(df_train, pre, y, sample_weight=None, **kwargs):
     return mva
 
 
-def bdt_lgbm(df_train, pre, y, sample_weight=None, **kwargs):
+def bdt_lgbm(df_train, pre, y, sample_weight=None, warm_start=None,
+             cache=None, **kwargs):
     """
     Train using a gradient boosted decision tree with the LightGBM library.
 
@@ -257,6 +973,18 @@ def bdt_lgbm(df_train, pre, y, sample_weight=None, **kwargs):
         For classification, labels must correspond to classes.
     sample_weight : array-like, shape = [n_training_samples]
         Sample weights. If None, then samples are equally weighted.
+    warm_start : Pipeline, optional
+        Previously trained pipeline. If given, boosting is continued from its
+        booster with n_estimators additional rounds, and its trained
+        preprocessing steps are used in place of pre.
+    cache : string, optional
+        Path prefix identifying the training sample and its preprocessing. If
+        given, the binned
+        lightgbm.Dataset built from the preprocessed training data is saved to
+        a binary file starting with this prefix, and loaded from it by later
+        calls instead of being rebuilt. The booster is then trained with
+        lightgbm.train and wrapped in an LGBMBoosterClassifier. The cache is
+        not used when warm starting.
     kwargs : dict
         Additional keyword arguments passed to lightgbm.LGBMClassifier()
 
@@ -274,6 +1002,50 @@ def bdt_lgbm(df_train, pre, y, sample_weight=None, **kwargs):
     from lightgbm import LGBMClassifier
 
     bdt = LGBMClassifier(**kwargs)
+    init = None
+
+    if warm_start is not None:
+        pre, init = warm_start_steps(warm_start, (LGBMClassifier,
+                                                  LGBMBoosterClassifier))
+        init = init.booster_
+
+    if cache is not None:
+        import lightgbm as lgb
+
+        X = (fit_preprocessors(pre, df_train, y) if warm_start is None
+             else transform(pre, df_train))
+
+        params = dict(kwargs)
+        n_estimators = params.pop("n_estimators", bdt.n_estimators)
+        params.setdefault("objective", "binary")
+        params.setdefault("verbose", -1 if params.pop("silent", True) else 1)
+
+        def construct():
+            return lgb.Dataset(np.asarray(X), label=np.asarray(y),
+                               weight=sample_weight, params=params)
+
+        # LightGBM evaluates the initial model on the raw training data, which
+        # binary datasets do not contain
+        if init is not None:
+            dtrain = construct()
+        else:
+            # Only parameters affecting binning invalidate the cached dataset
+            path = "{}lgbm_{}.bin".format(cache, cache_key(
+                {k: v for k, v in params.items()
+                 if k in LGBM_DATASET_PARAMS}))
+            dtrain = cached_dataset(
+                path, construct,
+                lambda path: lgb.Dataset(path, params=params))
+
+        booster = lgb.train(params, dtrain, n_estimators, init_model=init)
+
+        return make_pipeline(*(pre + [LGBMBoosterClassifier(booster)]))
+
+    if warm_start is not None:
+        bdt.fit(transform(pre, df_train), y, sample_weight=sample_weight,
+                init_model=init)
+
+        return make_pipeline(*(pre + [bdt]))
 
     mva = make_pipeline(*(pre + [bdt]))
 
@@ -282,7 +1054,8 @@ def bdt_lgbm(df_train, pre, y, sample_weight=None, **kwargs):
     return mva
 
 
-def random_forest(df_train, pre, y, sample_weight=None, **kwargs):
+def random_forest(df_train, pre, y, sample_weight=None, warm_start=None,
+                  **kwargs):
     """
     Train using a random forest.
 
@@ -297,6 +1070,11 @@ def random_forest(df_train, pre, y, sample_weight=None, **kwargs):
         For classification, labels must correspond to classes.
     sample_weight : array-like, shape = [n_training_samples]
         Sample weights. If None, then samples are equally weighted.
+    warm_start : Pipeline, optional
+        Previously trained pipeline. If given, n_estimators additional trees
+        are grown on the new data and added to its forest, and its trained
+        preprocessing steps are used in place of pre. Forests saved with
+        mmap=True are flattened and cannot be warm started.
     kwargs : dict
         Additional keyword arguments passed to xgboost.XGBClassifier.
 
@@ -309,6 +1087,15 @@ def random_forest(df_train, pre, y, sample_weight=None, **kwargs):
 
     from sklearn.ensemble import RandomForestClassifier
 
+    if warm_start is not None:
+        pre, rf = warm_start_steps(warm_start, RandomForestClassifier)
+        kwargs["n_estimators"] = len(rf.estimators_) + kwargs.get(
+            "n_estimators", RandomForestClassifier().n_estimators)
+        rf.set_params(warm_start=True, **kwargs)
+        rf.fit(transform(pre, df_train), y, sample_weight=sample_weight)
+
+        return make_pipeline(*(pre + [rf]))
+
     rf = RandomForestClassifier(**kwargs)
 
     mva = make_pipeline(*(pre + [rf]))
@@ -318,7 +1105,7 @@ def random_forest(df_train, pre, y, sample_weight=None, **kwargs):
     return mva
 
 
-def save_classifier(mva, cfg=None, filename="mva"):
+def save_classifier(mva, cfg=None, filename="mva", mmap=False):
     """
     Write a trained classifier pipeline and global configuration to an external
     file.
@@ -332,6 +1119,14 @@ def save_classifier(mva, cfg=None, filename="mva"):
     filename : string, optional
         Name of output file (including directory). Extension will be set
         automatically.
+    mmap : bool, optional
+        If True, write a ".joblib" file whose arrays can be memory-mapped by
+        load_classifier, flattening random forests and scikit-learn gradient
+        boosted classifiers first. Otherwise (the default) write a ".pkl" file
+        using dill. Flattened classifiers can be evaluated but not warm
+        started. Only random_forest, bdt_grad and bdt_hist share memory
+        between processes when loaded; XGBoost and LightGBM boosters are
+        still read into private memory.
 
     Returns
     -------
@@ -339,30 +1134,41 @@ def save_classifier(mva, cfg=None, filename="mva"):
 
     Notes
     -----
-    Requires dill.
+    Requires dill. Keras classifiers cannot be saved with mmap=True.
     """
 
-    import dill
-
-    SavedClassifier = namedtuple("SavedClassifier", "cfg mva")
-
     # Temporarily boost the recursion limit
     tmp = sys.getrecursionlimit()
     sys.setrecursionlimit(9999)
 
-    dill.dump(SavedClassifier(cfg, mva), open("{}.pkl".format(filename), "wb"))
+    try:
+        if mmap:
+            from sklearn.externals import joblib
+
+            joblib.dump(SavedClassifier(cfg, flatten_forests(mva)),
+                        "{}.joblib".format(filename))
+        else:
+            import dill
 
-    sys.setrecursionlimit(tmp)
+            with open("{}.pkl".format(filename), "wb") as f:
+                dill.dump(SavedClassifier(cfg, mva), f)
+    finally:
+        sys.setrecursionlimit(tmp)
 
 
-def load_classifier(f):
+def load_classifier(f, mmap_mode="r"):
     """
-    Load a trained classifier from a pickle file.
+    Load a trained classifier from a pickle or joblib file.
 
     Parameters
     ----------
-    f : file
-        File classifier is to be loaded from.
+    f : file or string
+        File classifier is to be loaded from, or its path. Files with the
+        ".joblib" extension are loaded using joblib.
+    mmap_mode : None or string, optional
+        Memory-mapping mode used for the arrays of classifiers loaded by path
+        from a ".joblib" file. Read-only by default, so that the arrays are
+        shared between every process loading the same file.
 
     Returns
     -------
@@ -377,8 +1183,19 @@ def load_classifier(f):
     Requires dill.
     """
 
+    if not hasattr(f, "read") and f.endswith(".joblib"):
+        from sklearn.externals import joblib
+
+        sc = joblib.load(f, mmap_mode=mmap_mode)
+
+        return sc.mva, sc.cfg
+
     import dill
 
-    sc = dill.load(f)
+    if hasattr(f, "read"):
+        sc = dill.load(f)
+    else:
+        with open(f, "rb") as fh:
+            sc = dill.load(fh)
 
     return sc.mva, sc.cfg
@@ -8,24 +8,31 @@ metrics to stdout.
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import multiprocessing
+
 import numpy as np
 from scipy.stats import kstwobign
 from sklearn.metrics import classification_report, confusion_matrix
-from tact import classifiers
+from sklearn.utils import check_random_state
+from tact import classifiers, resources
 
 
 def print_metrics(mva, df_train, df_test,
                   y_train, y_test,
                   mva_response_train=None, mva_response_test=None,
-                  w_train=None, w_test=None):
+                  w_train=None, w_test=None, permutation_params=None,
+                  bootstrap_params=None):
     """
     Print metrics for a trained classifier to stdout.
 
     This will print the classification report from scikit-learn for the test
     and training sample and the confusion matrix for the test and training
-    sample. The p-value for the two-sample Kolmogorov-Smirnov test performed on
-    the test and training samples will b given for the signal and background.
-    Finally, if supported by the classifier, feature importances will be shown.
+    sample. The ROC AUC of both samples and the p-value for the two-sample
+    Kolmogorov-Smirnov test performed on the test and training samples will b
+    given for the signal and background, with bootstrap errors if requested.
+    Finally, if supported by the classifier, feature importances will be shown,
+    followed by permutation importances measured on the test sample if
+    requested.
 
     Parameters
     ----------
@@ -49,6 +56,13 @@ def print_metrics(mva, df_train, df_test,
     w_test : array-like, shape = [n_testing_samples], optional
         Observation weights for df_test. If None, then samples are equally
         weighted.
+    permutation_params : dict, optional
+        If not None, permutation importances are calculated on df_test,
+        passing these keyword arguments to permutation_importance.
+    bootstrap_params : dict, optional
+        If not None, errors on the ROC AUC and KS test p-values are estimated
+        as the standard deviation over bootstrap replicates, passing these
+        keyword arguments to bootstrap_auc and bootstrap_ks_2samp.
 
     Returns
     -------
@@ -65,30 +79,70 @@ def print_metrics(mva, df_train, df_test,
 
     print("\nClassification Reports:")
     print("Test sample:")
-    print(classification_report(y_test, test_prediction,
+    print(classification_report(y_test, test_prediction, labels=[0, 1],
                                 target_names=["background", "signal"]))
     print("Training sample:")
-    print(classification_report(y_train, train_prediction,
+    print(classification_report(y_train, train_prediction, labels=[0, 1],
                                 target_names=["background", "signal"]))
 
     print("Confusion matrix:")
     print("Test sample:")
-    print(confusion_matrix(y_test, test_prediction))
+    print(confusion_matrix(y_test, test_prediction, labels=[0, 1]))
     print("Training sample:")
-    print(confusion_matrix(y_train, train_prediction))
+    print(confusion_matrix(y_train, train_prediction, labels=[0, 1]))
+    print()
+
+    y_train = np.asarray(y_train)
+    y_test = np.asarray(y_test)
+    mva_response_train = np.asarray(mva_response_train)
+    mva_response_test = np.asarray(mva_response_test)
+    w_train = (np.ones(len(y_train)) if w_train is None
+               else np.asarray(w_train, dtype=np.float64))
+    w_test = (np.ones(len(y_test)) if w_test is None
+              else np.asarray(w_test, dtype=np.float64))
+
+    def with_error(value, replicates):
+        if replicates is None:
+            return value
+        return "{0:.3E} ± {1:.3E}".format(value, np.std(replicates, ddof=1))
+
+    print("ROC AUC:")
+    for name, y, response, w in (
+            ("Test", y_test, mva_response_test, w_test),
+            ("Training", y_train, mva_response_train, w_train)):
+        print("{} sample:".format(name))
+        print(with_error(roc_auc(y, response, w),
+                         None if bootstrap_params is None
+                         else bootstrap_auc(y, response, w,
+                                            **bootstrap_params)))
     print()
 
+    # Signal and background are tested together, grouped by label. Labels
+    # missing from either sample cannot be tested.
+    shared = np.intersect1d(y_train, y_test)
+    labels, p = [], []
+    if len(shared):
+        in_train = np.isin(y_train, shared)
+        in_test = np.isin(y_test, shared)
+        labels, _, p = ks_2samp_batch(
+            mva_response_train[in_train], mva_response_test[in_test],
+            y_train[in_train], y_test[in_test], w_train[in_train],
+            w_test[in_test])
+
     print("KS Test p-value:")
-    print("Signal:")
-    print(ks_2samp(mva_response_train[y_train == 1],
-                   mva_response_test[y_test == 1],
-                   None if w_train is None else w_train[y_train == 1],
-                   None if w_test is None else w_test[y_test == 1])[1])
-    print("Background:")
-    print(ks_2samp(mva_response_train[y_train == 0],
-                   mva_response_test[y_test == 0],
-                   None if w_train is None else w_train[y_train == 0],
-                   None if w_test is None else w_test[y_test == 0])[1])
+    for name, label in (("Signal", 1), ("Background", 0)):
+        print("{}:".format(name))
+        if label not in labels:
+            print("No {} events in one of the samples".format(name.lower()))
+            continue
+        print(with_error(p[list(labels).index(label)],
+                         None if bootstrap_params is None
+                         else bootstrap_ks_2samp(
+                             mva_response_train[y_train == label],
+                             mva_response_test[y_test == label],
+                             w_train[y_train == label],
+                             w_test[y_test == label],
+                             **bootstrap_params)[1]))
     print()
 
     # Try really hard to get the feature importances
@@ -127,6 +181,205 @@ def print_metrics(mva, df_train, df_test,
         pass
     print()
 
+    if permutation_params is not None:
+        importances, errors = permutation_importance(
+            mva, df_test, y_test, w_test, **permutation_params)
+
+        print("Permutation importance (decrease in test ROC AUC):")
+        for var, importance, error in sorted(
+                zip(list(df_test), importances, errors),
+                key=lambda x: x[1],
+                reverse=True):
+            print("{0:15} {1:.3E} ± {2:.3E}".format(var, importance, error))
+        print()
+
+
+class ECDF(object):
+    """
+    Weighted empirical cumulative distribution function (ECDF) of a set of
+    observations.
+
+    Parameters
+    ----------
+    x : array_like
+        Observations
+    xw : array_like, optional
+        The weight of each observation, should be the same length as x. If
+        omitted or None, each observation will be given equal weight.
+
+    Attributes
+    ----------
+    x : array
+        Distinct observed values, sorted.
+    cw : array, shape=len(x) + 1
+        Value of the ECDF below x[0] (zero) and at each value of x.
+    total : float
+        Sum of weights.
+    sumw2 : float
+        Sum of squared weights.
+
+    Notes
+    -----
+    ECDFs of chunks of a sample can be merged to give the ECDF of the whole
+    sample, and are saved to and loaded from .npz files.
+    """
+
+    __slots__ = ("x", "cw", "total", "sumw2")
+
+    def __init__(self, x, xw=None):
+        x = np.asarray(x, dtype=np.float64)
+        if xw is None:
+            xw = np.ones(len(x))
+        xw = np.asarray(xw, dtype=np.float64)
+
+        w_sum = xw.sum()
+
+        if w_sum <= 0:
+            raise ValueError("Normalisation of weights should be positive, "
+                             "is: ", w_sum)
+
+        idx = np.argsort(x)
+        self._set(x[idx], xw[idx], w_sum, np.sum(xw ** 2))
+
+    def _set(self, x, w, total, sumw2):
+        """Store the sorted observations x with weights w"""
+
+        # Tied observations are kept as one value
+        last = np.append(x[1:] != x[:-1], True)
+
+        self.x = np.ascontiguousarray(x[last])
+        self.cw = np.concatenate(([0.], np.cumsum(w)[last] / total))
+        self.total = float(total)
+        self.sumw2 = float(sumw2)
+
+    def __call__(self, v):
+        """
+        Evaluate the ECDF at the values v (float or array-like).
+        """
+
+        return self.cw[np.searchsorted(self.x, v, side="right")]
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getstate__(self):
+        return self.x, self.cw, self.total, self.sumw2
+
+    def __setstate__(self, state):
+        self.x, self.cw, self.total, self.sumw2 = state
+
+    @property
+    def n_eff(self):
+        """Effective number of observations, sum(w) ** 2 / sum(w ** 2)"""
+        return self.total ** 2 / self.sumw2
+
+    def weights(self):
+        """
+        Return the summed weight of the observations at each value of x.
+        """
+
+        return np.diff(self.cw) * self.total
+
+    def merge(self, other):
+        """
+        Combine with the ECDF of another set of observations.
+
+        Parameters
+        ----------
+        other : ECDF
+            ECDF to merge.
+
+        Returns
+        -------
+        ECDF
+            ECDF of the observations of both.
+        """
+
+        x = np.concatenate((self.x, other.x))
+        w = np.concatenate((self.weights(), other.weights()))
+        idx = np.argsort(x, kind="mergesort")
+
+        merged = ECDF.__new__(ECDF)
+        merged._set(x[idx], w[idx], self.total + other.total,
+                    self.sumw2 + other.sumw2)
+        return merged
+
+    def quantile(self, q):
+        """
+        Compute weighted quantiles.
+
+        Parameters
+        ----------
+        q : float or array-like
+            Quantiles in [0, 1].
+
+        Returns
+        -------
+        float or array
+            Smallest observed value at which the ECDF reaches each q.
+        """
+
+        # Negative weights can make the ECDF decrease
+        cw = np.maximum.accumulate(self.cw[1:])
+        idx = np.searchsorted(cw, q, side="left")
+        return self.x[np.minimum(idx, len(self.x) - 1)]
+
+    def distance(self, other):
+        """
+        Compute the largest absolute difference from another ECDF.
+
+        Parameters
+        ----------
+        other : ECDF
+            ECDF to compare to.
+
+        Returns
+        -------
+        float
+            Kolmogorov-Smirnov statistic.
+        """
+
+        v = np.concatenate((self.x, other.x))
+        return np.max(np.abs(self(v) - other(v)))
+
+    def save(self, f):
+        """
+        Save to an .npz file.
+
+        Parameters
+        ----------
+        f : string or file
+            Path of or file to save to.
+
+        Returns
+        -------
+        None
+        """
+
+        np.savez(f, x=self.x, cw=self.cw, total=self.total, sumw2=self.sumw2)
+
+    @staticmethod
+    def load(f):
+        """
+        Load an ECDF saved by ECDF.save.
+
+        Parameters
+        ----------
+        f : string or file
+            Path of or file to load from.
+
+        Returns
+        -------
+        ECDF
+        """
+
+        data = np.load(f)
+
+        loaded = ECDF.__new__(ECDF)
+        loaded.__setstate__((data["x"], data["cw"], float(data["total"]),
+                             float(data["sumw2"])))
+        return loaded
+
 
 def ecdf(x, xw=None):
     r"""
@@ -143,8 +396,8 @@ def ecdf(x, xw=None):
 
     Returns
     -------
-    ecdf : callable
-        ECDF
+    ecdf : ECDF
+        ECDF, callable on an array of values
 
     Notes
     -----
@@ -163,35 +416,7 @@ def ecdf(x, xw=None):
                                        \end{cases}.
     """
 
-    if xw is None:
-        xw = np.ones(len(x))
-
-    w_sum = xw.sum()
-
-    if w_sum <= 0:
-        raise ValueError("Normalisation of weights should be positive, is: ",
-                         w_sum)
-
-    # Sort if not sorted
-    if not (np.diff(x) >= 0).all():
-        idx = np.argsort(x)
-
-        try:
-            x = x.iloc[idx]
-        except AttributeError:
-            x = x[idx]
-        try:
-            xw = xw.iloc[idx]
-        except AttributeError:
-            xw = xw[idx]
-
-    # Accumulate weights
-    m = np.vstack(((-np.inf, 0),  # required for values < min(x)
-                   np.column_stack((x, np.cumsum(xw / w_sum)))))
-
-    # Return a function which gives the value of the ECDF at a given x
-    # (vectoried for array-like objects!)
-    return lambda v: m[np.searchsorted(m[:, 0], v, side="right") - 1, 1]
+    return ECDF(x, xw)
 
 
 def ks_2samp(a, b, aw=None, bw=None):
@@ -203,9 +428,10 @@ def ks_2samp(a, b, aw=None, bw=None):
 
     Parameters
     ----------
-    a, b : Sequence of 1D ndarrays
+    a, b : Sequence of 1D ndarrays or ECDFs
         Two arrays of sample observations assumed to be drawn from a continuous
-        distribution, sample sizes can be different.
+        distribution, sample sizes can be different. ECDFs of the samples
+        may be given instead, in which case the weights are not used.
     aw, bw: Sequence of 1D ndarrays, optional
         The weights of each observation in a, b. Must be the same length as the
         associated array of observations. If omitted or None, every measurement
@@ -245,18 +471,696 @@ def ks_2samp(a, b, aw=None, bw=None):
     115-122, 1970
     """
 
+    if isinstance(a, ECDF) or isinstance(b, ECDF):
+        if not isinstance(a, ECDF):
+            a = ECDF(a, aw)
+        if not isinstance(b, ECDF):
+            b = ECDF(b, bw)
+        D = a.distance(b)
+        return D, _ks_p_value(D, a.n_eff, b.n_eff)
+
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+
+    D, p = _ks_2samp(a, b, np.zeros(len(a), dtype=np.intp),
+                     np.zeros(len(b), dtype=np.intp), 1, aw, bw)
+
+    return D[0], p[0]
+
+
+def _ks_2samp(a, b, ia, ib, n_groups, aw=None, bw=None):
+    """
+    Compute the KS statistic and p-value of each group of a and b, given the
+    group indices ia, ib (in range(n_groups)) of their observations.
+    """
+
     # Methodology for weighted Kolmogorov-Smirnov test taken from Numerical
     # Methods of Statistics - J. Monahan
 
-    ab = np.sort(np.concatenate((a, b)))
+    aw = np.ones(len(a)) if aw is None else np.asarray(aw, dtype=np.float64)
+    bw = np.ones(len(b)) if bw is None else np.asarray(bw, dtype=np.float64)
+
+    a_sum = np.bincount(ia, aw, n_groups)
+    b_sum = np.bincount(ib, bw, n_groups)
+
+    w_sum = np.minimum(a_sum, b_sum).min()
+    if w_sum <= 0:
+        raise ValueError("Normalisation of weights should be positive, is: ",
+                         w_sum)
+
+    # Sort by value, then stably by group
+    x = np.concatenate((a, b))
+    g = np.concatenate((ia, ib))
+    idx = np.argsort(x)
+    if n_groups > 1:
+        idx = idx[np.argsort(g[idx], kind="mergesort")]
+    x = x[idx]
+    g = g[idx]
+    c = np.cumsum(np.concatenate((aw / a_sum[ia], -bw / b_sum[ib]))[idx])
+
+    # Each group sums to zero, up to rounding which is removed here
+    starts = np.flatnonzero(np.concatenate(([True], g[1:] != g[:-1])))
+    if n_groups > 1:
+        c -= np.repeat(np.concatenate(([0.], c[starts[1:] - 1])),
+                       np.diff(np.append(starts, len(c))))
+
+    # Compare ECDFs only after every observation of a value is included
+    last = np.append((x[1:] != x[:-1]) | (g[1:] != g[:-1]), True)
+    D = np.maximum.reduceat(np.where(last, np.abs(c), 0), starts)
+
+    n1 = a_sum ** 2 / np.bincount(ia, aw ** 2, n_groups)
+    n2 = b_sum ** 2 / np.bincount(ib, bw ** 2, n_groups)
+
+    return D, _ks_p_value(D, n1, n2)
+
+
+def _ks_p_value(D, n1, n2):
+    """
+    Two-tailed p-value of the KS statistic D of samples of effective sizes n1
+    and n2.
+    """
+
+    en = np.sqrt(n1 * n2 / (n1 + n2))
+
+    return kstwobign.sf((en + 0.12 + 0.11 / en) * D)  # Stephens (1970)
+
+
+def ks_2samp_batch(a, b, a_groups, b_groups, aw=None, bw=None):
+    """
+    Computes the Kolmogorov-Smirnov (KS) statistic on several pairs of
+    samples at once.
+
+    Parameters
+    ----------
+    a, b : 1D array-like
+        Sample observations of every group, concatenated.
+    a_groups, b_groups : 1D array-like
+        Label of the group of each observation in a, b. Observations in a are
+        compared with the observations in b with the same label.
+    aw, bw: 1D array-like, optional
+        The weights of each observation in a, b. If omitted or None, every
+        measurement will be assigned an equal weight.
+
+    Returns
+    -------
+    groups : array
+        Sorted group labels.
+    D : array
+        KS statistic of each group.
+    p-value : array
+        Two-tailed p-value of each group.
+
+    Notes
+    -----
+    See ks_2samp, which gives the same result for each group.
+
+    The observations of all groups are sorted together, once. Each
+    observation then carries its weight normalised to the total weight of its
+    sample in its group, negated for b, so that the cumulative sum of these
+    over a group is the difference of its ECDFs.
+    """
+
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+
+    groups, inv = np.unique(np.concatenate((np.asarray(a_groups),
+                                            np.asarray(b_groups))),
+                            return_inverse=True)
+
+    D, p = _ks_2samp(a, b, inv[:len(a)], inv[len(a):], len(groups), aw, bw)
+
+    return groups, D, p
+
+
+def _grouped_auc(inv, y, w):
+    """
+    Weighted ROC AUC given the index of each event's score among the sorted
+    unique scores.
+    """
+
+    n = inv.max() + 1 if len(inv) else 0
+    s = np.bincount(inv, weights=w * (y == 1), minlength=n)
+    b = np.bincount(inv, weights=w * (y != 1), minlength=n)
+
+    return _binned_auc(s, b)
+
+
+def _binned_auc(s, b):
+    """
+    Weighted ROC AUC given the signal and background weight of each group of
+    tied scores, in increasing order of score along the last axis.
+    """
+
+    # Background weight below each score, counting ties as half
+    b_below = np.cumsum(b, axis=-1) - b / 2
+
+    return (s * b_below).sum(axis=-1) / (s.sum(axis=-1) * b.sum(axis=-1))
+
+
+def roc_auc(y, score, w=None):
+    """
+    Compute the area under the receiver operating characteristic curve.
+
+    Parameters
+    ----------
+    y : array-like, shape = [n_samples]
+        Target values, 1 for signal.
+    score : array-like, shape = [n_samples]
+        Classifier response.
+    w : array-like, shape = [n_samples], optional
+        Event weights. If None, then samples are equally weighted.
+
+    Returns
+    -------
+    float
+        Probability that a signal event has a higher classifier response than
+        a background event, with ties counted as half.
+    """
+
+    y = np.asarray(y)
+    w = np.ones(len(y)) if w is None else np.asarray(w, dtype=np.float64)
+    _, inv = np.unique(np.asarray(score), return_inverse=True)
+
+    return _grouped_auc(inv, y, w)
+
+
+class ROCHistogram(object):
+    """
+    Weighted receiver operating characteristic (ROC) curve computed from
+    finely binned histograms of the signal and background response.
+
+    Parameters
+    ----------
+    bins : int, optional
+        Number of equal-width bins.
+    range : (float, float), optional
+        Range of the classifier response. Responses outside it are counted in
+        the first or last bin.
+
+    Attributes
+    ----------
+    s, b : array, shape=bins
+        Signal and background weight in each bin.
+
+    Notes
+    -----
+    Histograms of chunks of a sample, or of samples held by different
+    workers, can be merged. Memory use is fixed by the number of bins.
+
+    The AUC and curve are undefined, and raise a ValueError, unless both
+    signal and background have nonzero total weight.
+
+    Events in the same bin are treated as tied. The AUC is then exact for
+    pairs of signal and background events in different bins and counts pairs
+    in the same bin as half, so it differs from the exact AUC by at most
+    auc_error().
+    """
+
+    def __init__(self, bins=10000, range=(0, 1)):
+        self.range = tuple(range)
+        self.s = np.zeros(bins)
+        self.b = np.zeros(bins)
+
+    def fill(self, score, y, w=None):
+        """
+        Add events to the histograms.
+
+        Parameters
+        ----------
+        score : array-like, shape = [n_samples]
+            Classifier response.
+        y : array-like, shape = [n_samples]
+            Target values, 1 for signal.
+        w : array-like, shape = [n_samples], optional
+            Event weights. If None, then samples are equally weighted.
+
+        Returns
+        -------
+        self
+        """
+
+        score = np.asarray(score, dtype=np.float64)
+        y = np.asarray(y)
+        w = np.ones(len(y)) if w is None else np.asarray(w, dtype=np.float64)
+
+        bins = len(self.s)
+        lo, hi = self.range
+        idx = np.clip(np.floor((score - lo) * (bins / (hi - lo))), 0,
+                      bins - 1).astype(np.intp)
+
+        self.s += np.bincount(idx, weights=w * (y == 1), minlength=bins)
+        self.b += np.bincount(idx, weights=w * (y != 1), minlength=bins)
+
+        return self
+
+    def merge(self, other):
+        """
+        Combine with the histograms of another set of events.
+
+        Parameters
+        ----------
+        other : ROCHistogram
+            Histograms with the same binning.
+
+        Returns
+        -------
+        ROCHistogram
+            Histograms of the events of both.
+        """
+
+        if other.range != self.range or len(other.s) != len(self.s):
+            raise ValueError("Cannot merge histograms with different "
+                             "binning: ", (len(other.s), other.range))
+
+        merged = ROCHistogram(len(self.s), self.range)
+        merged.s = self.s + other.s
+        merged.b = self.b + other.b
+        return merged
+
+    def _check_totals(self):
+        """
+        Raise a ValueError unless both classes have nonzero total weight.
+        """
+
+        totals = self.s.sum(), self.b.sum()
+        if 0 in totals:
+            raise ValueError("Total signal and background weight should be "
+                             "nonzero, are: ", totals)
+
+    def auc(self):
+        """
+        Compute the area under the ROC curve.
+
+        Returns
+        -------
+        float
+            Probability that a signal event has a higher classifier response
+            than a background event, with events in the same bin counted as
+            half.
+        """
+
+        self._check_totals()
+
+        return _binned_auc(self.s, self.b)
+
+    def auc_error(self):
+        """
+        Bound the difference between auc() and the AUC of the unbinned events.
+
+        Returns
+        -------
+        float
+            Half the fraction of signal and background pairs in the same bin.
+        """
+
+        self._check_totals()
+
+        return (np.dot(np.abs(self.s), np.abs(self.b)) /
+                (2 * abs(self.s.sum() * self.b.sum())))
+
+    def curve(self, max_points=1000):
+        """
+        Compute the ROC curve.
+
+        Parameters
+        ----------
+        max_points : int, optional
+            Largest number of points returned. Points are chosen evenly spaced
+            along the curve.
+
+        Returns
+        -------
+        fpr, tpr : array
+            False and true positive rate for decreasing thresholds, starting
+            at (0, 0) and ending at (1, 1).
+        """
+
+        self._check_totals()
+
+        # Thresholds at bin edges, skipping bins which are empty
+        filled = (self.s != 0) | (self.b != 0)
+        tpr = np.concatenate(([0.], np.cumsum(self.s[filled][::-1])))
+        fpr = np.concatenate(([0.], np.cumsum(self.b[filled][::-1])))
+        tpr /= tpr[-1]
+        fpr /= fpr[-1]
+
+        if len(fpr) > max_points:
+            length = np.concatenate(([0.], np.cumsum(
+                np.abs(np.diff(fpr)) + np.abs(np.diff(tpr)))))
+            idx = np.unique(np.searchsorted(
+                length, np.linspace(0, length[-1], max_points)))
+            idx[-1] = len(fpr) - 1
+            fpr = fpr[idx]
+            tpr = tpr[idx]
+
+        return fpr, tpr
+
+
+def _bootstrap_blocks(n_bootstrap, n, block_size, rng):
+    """
+    Divide n_bootstrap replicates of n events into blocks of at most
+    block_size weights, returning the seed and number of replicates of each.
+    """
+
+    per_block = max(1, block_size // max(n, 1))
+    sizes = [min(per_block, n_bootstrap - i)
+             for i in range(0, n_bootstrap, per_block)]
+    seeds = rng.randint(np.iinfo(np.int32).max, size=len(sizes))
+
+    return list(zip(seeds, sizes))
+
+
+# Cumulative distribution of a Poisson variable with mean 1, up to 19 (beyond
+# which the probability is below 1e-18)
+_POISSON_CDF = np.cumsum(np.exp(-1) / np.cumprod(
+    np.concatenate(([1], np.arange(1, 20)))))
+
+
+def _poisson_weights(seed, n_replicates, n):
+    """
+    Poisson-distributed multiplicities of n events in each replicate, as a
+    matrix of shape (n_replicates, n).
+    """
+
+    # Inverting the CDF is faster than RandomState.poisson
+    u = np.random.RandomState(seed).random_sample((n_replicates, n))
+    return np.searchsorted(_POISSON_CDF, u).astype(np.float64)
+
+
+def _auc_data(score, y, w):
+    """
+    Sort events by score, as required by _replicate_auc.
+    """
+
+    score = np.asarray(score)
+    order = np.argsort(score)
+    score = score[order]
+    starts = np.flatnonzero(np.concatenate(([True],
+                                            score[1:] != score[:-1])))
+
+    return order, starts, np.asarray(y)[order] == 1, np.asarray(w)[order]
+
+
+def _replicate_auc(data, p):
+    """
+    Weighted ROC AUC of each replicate, given the sorted events and the
+    multiplicity matrix p of the unsorted events.
+    """
+
+    order, starts, signal, w = data
+    pw = p[:, order] * w
+
+    s = np.where(signal, pw, 0)
+    b = pw - s
+    if len(starts) < len(order):  # sum over tied scores
+        s = np.add.reduceat(s, starts, axis=1)
+        b = np.add.reduceat(b, starts, axis=1)
+
+    return _binned_auc(s, b)
+
+
+def _ks_data(a, b, aw, bw):
+    """
+    Sort the merged samples, as required by _replicate_ks.
+    """
+
+    x = np.concatenate((a, b))
+    order = np.argsort(x)
+    x = x[order]
+    last = np.append(x[1:] != x[:-1], True)
+
+    return (order, last, order < len(a),
+            np.concatenate((aw, bw))[order])
+
+
+def _replicate_ks(data, p):
+    """
+    KS statistic and p-value of each replicate, given the sorted merged
+    samples and the multiplicity matrix p of the unsorted events.
+    """
+
+    order, last, in_a, w = data
+    pw = p[:, order] * w
+    pwa = np.where(in_a, pw, 0)
+    pwb = np.where(in_a, 0, pw)
+
+    a_sum = pwa.sum(axis=1)
+    b_sum = pwb.sum(axis=1)
+
+    c = np.cumsum(pwa / a_sum[:, np.newaxis] - pwb / b_sum[:, np.newaxis],
+                  axis=1)
+    D = np.abs(c[:, last]).max(axis=1)
+
+    n1 = a_sum ** 2 / (pwa ** 2).sum(axis=1)
+    n2 = b_sum ** 2 / (pwb ** 2).sum(axis=1)
+
+    return np.column_stack((D, _ks_p_value(D, n1, n2)))
+
 
-    D = np.max(np.abs(ecdf(a, aw)(ab) - ecdf(b, bw)(ab)))
+# Data used by the bootstrap workers, set before they are forked so it is not
+# copied for each block
+_bootstrap_state = {}
 
-    n1 = len(a) if aw is None else np.sum(aw) ** 2 / np.sum(aw ** 2)
-    n2 = len(b) if bw is None else np.sum(bw) ** 2 / np.sum(bw ** 2)
 
-    en = np.sqrt(n1 * n2 / float(n1 + n2))
+def _bootstrap_block(block):
+    """
+    Evaluate the statistic in _bootstrap_state for a block of replicates.
+    """
+
+    st = _bootstrap_state
+    seed, n_replicates = block
+
+    return st["statistic"](st["data"],
+                           _poisson_weights(seed, n_replicates, st["n"]))
+
+
+def _bootstrap(statistic, data, n, blocks, n_jobs=1):
+    """
+    Evaluate statistic(data, p) for the multiplicity matrix p of each block
+    of replicates, in n_jobs processes.
+    """
+
+    if not blocks:
+        return statistic(data, np.empty((0, n)))
+
+    if n_jobs == 1 or len(blocks) < 2 or not resources.can_fork():
+        return np.concatenate([statistic(data, _poisson_weights(seed, size, n))
+                               for seed, size in blocks])
+
+    _bootstrap_state.update(statistic=statistic, data=data, n=n)
+
+    try:
+        pool = multiprocessing.Pool(min(n_jobs, len(blocks)))
+        try:
+            results = pool.map(_bootstrap_block, blocks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        _bootstrap_state.clear()
+
+    return np.concatenate(results)
+
+
+def _bootstrap_auc(score, y, w, blocks):
+    """
+    ROC AUC of score for each bootstrap replicate, generated by Poisson
+    resampling in the given blocks.
+    """
+
+    return _bootstrap(_replicate_auc, _auc_data(score, y, w), len(y), blocks)
+
+
+def bootstrap_auc(y, score, w=None, n_bootstrap=100, block_size=2 ** 22,
+                  n_jobs=1, random_state=None):
+    """
+    Compute the area under the receiver operating characteristic curve for
+    bootstrap replicates of a sample.
+
+    Parameters
+    ----------
+    y : array-like, shape = [n_samples]
+        Target values, 1 for signal.
+    score : array-like, shape = [n_samples]
+        Classifier response.
+    w : array-like, shape = [n_samples], optional
+        Event weights. If None, then samples are equally weighted.
+    n_bootstrap : int, optional
+        Number of bootstrap replicates.
+    block_size : int, optional
+        Largest number of event weights (replicates times events) held in
+        memory at once by each process.
+    n_jobs : int, optional
+        Number of processes across which blocks of replicates are
+        distributed.
+    random_state : int, RandomState instance or None, optional
+        Seed for the bootstrap replicates.
+
+    Returns
+    -------
+    array, shape = [n_bootstrap]
+        ROC AUC of each replicate, see roc_auc.
+
+    Notes
+    -----
+    The bootstrap resamples events with Poisson-distributed multiplicities.
+    Events are sorted once, and the AUC of a block of replicates is computed
+    at once from a matrix of multiplicities.
+    """
+
+    y = np.asarray(y)
+    w = np.ones(len(y)) if w is None else np.asarray(w, dtype=np.float64)
+    blocks = _bootstrap_blocks(n_bootstrap, len(y), block_size,
+                               check_random_state(random_state))
+
+    return _bootstrap(_replicate_auc, _auc_data(score, y, w), len(y), blocks,
+                      n_jobs)
+
+
+def bootstrap_ks_2samp(a, b, aw=None, bw=None, n_bootstrap=100,
+                       block_size=2 ** 22, n_jobs=1, random_state=None):
+    """
+    Compute the Kolmogorov-Smirnov statistic on bootstrap replicates of two
+    samples.
+
+    Parameters
+    ----------
+    a, b : 1D array-like
+        Two arrays of sample observations.
+    aw, bw: 1D array-like, optional
+        The weights of each observation in a, b. If omitted or None, every
+        measurement will be assigned an equal weight.
+    n_bootstrap, block_size, n_jobs, random_state
+        See bootstrap_auc.
+
+    Returns
+    -------
+    D : array, shape = [n_bootstrap]
+        KS statistic of each replicate, see ks_2samp.
+    p-value : array, shape = [n_bootstrap]
+        Two-tailed p-value of each replicate.
+    """
+
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    aw = np.ones(len(a)) if aw is None else np.asarray(aw, dtype=np.float64)
+    bw = np.ones(len(b)) if bw is None else np.asarray(bw, dtype=np.float64)
+    blocks = _bootstrap_blocks(n_bootstrap, len(a) + len(b), block_size,
+                               check_random_state(random_state))
+
+    result = _bootstrap(_replicate_ks, _ks_data(a, b, aw, bw),
+                        len(a) + len(b), blocks, n_jobs)
+
+    return result[:, 0], result[:, 1]
+
+
+# Data used by the permutation importance workers, set before they are forked
+# so it is not copied for each task
+_permutation_state = {}
+
+
+def _permuted_auc(args):
+    """
+    ROC AUC of the classifier, and its bootstrap replicates, after shuffling
+    feature i with the given seed.
+    """
+
+    i, seed = args
+    st = _permutation_state
+    df = st["df"]
+    perm = np.random.RandomState(seed).permutation(len(df))
+    shuffled = df.iloc[perm, i].values
+
+    score = np.empty(len(df))
+    for start in range(0, len(df), st["batch_size"]):
+        stop = start + st["batch_size"]
+        batch = df.iloc[start:stop].copy()
+        batch.iloc[:, i] = shuffled[start:stop]
+        score[start:stop] = classifiers.evaluate_mva(batch, st["mva"])
+
+    return (_grouped_auc(np.unique(score, return_inverse=True)[1],
+                         st["y"], st["w"]),
+            _bootstrap_auc(score, st["y"], st["w"], st["blocks"]))
+
+
+def permutation_importance(mva, df, y, w=None, n_bootstrap=100,
+                           batch_size=100000, block_size=2 ** 22, n_jobs=1,
+                           random_state=None):
+    """
+    Compute the importance of each feature as the decrease in ROC AUC when its
+    values are shuffled between events.
+
+    Parameters
+    ----------
+    mva
+        Trained classifier.
+    df : DataFrame, shape = [n_samples, n_features]
+        Features of the events used to measure the importances, which should
+        not have been used in training.
+    y : array-like, shape = [n_samples]
+        Target values for df.
+    w : array-like, shape = [n_samples], optional
+        Event weights for df. If None, then samples are equally weighted.
+    n_bootstrap : int, optional
+        Number of bootstrap replicates used to estimate uncertainties. If 0,
+        no uncertainties are estimated.
+    batch_size : int, optional
+        Maximum number of events evaluated by the classifier at once.
+    block_size : int, optional
+        Largest number of bootstrap event weights held in memory at once by
+        each process, see bootstrap_auc.
+    n_jobs : int, optional
+        Number of processes across which features are distributed.
+    random_state : int, RandomState instance or None, optional
+        Seed for the shuffles and bootstrap replicates.
+
+    Returns
+    -------
+    importances : array, shape = [n_features]
+        Decrease in weighted ROC AUC for each feature.
+    errors : array, shape = [n_features]
+        Bootstrap standard deviation of each importance, NaN if n_bootstrap is
+        0.
+
+    Notes
+    -----
+    The bootstrap resamples events with Poisson-distributed multiplicities.
+    The same replicates are used for the unshuffled and shuffled responses,
+    so that the uncertainty of the difference is estimated.
+
+    Worker processes are forked with the classifier and data already in
+    memory.
+    """
+
+    rng = check_random_state(random_state)
+    y = np.asarray(y)
+    w = np.ones(len(y)) if w is None else np.asarray(w, dtype=np.float64)
+    blocks = _bootstrap_blocks(n_bootstrap, len(y), block_size, rng)
+    perm_seeds = rng.randint(np.iinfo(np.int32).max, size=df.shape[1])
+
+    score = classifiers.evaluate_mva(df, mva, batch_size=batch_size)
+    auc = roc_auc(y, score, w)
+    boot = _bootstrap_auc(score, y, w, blocks)
+
+    _permutation_state.update(mva=mva, df=df, y=y, w=w, blocks=blocks,
+                              batch_size=batch_size)
+    tasks = list(zip(range(df.shape[1]), perm_seeds))
+
+    try:
+        if n_jobs == 1 or not resources.can_fork():
+            results = [_permuted_auc(t) for t in tasks]
+        else:
+            pool = multiprocessing.Pool(n_jobs)
+            try:
+                results = pool.map(_permuted_auc, tasks)
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        _permutation_state.clear()
 
-    p = kstwobign.sf((en + 0.12 + 0.11 / en) * D)  # Stephens (1970)
+    importances = np.array([auc - r[0] for r in results])
+    errors = np.array([np.std(boot - r[1], ddof=1) if n_bootstrap > 1
+                       else np.nan for r in results])
 
-    return D, p
+    return importances, errors
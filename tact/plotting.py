@@ -5,26 +5,256 @@ This module contains functions which create plots.
 
 These deal only with plots created with matplotlib. Functions handling the
 creation of ROOT histograms are found in the rootIO module.
+
+The data shown in each plot are saved to a bundle next to the figure, with the
+same name and the extension .npz, from which replot redraws the figure without
+the events they were computed from.
 """
 
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
-from operator import sub
+import copy
+import glob
+import multiprocessing
+import os
 import re
 
-import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-from mpl_toolkits.axes_grid1 import make_axes_locatable
-from sklearn.metrics import auc, roc_curve
-from tact import binning
-from tact.rootIO import makedirs
-from tact.util import BinaryTree, corrcoef, maenumerate
+from tact import resources
+from tact.util import WeightedCovariance, maenumerate
+
+
+class Plotter(object):
+    """
+    Draw plots in this process, in background processes, or not at all.
+
+    Parameters
+    ----------
+    mode : "sync", "async" or "off", optional
+        sync: plots are drawn when requested. The default here, as used by
+              the make_* functions when no Plotter is given.
+        async: plots are drawn by a pool of background processes, so that
+               the caller continues meanwhile. The default of the plots
+               option in tact configuration files. Used as sync where worker
+               processes cannot be started.
+        off: plots are not drawn.
+    processes : int, optional
+        Number of background processes used in async mode.
+
+    Notes
+    -----
+    Plots are requested with the data they show already reduced to small
+    arrays, so that little is sent to the background processes and little is
+    saved in their bundles. The pool is
+    started when the Plotter is created, which should be before large
+    datasets or libraries are loaded.
+    """
+
+    def __init__(self, mode="sync", processes=1):
+        if mode not in ("sync", "async", "off"):
+            raise ValueError("Unrecognised value for option 'plots': ", mode)
+        if mode == "async" and not resources.can_fork():
+            mode = "sync"
+
+        self.mode = mode
+        self._pool = (multiprocessing.Pool(processes) if mode == "async"
+                      else None)
+        self._results = []
+
+    @property
+    def enabled(self):
+        """Whether plots are drawn"""
+        return self.mode != "off"
+
+    def draw(self, function, filename, **data):
+        """
+        Save the data of a plot to its bundle and call
+        function(filename=filename, **data), which draws it.
+
+        Parameters
+        ----------
+        function : callable
+            Drawing function, one of DRAW_FUNCTIONS.
+        filename : string
+            Name of the file the plot is saved to.
+        data
+            Arguments of function. Must be arrays, numbers or strings.
+
+        Returns
+        -------
+        None
+        """
+
+        if not self.enabled:
+            return
+
+        save_bundle(function, filename, **data)
+
+        data["filename"] = filename
+        if self.mode == "sync":
+            function(**data)
+        else:
+            self._results.append(self._pool.apply_async(function, (), data))
+
+    def join(self):
+        """
+        Wait until every requested plot is drawn.
+
+        Exceptions raised while drawing a plot are raised here.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        if self._pool is None:
+            return
+
+        self._pool.close()
+        try:
+            for result in self._results:
+                result.get()
+        finally:
+            self._pool.join()
+            self._pool = None
+            self._results = []
+
+    def terminate(self):
+        """
+        Stop drawing plots, without waiting for those already requested.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        if self._pool is None:
+            return
+
+        self._pool.terminate()
+        self._pool.join()
+        self._pool = None
+        self._results = []
+
+
+_SYNC = Plotter()
+
+
+def feature_histograms(df, cat, w=None, bins=10, ranges=None,
+                       range_quantiles=None, chunk_size=100000):
+    """
+    Compute normalised signal and background histograms of every column of
+    df.
+
+    Parameters
+    ----------
+    df : DataFrame
+        DataFrame containing data.
+    cat : 1D array, shape=N
+        Array containing labels describing whether an entry is signal (1 or
+        True) or background (0 or False).
+    w : array-like, shape=N
+        Weights for data. If None, then samples are equally weighted.
+    bins : int, optional
+        Number of equal-width bins in each histogram.
+    ranges : dict, optional
+        Map from columns to the (lower, upper) range of their histograms.
+        Values outside the range are ignored. Columns not given span the range
+        of their values. NaNs are ignored.
+    range_quantiles : (float, float), optional
+        Weighted quantiles of each column not in ranges between which its
+        histogram spans, e.g. (0.001, 0.999) to leave out long tails. If None,
+        the smallest and largest values are used.
+    chunk_size : int, optional
+        Number of rows histogrammed at once.
 
+    Returns
+    -------
+    edges : array, shape=[n_columns, bins + 1]
+        Bin edges of the histograms of each column.
+    hist_sig, hist_bkg : array, shape=[n_columns, bins]
+        Signal and background histograms of each column, normalised to unit
+        area.
+
+    Notes
+    -----
+    Every column and both classes are histogrammed together, with a single
+    bincount over each chunk of rows.
+    """
 
-def make_variable_histograms(df, cat, w=None, filename="vars.pdf", **kwargs):
+    ranges = ranges or {}
+    n_cols = df.shape[1]
+    w = np.ones(len(df)) if w is None else np.asarray(w, dtype=np.float64)
+    signal = np.asarray(cat) == 1
+
+    if range_quantiles is None:
+        spans = {c: (df[c].min(), df[c].max()) for c in df.columns}
+    else:
+        from tact.metrics import ECDF  # imports scikit-learn
+
+        spans = {}
+        for c in df.columns:
+            x = df[c].values
+            finite = ~np.isnan(x)
+            spans[c] = ECDF(x[finite], w[finite]).quantile(range_quantiles)
+    spans.update(ranges)
+
+    lo = np.array([spans[c][0] for c in df.columns], dtype=np.float64)
+    hi = np.array([spans[c][1] for c in df.columns], dtype=np.float64)
+    same = lo == hi
+    lo[same] -= 0.5
+    hi[same] += 0.5
+
+    scale = bins / (hi - lo)
+
+    # Bin bins * (2 * j + signal) + i is bin i of column j, in background or
+    # signal
+    offsets = bins * 2 * np.arange(n_cols)
+    counts = np.zeros(2 * n_cols * bins)
+    for start in xrange(0, len(df), chunk_size):
+        stop = start + chunk_size
+        x = df.iloc[start:stop].values.astype(np.float64)
+
+        # NaNs and values outside the range are given no weight, and moved
+        # to the lower edge so that every value can be cast to a bin index
+        with np.errstate(invalid="ignore"):
+            inside = (x >= lo) & (x <= hi)
+        weights = inside * w[start:stop, np.newaxis]
+        np.copyto(x, lo, where=~inside)
+
+        x -= lo
+        x *= scale
+        np.floor(x, out=x)
+        idx = x.astype(np.intp)
+        np.minimum(idx, bins - 1, out=idx)  # upper edge
+        idx += offsets
+        idx += bins * signal[start:stop, np.newaxis]
+
+        counts += np.bincount(idx.ravel(), weights=weights.ravel(),
+                              minlength=len(counts))
+
+    counts = counts.reshape(n_cols, 2, bins)
+    edges = lo[:, np.newaxis] + ((hi - lo)[:, np.newaxis] *
+                                 np.linspace(0, 1, bins + 1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        density = counts / (counts.sum(axis=2, keepdims=True) *
+                            np.diff(edges)[:, np.newaxis])
+
+    return edges, density[:, 1], density[:, 0]
+
+
+def make_variable_histograms(df, cat, w=None, filename="vars.pdf", bins=10,
+                             ranges=None, range_quantiles=None, plotter=None):
     """
     Produce histograms comparing the distribution of data in df_sig and df_bkg.
 
@@ -41,35 +271,68 @@ def make_variable_histograms(df, cat, w=None, filename="vars.pdf", **kwargs):
         Weights for data. If None, then samples are equally weighted.
     filename : string, optional
         Name of the file the plot is saved to.
-    kwargs :
-        Additional kwargs passed to pandas.DataFrame.hist
+    bins : int, optional
+        Number of bins in each histogram.
+    ranges : dict, optional
+        Map from columns to the range of their histograms, see
+        feature_histograms.
+    range_quantiles : (float, float), optional
+        Quantiles spanned by the histograms of other columns, see
+        feature_histograms.
+    plotter : Plotter, optional
+        Plotter drawing the plot. If None, it is drawn immediately.
 
     Returns
     -------
     None
     """
 
-    if w is None:
-        w = np.ones(len(df))
+    plotter = plotter or _SYNC
+    if not plotter.enabled:
+        return
+
+    edges, hist_sig, hist_bkg = feature_histograms(
+        df, cat, w, bins=bins, ranges=ranges, range_quantiles=range_quantiles)
+
+    plotter.draw(draw_variable_histograms, filename, columns=list(df.columns),
+                 edges=edges, hist_sig=hist_sig, hist_bkg=hist_bkg)
 
-    mask = (cat == 1)
-    df_sig = df[mask]
-    df_bkg = df[~mask]
-    w_sig = w[mask]
-    w_bkg = w[~mask]
 
-    def plot_histograms(df, ax, w=None):
-        """Plot histograms for every column in df"""
-        return df.hist(ax=ax, alpha=0.5, weights=w, normed=True, **kwargs)
+def draw_variable_histograms(columns, edges, hist_sig, hist_bkg,
+                             filename="vars.pdf", individual=False):
+    """
+    Draw histograms comparing the distribution of signal and background in
+    each variable.
 
-    n_histograms = len(df_sig.columns)
+    Parameters
+    ----------
+    columns : list of strings
+        Name of each variable.
+    edges : array, shape=[n_variables, bins + 1]
+        Bin edges of the histograms of each variable.
+    hist_sig, hist_bkg : array, shape=[n_variables, bins]
+        Normalised signal and background histograms of each variable.
+    filename : string, optional
+        Name of the file the plot is saved to.
+    individual : bool, optional
+        Whether the histogram of each variable is also saved on its own, to
+        features/<variable> in the directory of filename, in the same format.
+        Characters other than letters, digits, "_", ".", "+" and "-" in
+        variable names are replaced by "_".
+
+    Returns
+    -------
+    None
+    """
+
+    n_histograms = len(columns)
 
     ncols = 2
     nrows = (n_histograms + ncols - 1) // ncols
 
     fig_size = (ncols * 2 * 1.3, nrows * 2)
 
-    fig, ax = plt.subplots(ncols=ncols, nrows=nrows)
+    fig, ax = plt.subplots(ncols=ncols, nrows=nrows, squeeze=False)
     fig.set_size_inches(fig_size)
 
     ax = ax.flatten()
@@ -79,23 +342,23 @@ def make_variable_histograms(df, cat, w=None, filename="vars.pdf", **kwargs):
 
     ax = ax[:n_histograms]
 
-    ax = plot_histograms(df_sig, ax, w_sig)
-    plot_histograms(df_bkg, ax, w_bkg)
+    for axis, col, e, hs, hb in zip(ax, columns, edges, hist_sig, hist_bkg):
+        for h in (hs, hb):
+            axis.bar(e[:-1], h, width=np.diff(e), align="edge", alpha=0.5,
+                     linewidth=0)
 
-    for axis in ax:
-        axis.set_xlabel(axis.get_title(),
+        axis.set_xlabel(col,
                         family="monospace",
                         size="x-large")
 
         # In the tZq analysis, this will add units to the xlabel, you might
-        # want to comment in the filename = re.sub(r"... line below when saving plots individually
-        # to exclude the unit from filenames
-        # axis.set_xlabel(re.sub(r"(?:Pt|Mass|^met)$", r"\g<0> (GeV)", axis.get_title()),
+        # want to keep using col in the names of individual plots to exclude
+        # the unit from them
+        # axis.set_xlabel(re.sub(r"(?:Pt|Mass|^met)$", r"\g<0> (GeV)", col),
         #                 family="monospace",
         #                 size="x-large")
 
         axis.set_ylim(bottom=0)
-        axis.set_title("")
         axis.legend(["Sig.", "Bkg."], fontsize="large",
                     frameon=True,
                     fancybox=True,
@@ -107,17 +370,70 @@ def make_variable_histograms(df, cat, w=None, filename="vars.pdf", **kwargs):
     fig.tight_layout()
     fig.savefig(filename)
 
-    # # Save plots individually
-    # dir = re.search(r"((?:[^\/]*\/)*)(?:.*)", filename).group(1) or ""
-    # makedirs(dir + "/features/")
-    # for axis in ax:
-    #     extent = axis.get_tightbbox(fig.canvas.get_renderer(), True).transformed(fig.dpi_scale_trans.inverted())
-    #     # filename = re.sub(r" \(GeV\)$", "", axis.get_xlabel())
-    #     fig.savefig("{}/features/{}.pgf".format(dir, filename),
-    #                 bbox_inches=extent)
+    # Save plots individually
+    if individual:
+        directory = os.path.join(os.path.dirname(filename), "features")
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        ext = os.path.splitext(filename)[1]
+        for axis, col in zip(ax, columns):
+            extent = axis.get_tightbbox(
+                fig.canvas.get_renderer(), call_axes_locator=True).transformed(
+                    fig.dpi_scale_trans.inverted())
+            fig.savefig(os.path.join(directory,
+                                     re.sub(r"[^\w.+-]", "_", col) + ext),
+                        bbox_inches=extent)
+
+    plt.close(fig)
+
+
+def correlation_matrices(df, cat=None, w=None, chunk_size=100000):
+    """
+    Compute the weighted correlation matrices of the columns of df in signal,
+    background, and both together, in one pass over the data.
+
+    Parameters
+    ----------
+    df : DataFrame
+        DataFrame containing data.
+    cat : 1D array, shape=N, optional
+        Array containing labels describing whether an entry is signal (1 or
+        True) or background (0 or False). If None, every entry is treated as
+        signal.
+    w : array-like, shape=N, optional
+        Weights for data, whose absolute values are used. If None, then
+        samples are equally weighted.
+    chunk_size : int, optional
+        Number of rows read at once.
+
+    Returns
+    -------
+    dict
+        Correlation matrices of signal ("sig"), background ("bkg"), and all
+        data ("all").
+    """
+
+    n_cols = df.shape[1]
+    w = (np.ones(len(df)) if w is None
+         else np.abs(np.asarray(w, dtype=np.float64)))
+    signal = (np.ones(len(df), dtype=bool) if cat is None
+              else np.asarray(cat) == 1)
 
+    acc = {"sig": WeightedCovariance(n_cols),
+           "bkg": WeightedCovariance(n_cols)}
+    for start in xrange(0, len(df), chunk_size):
+        stop = start + chunk_size
+        x = df.iloc[start:stop].values
+        mask = signal[start:stop]
+        acc["sig"].update(x[mask], w[start:stop][mask])
+        acc["bkg"].update(x[~mask], w[start:stop][~mask])
+    acc["all"] = acc["sig"].merge(acc["bkg"])
 
-def make_corelation_plot(df, w=None, filename="corr.pdf", **kwargs):
+    return {k: acc[k].correlation() for k in acc}
+
+
+def make_corelation_plot(df, w=None, filename="corr.pdf", plotter=None,
+                         **kwargs):
     """
     Produce matshow plot representing the correlation matrix of df.
 
@@ -130,23 +446,98 @@ def make_corelation_plot(df, w=None, filename="corr.pdf", **kwargs):
         be calculated.
     filename : string, optional
         Name of the file the plot is saved to.
+    plotter : Plotter, optional
+        Plotter drawing the plot. If None, it is drawn immediately.
     kwargs
-        Additional kwargs passed to matplotlib.pyplot.matshow
+        Additional kwargs passed to matplotlib.pyplot.matshow. These are
+        saved in the plot bundle, so must be arrays, numbers or strings, e.g.
+        the name of a colormap rather than the colormap itself.
 
     Returns
     -------
     None
     """
 
-    corr = corrcoef(df.values, rowvar=False, aweights=np.abs(w))
+    plotter = plotter or _SYNC
+    if not plotter.enabled:
+        return
+
+    corr = correlation_matrices(df, w=w)["sig"]
+
+    plotter.draw(draw_correlation_plot, filename, corr=corr,
+                 columns=list(df.columns), **kwargs)
+
+
+def make_correlation_plots(df, cat, w=None, filename="corr_{}.pdf",
+                           plotter=None, **kwargs):
+    """
+    Produce matshow plots representing the correlation matrices of df in
+    signal, background, and both together.
+
+    Parameters
+    ----------
+    df : DataFrame
+        DataFrame containing data for which the correlation coefficients are to
+        be calculated.
+    cat : 1D array, shape=N
+        Array containing labels describing whether an entry is signal (1 or
+        True) or background (0 or False).
+    w : array-like, shape=N, optional
+        Weights for data. If None, then samples are equally weighted.
+    filename : string, optional
+        Name of the files the plots are saved to, with "{}" replaced by "sig",
+        "bkg" or "all".
+    plotter : Plotter, optional
+        Plotter drawing the plots. If None, they are drawn immediately.
+    kwargs
+        Additional kwargs passed to matplotlib.pyplot.matshow. These are
+        saved in the plot bundle, so must be arrays, numbers or strings, e.g.
+        the name of a colormap rather than the colormap itself.
+
+    Returns
+    -------
+    None
+    """
+
+    plotter = plotter or _SYNC
+    if not plotter.enabled:
+        return
+
+    corrs = correlation_matrices(df, cat, w)
+
+    for k in sorted(corrs):
+        plotter.draw(draw_correlation_plot, filename.format(k), corr=corrs[k],
+                     columns=list(df.columns), **kwargs)
+
+
+def draw_correlation_plot(corr, columns, filename="corr.pdf", **kwargs):
+    """
+    Draw matshow plot representing a correlation matrix.
+
+    Parameters
+    ----------
+    corr : array, shape=[n_variables, n_variables]
+        Correlation matrix.
+    columns : list of strings
+        Name of each variable.
+    filename : string, optional
+        Name of the file the plot is saved to.
+    kwargs
+        Additional kwargs passed to matplotlib.pyplot.matshow. A colormap
+        may be given by name as cmap, bwr by default.
+
+    Returns
+    -------
+    None
+    """
 
-    nvars = len(df.columns)
+    nvars = len(columns)
 
     fig, ax = plt.subplots()
 
     corr_masked = np.ma.array(corr,
                               mask=np.tri(corr.shape[0], k=-1, dtype=np.bool))
-    cmap = matplotlib.cm.bwr
+    cmap = copy.copy(plt.get_cmap(kwargs.pop("cmap", "bwr")))
     cmap.set_bad('white', 1.)
     ax.matshow(corr_masked, vmin=-1, vmax=1, cmap=cmap, **kwargs)
 
@@ -157,10 +548,10 @@ def make_corelation_plot(df, w=None, filename="corr.pdf", **kwargs):
                           lw=0))
 
     fig.set_size_inches(1 + nvars / 1.5, 1 + nvars / 1.5)
-    plt.xticks(xrange(nvars), df.columns, rotation=90, size=15,
+    plt.xticks(xrange(nvars), columns, rotation=90, size=15,
                family="monospace")
     ax.yaxis.set_ticks_position("right")
-    plt.yticks(xrange(nvars), df.columns, size=15,
+    plt.yticks(xrange(nvars), columns, size=15,
                family="monospace")
     ax.tick_params(axis='both', which='both', length=0)  # hide ticks
     ax.spines["top"].set_visible(False)
@@ -172,12 +563,13 @@ def make_corelation_plot(df, w=None, filename="corr.pdf", **kwargs):
     plt.tight_layout()
 
     fig.savefig(filename, pad_inches=0, bbox_inches="tight")
+    plt.close(fig)
 
 
 def make_response_plot(x_train_sig, x_test_sig, x_train_bkg, x_test_bkg,
                        w_train_sig=None, w_test_sig=None,
                        w_train_bkg=None, w_test_bkg=None,
-                       bins=25, filename="response.pdf"):
+                       bins=25, filename="response.pdf", plotter=None):
     """
     Produce histogram comparing the response of the test data and training data
     in signal and background.
@@ -201,38 +593,68 @@ def make_response_plot(x_train_sig, x_test_sig, x_train_bkg, x_test_bkg,
         Number of bins in histogram.
     filename : string, optional
         Name of the file the plot is saved to.
+    plotter : Plotter, optional
+        Plotter drawing the plot. If None, it is drawn immediately.
     """
 
+    plotter = plotter or _SYNC
+    if not plotter.enabled:
+        return
+
     x_range = (0, 1)
 
+    # Normalised histograms, and errors on those of training samples
+    hists = []
+    errors = []
+    for x, w in ((x_test_sig, w_test_sig), (x_test_bkg, w_test_bkg),
+                 (x_train_sig, w_train_sig), (x_train_bkg, w_train_bkg)):
+        x = np.asarray(x)
+        w = np.ones(len(x)) if w is None else np.asarray(w)
+        hist, bin_edges = np.histogram(x, bins=bins, range=x_range,
+                                       weights=w)
+        hist2 = np.histogram(x, bins=bins, range=x_range,
+                             weights=w ** 2)[0]
+        db = np.array(np.diff(bin_edges), float)
+        errors.append(np.sqrt(hist2) / db / hist.sum())
+        hists.append(hist / db / hist.sum())
+
+    plotter.draw(draw_response_plot, filename, bin_edges=bin_edges,
+                 hists=np.array(hists), errors=np.array(errors[2:]))
+
+
+def draw_response_plot(bin_edges, hists, errors, filename="response.pdf"):
+    """
+    Draw histogram comparing the response of the test data and training data
+    in signal and background.
+
+    Parameters
+    ----------
+    bin_edges : array, shape=[bins + 1]
+        Bin edges of the histograms.
+    hists : array, shape=[4, bins]
+        Normalised histograms of the signal test, background test, signal
+        training and background training samples.
+    errors : array, shape=[2, bins]
+        Errors on the signal and background training histograms.
+    filename : string, optional
+        Name of the file the plot is saved to.
+    """
+
     fig, ax = plt.subplots(figsize=(4, 3))
 
     # Plot histograms of test samples
-    ax = x_test_sig.plot.hist(bins=bins, ax=ax, weights=w_test_sig,
-                              normed=True, range=x_range, alpha=0.5,
-                              label="Sig. (test set)")
-    ax = x_test_bkg.plot.hist(bins=bins, ax=ax, weights=w_test_bkg,
-                              normed=True, range=x_range, alpha=0.5,
-                              label="Bkg. (test set)")
+    for hist, label in zip(hists[:2], ("Sig. (test set)", "Bkg. (test set)")):
+        ax.hist(bin_edges[:-1], bins=bin_edges, weights=hist, alpha=0.5,
+                label=label)
 
     plt.gca().set_prop_cycle(None)  # use the same colours again
 
     # Plot error bar plots of training samples
-    for x, label, w in ((x_train_sig, "Sig. (train set)",
-                         w_train_sig),
-                        (x_train_bkg, "Bkg. (train set)",
-                         w_train_bkg)):
-        hist, bin_edges = np.histogram(x, bins=bins, range=x_range,
-                                       weights=w)
-        hist2 = np.histogram(x, bins=bins, range=x_range,
-                             weights=w ** 2)[0]
-        db = np.array(np.diff(bin_edges), float)
-        yerr = np.sqrt(hist2) / db / hist.sum()
-        hist = hist / db / hist.sum()
-        bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2
-
+    bin_centers = (bin_edges[:-1] + bin_edges[1:]) / 2
+    for hist, yerr, label in zip(hists[2:], errors,
+                                 ("Sig. (train set)", "Bkg. (train set)")):
         ax.errorbar(bin_centers, hist, fmt=",", label=label,
-                    yerr=yerr, xerr=(-sub(*x_range) / bins / 2))
+                    yerr=yerr, xerr=np.diff(bin_edges) / 2)
 
     ax.tick_params(axis='x', which='both', labelsize="large")
     ax.legend(fontsize="medium",
@@ -250,10 +672,12 @@ def make_response_plot(x_train_sig, x_test_sig, x_train_bkg, x_test_bkg,
 
     fig.tight_layout()
     fig.savefig(filename, pad_inches=0, bbox_inches="tight")
+    plt.close(fig)
 
 
 def make_roc_curve(mva_response_train, mva_response_test, y_train, y_test,
-                   w_train=None, w_test=None, filename="roc.pdf"):
+                   w_train=None, w_test=None, filename="roc.pdf", bins=10000,
+                   range=(0, 1), max_points=1000, plotter=None):
     """
     Plot the receiver operating characteristic curve for the test and training
     data.
@@ -275,15 +699,32 @@ def make_roc_curve(mva_response_train, mva_response_test, y_train, y_test,
         weighted.
     w_test : array-like, shape = [n_testing_samples], optional
         Weights for df_test. If None, then samples are equally weighted.
+    bins : int, optional
+        Number of bins of the response histograms the curves are computed
+        from.
+    range : (float, float), optional
+        Range of the classifier response.
+    max_points : int, optional
+        Largest number of points drawn for each curve.
+    plotter : Plotter, optional
+        Plotter drawing the plot. If None, it is drawn immediately.
 
     Returns
     -------
     None
+
+    Notes
+    -----
+    See metrics.ROCHistogram for the accuracy of the AUC.
     """
 
-    fpr = {}
-    tpr = {}
-    roc_auc = {}
+    from tact import metrics  # imports scikit-learn, not needed to replot
+
+    plotter = plotter or _SYNC
+    if not plotter.enabled:
+        return
+
+    curves = {}
 
     for i, x in (("train", {"response": mva_response_train,
                             "target": y_train,
@@ -291,16 +732,43 @@ def make_roc_curve(mva_response_train, mva_response_test, y_train, y_test,
                  ("test", {"response": mva_response_test,
                            "target": y_test,
                            "w": w_test})):
-        fpr[i], tpr[i], _ = roc_curve(x["target"], x["response"],
-                                      sample_weight=x["w"])
-        roc_auc[i] = auc(fpr[i], tpr[i], reorder=True)
+        roc = metrics.ROCHistogram(bins, range).fill(x["response"],
+                                                     x["target"], x["w"])
+        curves["fpr_" + i], curves["tpr_" + i] = roc.curve(max_points)
+        curves["auc_" + i] = roc.auc()
+
+    plotter.draw(draw_roc_curve, filename, **curves)
+
+
+def draw_roc_curve(fpr_train, tpr_train, auc_train, fpr_test, tpr_test,
+                   auc_test, filename="roc.pdf"):
+    """
+    Draw receiver operating characteristic curves of the training and test
+    samples.
+
+    Parameters
+    ----------
+    fpr_train, fpr_test : array
+        False positive rates of the training and test samples.
+    tpr_train, tpr_test : array
+        True positive rates of the training and test samples.
+    auc_train, auc_test : float
+        Area under each curve.
+    filename : string, optional
+        Name of the file the plot is saved to.
+
+    Returns
+    -------
+    None
+    """
 
     fig, ax = plt.subplots(figsize=(4, 3))
 
-    for i in fpr:
-        ax.plot(fpr[i], tpr[i],
+    for i, fpr, tpr, roc_auc in (("train", fpr_train, tpr_train, auc_train),
+                                 ("test", fpr_test, tpr_test, auc_test)):
+        ax.plot(fpr, tpr,
                 label="{} set (AUROC = {:0.2f})"
-                .format(i.capitalize(), roc_auc[i]))
+                .format(i.capitalize(), roc_auc))
 
     ax.plot([0, 1], [0, 1], "k--")
 
@@ -318,3 +786,145 @@ def make_roc_curve(mva_response_train, mva_response_test, y_train, y_test,
 
     fig.tight_layout()
     fig.savefig(filename, pad_inches=0, bbox_inches="tight")
+    plt.close(fig)
+
+
+DRAW_FUNCTIONS = {f.__name__: f for f in (draw_variable_histograms,
+                                          draw_correlation_plot,
+                                          draw_response_plot,
+                                          draw_roc_curve)}
+
+
+def bundle_name(filename):
+    """
+    Find the name of the bundle of a figure.
+
+    Parameters
+    ----------
+    filename : string
+        Name of the file the figure is saved to.
+
+    Returns
+    -------
+    string
+        filename with its extension replaced by .npz.
+    """
+
+    return os.path.splitext(filename)[0] + ".npz"
+
+
+def save_bundle(function, filename, **data):
+    """
+    Save the data of a plot next to its figure.
+
+    Parameters
+    ----------
+    function : callable
+        Drawing function, one of DRAW_FUNCTIONS.
+    filename : string
+        Name of the file the figure is saved to.
+    data
+        Arguments of function. Must be arrays, numbers, strings or lists of
+        these, so that they can be loaded without unpickling objects.
+
+    Returns
+    -------
+    None
+    """
+
+    for k, v in data.items():
+        if np.asarray(v).dtype.kind == "O":
+            raise ValueError("Cannot save in a plot bundle: ", k)
+
+    np.savez(bundle_name(filename), plot=function.__name__, filename=filename,
+             **data)
+
+
+def load_bundle(path):
+    """
+    Read the data of a plot saved by save_bundle.
+
+    Parameters
+    ----------
+    path : string
+        Name of the bundle.
+
+    Returns
+    -------
+    function : callable
+        Drawing function.
+    filename : string
+        Name of the file the figure was saved to.
+    data : dict
+        Arguments of function.
+    """
+
+    with np.load(path) as bundle:
+        data = {k: bundle[k] for k in bundle.files}
+
+    try:
+        function = DRAW_FUNCTIONS[str(data.pop("plot"))]
+    except KeyError:
+        raise ValueError("Not a plot bundle: ", path)
+
+    # Restore the numbers, strings and lists of strings stored as arrays
+    for k, v in data.items():
+        if v.dtype.kind in "SU":
+            data[k] = v.tolist()
+        elif v.ndim == 0:
+            data[k] = v.item()
+
+    return function, data.pop("filename"), data
+
+
+def replot(paths, fmt=None, individual=False):
+    """
+    Redraw figures from their bundles.
+
+    Each figure is saved next to its bundle, under the name it was first
+    saved with.
+
+    Parameters
+    ----------
+    paths : list of strings
+        Bundles, or directories in which every bundle is redrawn.
+    fmt : string, optional
+        File format, e.g. "pdf", the figures are saved in. If None, the
+        format they were first saved in is used.
+    individual : bool, optional
+        Whether the histogram of each variable is also saved on its own, see
+        draw_variable_histograms.
+
+    Returns
+    -------
+    list of strings
+        Names of the files the figures are saved to.
+    """
+
+    bundles = []
+    for path in paths:
+        if os.path.isdir(path):
+            # Skip other .npz files, such as saved classifier responses
+            for name in sorted(glob.glob(os.path.join(path, "*.npz"))):
+                with np.load(name) as bundle:
+                    if "plot" in bundle.files:
+                        bundles.append(name)
+        else:
+            bundles.append(path)
+
+    filenames = []
+    for path in bundles:
+        function, filename, data = load_bundle(path)
+
+        filename = os.path.join(os.path.dirname(path),
+                                os.path.basename(filename))
+        if fmt is not None:
+            filename = "{}.{}".format(os.path.splitext(filename)[0], fmt)
+        if function is draw_variable_histograms:
+            data["individual"] = individual
+
+        print("Drawing", filename)
+        function(filename=filename, **data)
+        filenames.append(filename)
+
+    return filenames
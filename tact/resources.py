@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module allocates CPU cores between the stages of tact and the libraries
+they call, so that several jobs can share a node without oversubscribing it.
+
+Thread counts for BLAS and OpenMP are limited both through environment
+variables, which are read by libraries loaded later (e.g. Theano), and by
+calling the runtime thread-setting functions of libraries already loaded into
+the process (e.g. the BLAS used by numpy).
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import ctypes
+import multiprocessing
+import os
+import re
+from multiprocessing import cpu_count
+
+# Runtime functions setting the number of threads used by shared libraries
+THREAD_SETTERS = ((r"openblas", "openblas_set_num_threads"),
+                  (r"libmkl_rt", "MKL_Set_Num_Threads"),
+                  (r"libgomp|libiomp|libomp", "omp_set_num_threads"))
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+                   "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+def available_cores():
+    """
+    Return the number of cores this process may run on.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    int
+        Number of cores in the process' CPU affinity mask if available,
+        otherwise the number of cores in the machine.
+    """
+
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return cpu_count()
+
+
+def can_fork():
+    """
+    Return whether this process may start worker processes.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    bool
+        False in daemonic processes, such as the workers running tact batch,
+        which multiprocessing does not allow to have children.
+    """
+
+    return not multiprocessing.current_process().daemon
+
+
+def loaded_libraries():
+    """
+    Return the paths of shared libraries loaded into the current process.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    set of strings
+        Paths of loaded shared libraries. Empty on systems without
+        /proc/self/maps.
+    """
+
+    try:
+        with open("/proc/self/maps") as f:
+            return {line.split()[-1] for line in f
+                    if re.search(r"\.so(?:\.|$)", line.split()[-1])}
+    except (IOError, OSError):
+        return set()
+
+
+def limit_threads(n):
+    """
+    Limit BLAS and OpenMP libraries to n threads.
+
+    Parameters
+    ----------
+    n : int
+        Maximum number of threads.
+
+    Returns
+    -------
+    limited : list of strings
+        Paths of already-loaded libraries whose thread count was set.
+    """
+
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(n)
+
+    limited = []
+
+    for path in sorted(loaded_libraries()):
+        for pattern, setter in THREAD_SETTERS:
+            if not re.search(pattern, os.path.basename(path)):
+                continue
+            try:
+                getattr(ctypes.CDLL(path), setter)(ctypes.c_int(n))
+            except (OSError, AttributeError):
+                continue
+            limited.append(path)
+
+    return limited
+
+
+def configure(cores=None, classifier_threads=None, blas_threads=None):
+    """
+    Determine the number of cores available to each stage and apply the BLAS
+    and OpenMP thread limits.
+
+    Parameters
+    ----------
+    cores : int, optional
+        Total number of cores tact may use. If None, every core available to
+        the process is used.
+    classifier_threads : int, optional
+        Threads used when training and evaluating classifiers. Defaults to
+        cores.
+    blas_threads : int, optional
+        Threads used by BLAS and OpenMP in numerical libraries. Defaults to
+        cores.
+
+    Returns
+    -------
+    allocation : dict
+        Effective number of cores, threads, or jobs for each of the above.
+
+    Notes
+    -----
+    Stages run one after another, so each may use up to cores threads. Values
+    larger than cores are reduced to cores. Binning runs in a single process,
+    as every strategy bins the one-dimensional response.
+    """
+
+    cores = min(cores or available_cores(), available_cores())
+
+    def budget(n, default):
+        return max(1, min(n or default, cores))
+
+    allocation = {"cores": cores,
+                  "classifier_threads": budget(classifier_threads, cores),
+                  "blas_threads": budget(blas_threads, cores)}
+
+    limited = limit_threads(allocation["blas_threads"])
+
+    print("CPU allocation:")
+    for k in sorted(allocation):
+        print("{0:20} {1}".format(k, allocation[k]))
+    for path in limited:
+        print("Limited threads in", path)
+    print()
+
+    return allocation
+
+
+def with_threads(params, n_jobs):
+    """
+    Add a thread count to the parameters of a classifier.
+
+    Parameters
+    ----------
+    params : dict
+        Keyword arguments of a classifier.
+    n_jobs : int
+        Number of threads, used unless params gives n_jobs itself.
+
+    Returns
+    -------
+    dict
+        Copy of params including n_jobs.
+    """
+
+    return dict({"n_jobs": n_jobs}, **params)
@@ -55,6 +55,13 @@ def makedirs(*paths):
                 raise
 
 
+# Trees already read by this process, keyed by (path, tree, selection). Only
+# used once enabled by preload_trees, so that the data can be shared by the
+# runs of a batch.
+_tree_cache = {}
+_cache_trees = False
+
+
 def read_tree(*args, **kwargs):
     """
     Read a Ttree into a DataFrame
@@ -70,8 +77,43 @@ def read_tree(*args, **kwargs):
     -------
     df : DataFrame
         DataFrame containing data read in from tree.
+
+    Notes
+    -----
+    If trees have been preloaded with preload_trees, and the requested
+    columns of this tree are in the cache, they are copied from there instead
+    of being read from disk. Otherwise the tree is read and, if caching is
+    enabled, added to the cache.
     """
 
+    if _cache_trees and len(args) == 2 and set(kwargs) <= {"columns",
+                                                           "where"}:
+        key = (args[0], args[1], kwargs.get("where"))
+        columns = kwargs.get("columns")
+        cached = _tree_cache.get(key)
+
+        if cached is not None and (columns is None or cached.empty or
+                                   set(columns) <= set(cached.columns)):
+            return cached.copy() if columns is None or cached.empty \
+                else cached[list(columns)].copy()
+
+        # Keep the columns already cached so that other reads still hit
+        if cached is not None and columns is not None and not cached.empty:
+            kwargs = dict(kwargs, columns=sorted(set(columns) |
+                                                 set(cached.columns)))
+
+        df = _read_root(*args, **kwargs)
+        _tree_cache[key] = df
+
+        return (df.copy() if columns is None or df.empty
+                else df[list(columns)].copy())
+
+    return _read_root(*args, **kwargs)
+
+
+def _read_root(*args, **kwargs):
+    """Read a Ttree, returning an empty DataFrame for empty trees"""
+
     # Read ROOT trees into data frames
     try:
         df = read_root(*args, **kwargs)
@@ -81,6 +123,64 @@ def read_tree(*args, **kwargs):
     return df
 
 
+def list_trees(path):
+    """
+    List the names of the Ttrees in a ROOT file.
+
+    Parameters
+    ----------
+    path : string
+        Path to ROOT file.
+
+    Returns
+    -------
+    list of strings
+        Names of the objects in the file.
+    """
+
+    fi = ROOT.TFile(path, "READ")
+    try:
+        return [key.ReadObj().GetName() for key in fi.GetListOfKeys()]
+    finally:
+        fi.Close()
+
+
+def preload_trees(input_dir, columns, selection=None):
+    """
+    Read every Ttree in the ROOT files in a directory into memory, so that
+    later calls to read_tree for those trees are served from memory.
+
+    Parameters
+    ----------
+    input_dir : string
+        Directory containing input ROOT files.
+    columns : iterable of strings
+        Branches to read. Later reads may request any subset of these.
+    selection : string, optional
+        ROOT selection string applied to the trees. Later reads must use the
+        same selection to be served from memory.
+
+    Returns
+    -------
+    None
+
+    Notes
+    -----
+    Preloading before forking worker processes lets every worker share a
+    single copy of the data. Trees already in the cache without some of the
+    requested columns are read again with both sets of columns.
+    """
+
+    global _cache_trees
+    _cache_trees = True
+
+    columns = sorted(set(columns))
+
+    for root_file in sorted(glob.iglob(input_dir + r"*.root")):
+        for tree in list_trees(root_file):
+            read_tree(root_file, tree, columns=columns, where=selection)
+
+
 def balance_weights(w1, w2):
     """
     Balance the weights in two different DataFrames so they sum to the same
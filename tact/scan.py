@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module compares binnings of saved classifier responses.
+
+Each run of tact saves the response of the classifier to every event in
+root_dir/responses_<channel>.npz. The binnings to compare are read from a YAML
+file of the form:
+
+    responses: root/responses_ee.npz
+    workers: 4                  # number of processes (optional)
+    top: 20                     # number of binnings listed (optional)
+    figure_of_merit: asimov     # asimov or s_sqrt_b (optional)
+    strategies: [equal, quantile, recursive_median, recursive_kmeans, optimal]
+    grid:                       # lists of values for root_out options
+        bins: [10, 20, 50]
+        min_background_events: [1, 5, 10]
+        max_background_error: [0.1, 0.3]
+
+Every strategy is tried with every combination of the values of the options
+it uses. Binnings are ranked by the combined expected significance of their
+bins.
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import multiprocessing
+from os.path import expanduser
+
+import numpy as np
+import pandas as pd
+from tact import batch, binning, resources
+from yaml import load
+
+try:
+    from yaml import CLoader as Loader
+except ImportError:
+    from yaml import Loader
+
+_THRESHOLDS = ("min_signal_events", "min_background_events",
+               "max_signal_error", "max_background_error")
+
+# root_out options used by each strategy
+STRATEGY_OPTIONS = {"equal": ("bins",),
+                    "quantile": ("bins",),
+                    "recursive_median": _THRESHOLDS,
+                    "recursive_kmeans": _THRESHOLDS,
+                    "optimal": ("bins", "fine_bins", "figure_of_merit")
+                    + _THRESHOLDS}
+
+# Names of the root_out options as arguments of binning.bin_edges
+_ARGUMENTS = {"bins": "bins",
+              "fine_bins": "fine_bins",
+              "figure_of_merit": "figure_of_merit",
+              "min_signal_events": "s_num_thresh",
+              "min_background_events": "b_num_thresh",
+              "max_signal_error": "s_err_thresh",
+              "max_background_error": "b_err_thresh"}
+
+_scan_state = None
+
+
+def candidates(strategies, grid):
+    """
+    List the binnings given by a set of strategies and a grid of options.
+
+    Parameters
+    ----------
+    strategies : list of strings
+        Binning strategies.
+    grid : dict
+        Map from root_out options to lists of values. Options not used by a
+        strategy are ignored for it, and options missing from grid take their
+        default values.
+
+    Returns
+    -------
+    list of (string, dict)
+        Strategy and options of each binning.
+    """
+
+    cands = []
+    for strategy in strategies:
+        try:
+            options = STRATEGY_OPTIONS[strategy]
+        except KeyError:
+            raise ValueError("Unrecognised value for option 'strategy': ",
+                             strategy)
+        matrix = {k: v for k, v in grid.items() if k in options}
+        for point in batch.expand_matrix(matrix):
+            cands.append((strategy, point))
+
+    return cands
+
+
+def _candidate_edges(cand):
+    """Find the bin edges of one candidate using the data in _scan_state"""
+
+    x, cat, xw, range_ = _scan_state
+    strategy, options = cand
+
+    return binning.bin_edges(
+        x, cat, xw, strategy=strategy, range=range_,
+        **{_ARGUMENTS[k]: v for k, v in options.items()})
+
+
+def scan(x, cat, xw, cands, range=(0, 1), figure_of_merit="asimov",
+         workers=1):
+    """
+    Evaluate the expected significance of several binnings.
+
+    Parameters
+    ----------
+    x : array-like, shape=N
+        Classifier response.
+    cat : 1D array, shape=N
+        Array containing labels describing whether an entry is signal (1 or
+        True) or background (0 or False).
+    xw : array-like, shape=N
+        Event weights.
+    cands : list of (string, dict)
+        Strategy and options of each binning, as returned by candidates.
+    range : (float, float), optional
+        Lower and upper edges of the outermost bins.
+    figure_of_merit : "asimov" or "s_sqrt_b", optional
+        Figure of merit used to rank binnings.
+    workers : int, optional
+        Number of processes used to find the bin edges.
+
+    Returns
+    -------
+    DataFrame
+        Significance, number of bins, smallest signal and background yield in
+        a bin, strategy and options of each binning, ordered by decreasing
+        significance.
+    """
+
+    global _scan_state
+
+    _scan_state = (np.asarray(x), np.asarray(cat), np.asarray(xw), range)
+
+    try:
+        if workers > 1 and len(cands) > 1:
+            pool = multiprocessing.Pool(min(workers, len(cands)))
+            try:
+                edges = pool.map(_candidate_edges, cands, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            edges = [_candidate_edges(cand) for cand in cands]
+
+        significance, min_s, min_b = binning.expected_significance(
+            x, cat, xw, edges, figure_of_merit=figure_of_merit)
+    finally:
+        _scan_state = None
+
+    table = pd.DataFrame(
+        {"significance": significance,
+         "n_bins": [len(e) - 1 for e in edges],
+         "min_signal": min_s,
+         "min_background": min_b,
+         "strategy": [strategy for strategy, _ in cands],
+         "options": [", ".join("{}={}".format(k, options[k])
+                               for k in sorted(options))
+                     for _, options in cands]},
+        columns=["significance", "n_bins", "min_signal", "min_background",
+                 "strategy", "options"])
+
+    table = table.sort_values("significance", ascending=False,
+                              na_position="last", kind="mergesort")
+    table.index = np.arange(1, len(table) + 1)
+    return table
+
+
+def run_scan(f):
+    """
+    Compare the binnings given in a scan file and print them, ranked.
+
+    Parameters
+    ----------
+    f : file
+        YAML scan file.
+
+    Returns
+    -------
+    DataFrame
+        Ranked binnings, as returned by scan.
+    """
+
+    spec = load(f, Loader=Loader)
+
+    responses = np.load(expanduser(spec["responses"]))
+    cands = candidates(spec.get("strategies", sorted(STRATEGY_OPTIONS)),
+                       spec.get("grid") or {})
+
+    workers = spec.get("workers")
+    if workers is None:
+        workers = resources.available_cores()
+
+    print("Comparing", len(cands), "binnings using", workers, "workers")
+
+    table = scan(responses["MVA"], responses["Signal"],
+                 responses["EvtWeight"], cands,
+                 range=tuple(responses["range"]),
+                 figure_of_merit=spec.get("figure_of_merit", "asimov"),
+                 workers=workers)
+
+    print(table.head(spec.get("top", 20)).to_string())
+
+    return table
@@ -0,0 +1,533 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module contains a service evaluating saved classifiers, so that tools
+needing classifier responses do not have to import tact and load a classifier
+for every batch of events.
+
+The service is configured by a YAML file of the form:
+
+    models:                 # name and path of each saved classifier
+        ee: mva/bdt_xgb_ee.pkl
+        mumu: mva/bdt_xgb_mumu.pkl
+    socket: /tmp/tact.sock  # Unix socket to listen on, or
+    port: 5000              # port to listen on at localhost
+    max_batch: 100000       # maximum events evaluated in one call (optional)
+    max_wait: 0.002         # seconds to wait for more requests (optional)
+
+Requests for the same classifier arriving while it is busy, or within max_wait
+of each other, are evaluated together in a single call to evaluate_mva.
+
+Protocol
+--------
+Every integer is unsigned and little-endian. A connection may carry any number
+of requests, each answered before the next is read.
+
+Request:
+    uint8   operation, 0 to evaluate or 1 for statistics
+    uint16  length of the classifier name, followed by the UTF-8 name
+            (may be empty for statistics)
+    For evaluation only:
+    uint8   dtype, ord("f") for float32 or ord("d") for float64
+    uint32  number of events, n
+    uint32  number of features, which must match the classifier
+    n * features little-endian floats of the given dtype, in C order
+
+Response:
+    uint8   status, 0 on success or 1 on error
+    uint32  length of the payload, followed by the payload: n classifier
+            responses in the request dtype, statistics as UTF-8 JSON, or an
+            UTF-8 error message
+"""
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from tact import classifiers
+from yaml import load
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from yaml import CLoader as Loader
+except ImportError:
+    from yaml import Loader
+
+OP_EVALUATE = 0
+OP_STATS = 1
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+DTYPES = {ord("f"): np.dtype("<f4"), ord("d"): np.dtype("<f8")}
+
+# Number of recent requests used to estimate latency percentiles
+LATENCY_WINDOW = 10000
+
+
+def _recv_exactly(sock, n):
+    """Read n bytes from sock, raising EOFError if it is closed first"""
+
+    chunks = []
+    while n:
+        chunk = sock.recv(min(n, 1 << 20))
+        if not chunk:
+            raise EOFError("Connection closed")
+        chunks.append(chunk)
+        n -= len(chunk)
+
+    return b"".join(chunks)
+
+
+def _recv_struct(sock, fmt):
+    """Read and unpack a struct with format fmt from sock"""
+
+    fmt = str(fmt)
+
+    return struct.unpack(fmt, _recv_exactly(sock, struct.calcsize(fmt)))
+
+
+def _send_response(sock, status, payload):
+    """Write a response to sock"""
+
+    sock.sendall(struct.pack(str("<BI"), status, len(payload)) + payload)
+
+
+class Stats(object):
+    """
+    Request counters for a single classifier.
+
+    Attributes
+    ----------
+    requests : int
+        Number of requests answered.
+    events : int
+        Number of events evaluated successfully.
+    batches : int
+        Number of calls made to evaluate_mva.
+    errors : int
+        Number of requests which failed.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.events = 0
+        self.batches = 0
+        self.errors = 0
+        self._latency_sum = 0.
+        self._latency_max = 0.
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def add_request(self, events, latency, error=False):
+        """Record a request of events events answered after latency seconds"""
+
+        with self._lock:
+            self.requests += 1
+            self.errors += error
+            self.events += 0 if error else events
+            self._latency_sum += latency
+            self._latency_max = max(self._latency_max, latency)
+            self._latencies.append(latency)
+
+    def add_batch(self):
+        """Record a call to evaluate_mva"""
+
+        with self._lock:
+            self.batches += 1
+
+    def summary(self, uptime):
+        """
+        Return the counters and derived rates as a dict, given the seconds for
+        which the service has been running.
+        """
+
+        with self._lock:
+            latencies = np.array(self._latencies)
+            summary = {"requests": self.requests,
+                       "events": self.events,
+                       "batches": self.batches,
+                       "errors": self.errors,
+                       "requests_per_second": self.requests / uptime,
+                       "events_per_second": self.events / uptime,
+                       "mean_latency": (self._latency_sum / self.requests
+                                        if self.requests else None),
+                       "max_latency": self._latency_max}
+
+        for q in (50, 90, 99):
+            summary["p{}_latency".format(q)] = (
+                np.percentile(latencies, q) if len(latencies) else None)
+
+        return summary
+
+
+class Model(object):
+    """
+    A loaded classifier with a queue of pending requests, evaluated in
+    batches by a single worker thread.
+
+    Parameters
+    ----------
+    path : string
+        Path to the saved classifier.
+    max_batch : int
+        Requests are added to a batch until it contains at least this many
+        events.
+    max_wait : float
+        Seconds the worker waits for further requests before evaluating a
+        batch.
+
+    Attributes
+    ----------
+    n_features : int or None
+        Number of features expected in each request. Taken from the saved
+        configuration if present, otherwise from the first request evaluated
+        successfully.
+
+    Notes
+    -----
+    A single thread calls the classifier, as not every backend (e.g. Keras)
+    may be called concurrently.
+    """
+
+    def __init__(self, path, max_batch=100000, max_wait=0.002):
+        self.mva, cfg = classifiers.load_classifier(path)
+        self.features = None if cfg is None else cfg["features"]
+        self.n_features = None if cfg is None else len(self.features)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.stats = Stats()
+        self._queue = queue.Queue()
+
+        worker = threading.Thread(target=self._work)
+        worker.daemon = True
+        worker.start()
+
+    def evaluate(self, X):
+        """
+        Evaluate the classifier on X, waiting for the batch containing X to be
+        processed.
+
+        Parameters
+        ----------
+        X : array, shape = [n_samples, n_features]
+            Features of each event.
+
+        Returns
+        -------
+        array, shape = [n_samples]
+            Classifier response of each event.
+        """
+
+        if self.n_features is not None and X.shape[1] != self.n_features:
+            raise ValueError("Expected ", self.n_features,
+                             " features, got ", X.shape[1])
+
+        request = {"X": X, "done": threading.Event()}
+        self._queue.put(request)
+        request["done"].wait()
+
+        if "error" in request:
+            raise request["error"]
+
+        return request["response"]
+
+    def _work(self):
+        """Evaluate queued requests in batches"""
+
+        while True:
+            batch = [self._queue.get()]
+            n = len(batch[0]["X"])
+            deadline = time.time() + self.max_wait
+
+            while n < self.max_batch:
+                try:
+                    request = self._queue.get(
+                        timeout=max(0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                batch.append(request)
+                n += len(request["X"])
+
+            # Until the number of features is known, requests which do not
+            # match the first are failed alone rather than with the batch
+            n_features = batch[0]["X"].shape[1]
+            for r in batch:
+                if r["X"].shape[1] != n_features:
+                    r["error"] = ValueError("Expected ", n_features,
+                                            " features, got ",
+                                            r["X"].shape[1])
+                    r["done"].set()
+            batch = [r for r in batch if "error" not in r]
+
+            try:
+                X = np.concatenate([r["X"] for r in batch])
+                response = np.asarray(classifiers.evaluate_mva(
+                    pd.DataFrame(X, columns=self.features), self.mva))
+                self.stats.add_batch()
+                self.n_features = n_features
+            except Exception as e:
+                for r in batch:
+                    r["error"] = e
+            else:
+                for r, s in zip(batch,
+                                np.split(response, np.cumsum(
+                                    [len(r["X"]) for r in batch])[:-1])):
+                    r["response"] = s
+
+            for r in batch:
+                r["done"].set()
+
+
+class RequestHandler(socketserver.BaseRequestHandler):
+    """Answer requests on a connection until it is closed"""
+
+    def handle(self):
+        while True:
+            try:
+                op, = _recv_struct(self.request, "<B")
+            except EOFError:
+                return
+
+            try:
+                length, = _recv_struct(self.request, "<H")
+                name = _recv_exactly(self.request, length).decode("utf-8")
+
+                if op == OP_STATS:
+                    _send_response(self.request, STATUS_OK,
+                                   json.dumps(self.server.stats(name))
+                                   .encode("utf-8"))
+                elif op == OP_EVALUATE:
+                    self._evaluate(name)
+                else:
+                    raise ValueError("Unrecognised operation: ", op)
+            except EOFError:
+                return
+            except (ValueError, KeyError) as e:
+                # The rest of the request cannot be found, so give up on the
+                # connection
+                _send_response(self.request, STATUS_ERROR,
+                               repr(e).encode("utf-8"))
+                return
+
+    def _evaluate(self, name):
+        """Read the features of an evaluation request and respond"""
+
+        code, n, f = _recv_struct(self.request, "<BII")
+        dtype = DTYPES[code]
+        X = np.frombuffer(_recv_exactly(self.request, n * f * dtype.itemsize),
+                          dtype=dtype).reshape(n, f)
+
+        start = time.time()
+        model = self.server.models[name]
+
+        try:
+            response = model.evaluate(X)
+        except Exception as e:
+            model.stats.add_request(n, time.time() - start, error=True)
+            _send_response(self.request, STATUS_ERROR,
+                           repr(e).encode("utf-8"))
+            return
+
+        payload = response.astype(dtype).tobytes()
+        model.stats.add_request(n, time.time() - start)
+        _send_response(self.request, STATUS_OK, payload)
+
+
+class _Server(object):
+    """Methods shared by the TCP and Unix socket servers"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def stats(self, name=""):
+        """Return the statistics of one or, if name is empty, all models"""
+
+        uptime = time.time() - self.start_time
+
+        if name:
+            return self.models[name].stats.summary(uptime)
+
+        return {"uptime": uptime,
+                "models": {k: m.stats.summary(uptime)
+                           for k, m in self.models.items()}}
+
+
+class TCPServer(_Server, socketserver.ThreadingMixIn, socketserver.TCPServer):
+    pass
+
+
+class UnixServer(_Server, socketserver.ThreadingMixIn,
+                 socketserver.UnixStreamServer):
+    pass
+
+
+def make_server(models, socket_path=None, port=None, max_batch=100000,
+                max_wait=0.002):
+    """
+    Load classifiers and create a server evaluating them.
+
+    Parameters
+    ----------
+    models : dict
+        Map from the name used in requests to the path of each saved
+        classifier.
+    socket_path : string, optional
+        Path of the Unix socket to listen on. Any existing file at this path
+        is removed.
+    port : int, optional
+        Port to listen on at localhost, if socket_path is None. If 0, a free
+        port is chosen.
+    max_batch : int, optional
+        Maximum number of events evaluated at once, unless a single request
+        contains more.
+    max_wait : float, optional
+        Seconds a batch is held open for further requests.
+
+    Returns
+    -------
+    server
+        Server, which should then be run with its serve_forever method.
+    """
+
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixServer(socket_path, RequestHandler)
+    elif port is not None:
+        server = TCPServer(("127.0.0.1", port), RequestHandler)
+    else:
+        raise ValueError("Either a socket path or port is required")
+
+    server.models = {}
+    for name, path in models.items():
+        print("Loading classifier", name, "from", path)
+        server.models[name] = Model(path, max_batch=max_batch,
+                                    max_wait=max_wait)
+    server.start_time = time.time()
+
+    return server
+
+
+def serve(f):
+    """
+    Run the service configured by a YAML file until interrupted.
+
+    Parameters
+    ----------
+    f : file
+        YAML configuration file.
+
+    Returns
+    -------
+    None
+    """
+
+    cfg = load(f, Loader=Loader)
+
+    server = make_server(cfg["models"], socket_path=cfg.get("socket"),
+                         port=cfg.get("port"),
+                         max_batch=cfg.get("max_batch", 100000),
+                         max_wait=cfg.get("max_wait", 0.002))
+
+    print("Listening on", server.server_address)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if cfg.get("socket") is not None:
+            os.remove(cfg["socket"])
+
+
+class Client(object):
+    """
+    Client for the evaluation service.
+
+    Parameters
+    ----------
+    address : string or (string, int)
+        Path of a Unix socket, or host and port.
+    """
+
+    def __init__(self, address):
+        if isinstance(address, tuple):
+            self.sock = socket.create_connection(address)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(address)
+
+    def _request(self, op, name, body=b""):
+        """Send a request and return the response payload"""
+
+        name = name.encode("utf-8")
+        self.sock.sendall(struct.pack(str("<BH"), op, len(name)) + name + body)
+
+        status, length = _recv_struct(self.sock, "<BI")
+        payload = _recv_exactly(self.sock, length)
+
+        if status != STATUS_OK:
+            raise RuntimeError(payload.decode("utf-8"))
+
+        return payload
+
+    def evaluate(self, name, X):
+        """
+        Evaluate a classifier.
+
+        Parameters
+        ----------
+        name : string
+            Name of the classifier.
+        X : array-like, shape = [n_samples, n_features]
+            Features of each event, in the order used to train the classifier.
+            Sent as float32 if of that type, otherwise as float64.
+
+        Returns
+        -------
+        array, shape = [n_samples]
+            Classifier response of each event.
+        """
+
+        X = np.asarray(X)
+        code = ord("f") if X.dtype == np.float32 else ord("d")
+        X = np.ascontiguousarray(X, dtype=DTYPES[code])
+
+        payload = self._request(OP_EVALUATE, name, struct.pack(
+            str("<BII"), code, X.shape[0], X.shape[1]) + X.tobytes())
+
+        return np.frombuffer(payload, dtype=DTYPES[code])
+
+    def stats(self, name=""):
+        """
+        Return request counters for a classifier, or all classifiers if name
+        is empty.
+        """
+
+        return json.loads(self._request(OP_STATS, name).decode("utf-8"))
+
+    def close(self):
+        """Close the connection"""
+
+        self.sock.close()
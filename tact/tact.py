@@ -4,43 +4,261 @@
 mva_analysis.py
 
 Usage:
-    tact config.yaml
-or  tact --stdin < config.yaml
+    tact [--timings] config.yaml
+or  tact [--timings] --stdin < config.yaml
+or  tact [--timings] batch batch.yaml
+or  tact [--timings] serve serve.yaml
+or  tact [--timings] scan-binning scan.yaml
+or  tact [--timings] replot [--format EXT] [--individual] BUNDLE_OR_DIR...
+
+Options:
+    -h, --help  Show this message.
+    --timings   Report the time spent importing modules and in each stage.
 """
 
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import importlib
+import os
 import sys
+import time
+
+from tact import config, resources
+
+
+class Timings(object):
+    """
+    Report the time spent in each stage of a command.
+
+    Each call to lap reports the time since the previous one, if enabled.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.last = time.time()
+
+    def reset(self):
+        """Start timing the next stage now"""
+        self.last = time.time()
+
+    def lap(self, stage):
+        """Report the time spent in stage, which ends now"""
+        now = time.time()
+        if self.enabled:
+            print("Timings: {:<24} {:8.3f} s".format(stage, now - self.last),
+                  file=sys.stderr)
+        self.last = now
+
+
+timings = Timings()
+
+
+def load_plotting():
+    """
+    Import and style matplotlib and the plotting module.
+
+    A non-interactive backend is used when there is no display, unless one is
+    chosen with MPLBACKEND.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    module
+        tact.plotting.
+    """
+
+    import matplotlib as mpl
+    if not os.environ.get("DISPLAY") and "MPLBACKEND" not in os.environ:
+        mpl.use("Agg")
+    import matplotlib.pyplot as plt
+    plt.style.use("seaborn-whitegrid")
+    mpl.rcParams.update({"font.family": "serif",
+                         "pgf.texsystem": "pdflatex",
+                         "pgf.rcfonts": False})
+
+    from tact import plotting as pt
+
+    timings.lap("import plotting")
+    return pt
+
+
+def load_modules():
+    """
+    Import the modules needed to train and evaluate classifiers, including
+    ROOT and matplotlib, reporting the time taken.
+
+    The modules are only loaded into sys.modules, from where run and _run
+    import them again cheaply. Loading them once up front lets batch workers
+    forked afterwards share them.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+
+    for name in ("numpy", "pandas", "sklearn.model_selection", "tact.binning",
+                 "tact.classifiers", "tact.metrics", "tact.preprocessing",
+                 "tact.util"):
+        importlib.import_module(name)
+    timings.lap("import numerical")
+
+    importlib.import_module("tact.rootIO")
+    timings.lap("import ROOT")
+
+    load_plotting()
+
+
+def usage(status=1):
+    """Print the usage message and exit"""
 
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-plt.style.use("seaborn-whitegrid")
-import numpy as np
-import pandas as pd
-from sklearn.model_selection import train_test_split
-from tact import binning, classifiers, config, metrics
-from tact import plotting as pt
-from tact import preprocessing, rootIO
+    print(__doc__.strip(), file=sys.stdout if status == 0 else sys.stderr)
+    sys.exit(status)
 
-mpl.rcParams.update({"font.family": "serif",
-                     "pgf.texsystem": "pdflatex",
-                     "pgf.rcfonts": False})
 
 def main():
+    # Global options are recognised anywhere on the command line
+    if "-h" in sys.argv or "--help" in sys.argv:
+        usage(0)
+    if "--timings" in sys.argv:
+        sys.argv.remove("--timings")
+        timings.enabled = True
+    # Any other options follow the command
+    if len(sys.argv) < 2 or (sys.argv[1] != "--stdin" and
+                             sys.argv[1].startswith("-")):
+        usage()
+    timings.lap("start")
+
+    # Run a batch of configurations
+    if sys.argv[1:2] == ["batch"]:
+        from tact import batch
+        try:
+            with open(sys.argv[2], 'r') as f:
+                cfgs, workers, log_dir = batch.read_batch(f)
+        except IndexError:
+            usage()
+
+        # Workers are forked from this process and share its modules
+        load_modules()
+        failed = batch.run_batch(cfgs, run, workers=workers, log_dir=log_dir)
+        sys.exit(1 if failed else 0)
+
+    # Evaluate saved classifiers on request
+    if sys.argv[1:2] == ["serve"]:
+        from tact import serve
+        timings.lap("import serve")
+        try:
+            with open(sys.argv[2], 'r') as f:
+                serve.serve(f)
+        except IndexError:
+            usage()
+        return
+
+    # Compare binnings of saved responses
+    if sys.argv[1:2] == ["scan-binning"]:
+        from tact import scan
+        timings.lap("import scan")
+        try:
+            with open(sys.argv[2], 'r') as f:
+                scan.run_scan(f)
+        except IndexError:
+            usage()
+        timings.lap("scan binnings")
+        return
+
+    # Redraw plots from their bundles
+    if sys.argv[1:2] == ["replot"]:
+        args = sys.argv[2:]
+        individual = "--individual" in args
+        if individual:
+            args.remove("--individual")
+        fmt = None
+        if "--format" in args:
+            i = args.index("--format")
+            fmt = "".join(args[i + 1:i + 2])
+            del args[i:i + 2]
+        if not args or fmt == "":
+            usage()
+
+        load_plotting().replot(args, fmt=fmt, individual=individual)
+        timings.lap("replot")
+        return
+
     # Read configuration
     try:
-        config.read_config()
+        cfg = config.read_config()
     except IndexError:
-        print(__doc__.strip(), file=sys.stderr)
-        sys.exit(1)
+        usage()
+    timings.lap("read configuration")
 
-    cfg = config.cfg
+    run(cfg)
+
+
+def run(cfg):
+    """
+    Train, evaluate, and apply a classifier.
+
+    Parameters
+    ----------
+    cfg : dict
+        Configuration, as returned by config.make_config.
+
+    Returns
+    -------
+    None
+    """
+
+    timings.reset()
+    load_modules()
+
+    import numpy as np
+    from tact import plotting as pt
 
     np.random.seed(cfg["seed"])
 
+    # Divide cores between stages and limit library thread pools
+    res = resources.configure(**cfg["resources"])
+
+    def with_threads(params):
+        """Add the classifier thread budget unless given explicitly"""
+        return resources.with_threads(params, res["classifier_threads"])
+
+    # Start drawing processes before data are read
+    plotter = pt.Plotter(cfg["plots"])
+
+    try:
+        _run(cfg, plotter, with_threads)
+    except BaseException:
+        # Do not wait for the plots of a failed run
+        plotter.terminate()
+        raise
+
+    plotter.join()
+    timings.lap("finish plots")
+
+
+def _run(cfg, plotter, with_threads):
+    """
+    Body of run, drawing plots with plotter and adding the classifier thread
+    budget to parameters with with_threads.
+    """
+
+    import numpy as np
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+    from tact import binning, classifiers, metrics, preprocessing, rootIO, util
+    from tact import plotting as pt
+
     # Make ouptut directories
-    rootIO.makedirs(cfg["plot_dir"], cfg["root_dir"], cfg["mva_dir"])
+    rootIO.makedirs(cfg["plot_dir"], cfg["root_dir"], cfg["mva_dir"],
+                    *([] if cfg["cache_dir"] is None else [cfg["cache_dir"]]))
 
     # Read samples
     df = rootIO.read_trees(
@@ -48,6 +266,7 @@ def main():
         selection=cfg["selection"],
         negative_weight_treatment=cfg["negative_weight_treatment"],
         equalise_signal=cfg["equalise_signal"])
+    timings.lap("read samples")
 
     features = cfg["features"]
 
@@ -60,23 +279,41 @@ def main():
             preprocessing.add_PCA(pre, **p["config"])
 
     # Make plots
-    sig_df = df[df.Signal == 1]
-    bkg_df = df[df.Signal == 0]
-
     pt.make_variable_histograms(df[features], df.Signal, w=df.EvtWeight,
                                 bins=42, filename="{}vars_{}.pgf"
-                                .format(cfg["plot_dir"], cfg["channel"]))
-    pt.make_corelation_plot(sig_df[features], w=sig_df.MVAWeight,
-                            filename="{}corr_sig_{}.pgf"
-                            .format(cfg["plot_dir"], cfg["channel"]))
-    pt.make_corelation_plot(bkg_df[features], w=bkg_df.MVAWeight,
-                            filename="{}corr_bkg_{}.pgf"
-                            .format(cfg["plot_dir"], cfg["channel"]))
+                                .format(cfg["plot_dir"], cfg["channel"]),
+                                ranges=cfg["plot_ranges"],
+                                range_quantiles=cfg["plot_range_quantiles"],
+                                plotter=plotter)
+    pt.make_correlation_plots(df[features], df.Signal, w=df.MVAWeight,
+                              filename="{}corr_{{}}_{}.pgf"
+                              .format(cfg["plot_dir"], cfg["channel"]),
+                              plotter=plotter)
+    timings.lap("plot variables")
 
     # Split sample
     df_train, df_test = train_test_split(df, test_size=cfg["test_fraction"],
                                          stratify=df.Process)
 
+    # Binned training datasets are cached under a key identifying the training
+    # sample and its preprocessing, which is only reproducible if the split is
+    # seeded. Warm started classifiers bring their own trained preprocessing.
+    cache = None
+    if cfg["cache_dir"] is not None and cfg["seed"] is not None:
+        cache = "{}{}_".format(cfg["cache_dir"], util.cache_key(
+            features, cfg["selection"], cfg["negative_weight_treatment"],
+            cfg["equalise_signal"], cfg["test_fraction"], cfg["seed"],
+            cfg["preprocessors"], cfg["warm_start"], util.file_stats(
+                ["{}histofile_{}.root".format(cfg["input_dir"], p)
+                 for p in cfg["signals"] + cfg["backgrounds"]]
+                + ([] if cfg["warm_start"] is None
+                   else [cfg["warm_start"]]))))
+
+    # Continue training a saved classifier if asked to
+    warm_start = None
+    if cfg["warm_start"] is not None:
+        warm_start = classifiers.load_classifier(cfg["warm_start"])[0]
+
     # Classify
     if cfg["classifier"] == "mlp":
         mva = classifiers.mlp(
@@ -85,46 +322,69 @@ def main():
             model_params=cfg["mlp"]["model_params"],
             early_stopping_params=cfg["mlp"]["early_stopping_params"],
             compile_params=cfg["mlp"]["compile_params"],
-            lr_reduction_params=cfg["mlp"]["lr_reduction_params"])
+            lr_reduction_params=cfg["mlp"]["lr_reduction_params"],
+            validation_split=cfg["mlp"]["validation_split"],
+            warm_start=warm_start, memmap_dir=cfg["cache_dir"])
     elif cfg["classifier"] == "bdt_xgb":
         mva = classifiers.bdt_xgb(df_train[features], pre, df_train.Signal,
                                   sample_weight=df_train.MVAWeight,
-                                  **cfg["bdt_xgb"])
+                                  warm_start=warm_start, cache=cache,
+                                  **with_threads(cfg["bdt_xgb"]))
     elif cfg["classifier"] == "bdt_lgbm":
         mva = classifiers.bdt_lgbm(df_train[features], pre, df_train.Signal,
                                    sample_weight=df_train.MVAWeight,
-                                   **cfg["bdt_lgbm"])
+                                   warm_start=warm_start, cache=cache,
+                                   **with_threads(cfg["bdt_lgbm"]))
+    elif cfg["classifier"] == "bdt_hist":
+        mva = classifiers.bdt_hist(df_train[features], pre, df_train.Signal,
+                                   sample_weight=df_train.MVAWeight,
+                                   warm_start=warm_start,
+                                   **with_threads(cfg["bdt_hist"]))
     elif cfg["classifier"] == "bdt_grad":
         mva = classifiers.bdt_grad(df_train[features], pre, df_train.Signal,
                                    sample_weight=df_train.MVAWeight,
+                                   warm_start=warm_start,
                                    **cfg["bdt_grad"])
     elif cfg["classifier"] == "random_forest":
         mva = classifiers.random_forest(df_train[features], pre,
                                         df_train.Signal,
                                         sample_weight=df_train.MVAWeight,
-                                        **cfg["random_forest"])
+                                        warm_start=warm_start,
+                                        **with_threads(cfg["random_forest"]))
     elif cfg["classifier"] == "load":
-        mva = classifiers.load_classifier(open(cfg["classifier_path"]))[0]
+        mva = classifiers.load_classifier(cfg["classifier_path"])[0]
     else:
         raise ValueError("Unrecognised value for option 'classifier': ",
                          cfg["classifier"])
+    timings.lap("train classifier")
 
     df_test = df_test.assign(MVA=classifiers.evaluate_mva(df_test[features],
                                                           mva))
     df_train = df_train.assign(MVA=classifiers.evaluate_mva(df_train[features],
                                                             mva))
     df = df.assign(MVA=pd.concat((df_train.MVA, df_test.MVA)))
+    timings.lap("evaluate classifier")
 
     # Save trained classifier
     classifiers.save_classifier(mva, cfg, "{}{}_{}".format(cfg["mva_dir"],
                                                            cfg["classifier"],
-                                                           cfg["channel"]))
+                                                           cfg["channel"]),
+                                mmap=cfg["classifier_mmap"])
+    timings.lap("save classifier")
 
     # Metrics
     metrics.print_metrics(mva, df_train[features], df_test[features],
                           df_train.Signal, df_test.Signal,
                           df_train.MVA, df_test.MVA,
-                          df_train.EvtWeight, df_test.EvtWeight)
+                          df_train.EvtWeight, df_test.EvtWeight,
+                          permutation_params=(
+                              with_threads(
+                                  cfg["permutation_importance_params"])
+                              if cfg["permutation_importance"] else None),
+                          bootstrap_params=(
+                              with_threads(cfg["bootstrap_params"])
+                              if cfg["bootstrap_errors"] else None))
+    timings.lap("metrics")
 
     pt.make_response_plot(df_train[df_train.Signal == 1].MVA,
                           df_test[df_test.Signal == 1].MVA,
@@ -135,45 +395,36 @@ def main():
                           df_train[df_train.Signal == 0].EvtWeight,
                           df_test[df_test.Signal == 0].EvtWeight,
                           filename="{}response_{}.pgf".format(cfg["plot_dir"],
-                                                              cfg["channel"]))
+                                                              cfg["channel"]),
+                          plotter=plotter)
     pt.make_roc_curve(df_train.MVA, df_test.MVA,
                       df_train.Signal, df_test.Signal,
                       df_train.EvtWeight, df_test.EvtWeight,
                       filename="{}roc_{}.pgf".format(cfg["plot_dir"],
-                                                     cfg["channel"]))
+                                                     cfg["channel"]),
+                      plotter=plotter)
+    timings.lap("plot response")
 
     # Binning
     def response(x): return classifiers.evaluate_mva(x[features], mva)
     outrange = (0, 1)
 
-    if cfg["root_out"]["strategy"] == "equal":
-        bins = cfg["root_out"]["bins"]
-    elif cfg["root_out"]["strategy"] == "quantile":
-        bins = df.MVA.quantile(np.linspace(0, 1, cfg["root_out"]["bins"] + 1))
-        bins[0] = outrange[0]
-        bins[-1] = outrange[1]
-    elif cfg["root_out"]["strategy"] == "recursive_median":
-        bins = binning.recursive_median(
-            df.MVA, df.Signal, df.EvtWeight,
-            s_num_thresh=cfg["root_out"]["min_signal_events"],
-            b_num_thresh=cfg["root_out"]["min_background_events"],
-            s_err_thresh=cfg["root_out"]["max_signal_error"],
-            b_err_thresh=cfg["root_out"]["max_background_error"])
-        bins[0] = outrange[0]
-        bins[-1] = outrange[1]
-    elif cfg["root_out"]["strategy"] == "recursive_kmeans":
-        _, bins = binning.recursive_kmeans(
-            df.MVA.values.reshape(-1, 1), df.Signal, xw=df.EvtWeight,
-            s_num_thresh=cfg["root_out"]["min_signal_events"],
-            b_num_thresh=cfg["root_out"]["min_background_events"],
-            s_err_thresh=cfg["root_out"]["max_signal_error"],
-            b_err_thresh=cfg["root_out"]["max_background_error"],
-            bin_edges=True, n_jobs=-1)
-        bins[0] = outrange[0]
-        bins[-1] = outrange[1]
-    else:
-        raise ValueError("Unrecognised value for option 'strategy': ",
-                         cfg["root_out"]["strategy"])
+    # Keep the responses so that other binnings can be compared using
+    # tact scan-binning without retraining
+    np.savez("{}responses_{}.npz".format(cfg["root_dir"], cfg["channel"]),
+             MVA=df.MVA.values, Signal=df.Signal.values,
+             EvtWeight=df.EvtWeight.values, range=outrange)
+
+    bins = binning.bin_edges(
+        df.MVA, df.Signal, df.EvtWeight, strategy=cfg["root_out"]["strategy"],
+        bins=cfg["root_out"]["bins"], range=outrange,
+        fine_bins=cfg["root_out"]["fine_bins"],
+        figure_of_merit=cfg["root_out"]["figure_of_merit"],
+        s_num_thresh=cfg["root_out"]["min_signal_events"],
+        b_num_thresh=cfg["root_out"]["min_background_events"],
+        s_err_thresh=cfg["root_out"]["max_signal_error"],
+        b_err_thresh=cfg["root_out"]["max_background_error"])
+    timings.lap("binning")
 
     rootIO.write_root(
         cfg["input_dir"], cfg["features"], response,
@@ -183,6 +434,7 @@ def main():
         channel=cfg["channel"], range=outrange,
         suffix=cfg["root_out"]["suffix"],
         filename="{}mva_{}.root".format(cfg["root_dir"], cfg["channel"]))
+    timings.lap("write ROOT files")
 
 
 if __name__ == "__main__":
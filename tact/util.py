@@ -8,16 +8,114 @@ from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
 import collections
+import hashlib
 import itertools
+import json
+import os
+from array import array
 
 import numpy as np
 
 
 class BinaryTree(object):
+    """
+    Binary tree stored as a list of node values and arrays of child indices.
+
+    Node 0 is the root. Child indices of -1 mark absent children.
+
+    Attributes
+    ----------
+    values : list
+        Value of each node.
+    left, right : array of int
+        Index of the left and right child of each node.
+    """
+
+    __slots__ = ("values", "left", "right")
+
     def __init__(self):
-        self.left = None
-        self.right = None
-        self.val = None
+        self.values = []
+        self.left = array(str("i"))
+        self.right = array(str("i"))
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, val, parent=None, right=False):
+        """
+        Add a node to the tree.
+
+        Parameters
+        ----------
+        val
+            Value of the node.
+        parent : int, optional
+            Index of the node's parent. If None, the node should be the root.
+        right : bool, optional
+            If True, the node is the right child of its parent, otherwise the
+            left.
+
+        Returns
+        -------
+        int
+            Index of the new node.
+        """
+
+        node = len(self.values)
+
+        self.values.append(val)
+        self.left.append(-1)
+        self.right.append(-1)
+
+        if parent is not None:
+            (self.right if right else self.left)[parent] = node
+
+        return node
+
+    def preorder(self):
+        """Return the values of every node, parents before their children"""
+
+        order = []
+        stack = [0] if self.values else []
+
+        while stack:
+            node = stack.pop()
+            order.append(self.values[node])
+            for child in (self.right[node], self.left[node]):
+                if child != -1:
+                    stack.append(child)
+
+        return order
+
+    def inorder(self):
+        """
+        Return the values of every node, with each node after its left
+        subtree and before its right subtree.
+        """
+
+        order = []
+        stack = []
+        node = 0 if self.values else -1
+
+        while stack or node != -1:
+            if node != -1:
+                stack.append(node)
+                node = self.left[node]
+            else:
+                node = stack.pop()
+                order.append(self.values[node])
+                node = self.right[node]
+
+        return order
+
+    def __getstate__(self):
+        return self.values, self.left.tolist(), self.right.tolist()
+
+    def __setstate__(self, state):
+        values, left, right = state
+        self.values = list(values)
+        self.left = array(str("i"), left)
+        self.right = array(str("i"), right)
 
 
 def deep_update(d1, d2):
@@ -48,50 +146,70 @@ def deep_update(d1, d2):
     return d1
 
 
-def nodes(tree):
+def cache_key(*args):
     """
-    Return a list of values at every node of a tree.
+    Return a key uniquely identifying a set of JSON-serialisable arguments.
 
     Parameters
     ----------
-    tree : BinaryTree
-        BinaryTree to extract nodes from.
+    args
+        Values the key should depend on.
 
     Returns
     -------
-    nodelist : list
-        List of values at tree nodes.
+    string
+        Hexadecimal SHA-1 digest of the arguments.
     """
 
-    nodelist = []
+    return hashlib.sha1(json.dumps(args, sort_keys=True, default=repr)
+                        .encode("utf-8")).hexdigest()
 
-    def _get_nodes(tree):
-        """
-        Build up a list of nodes.
 
-        Parameters
-        ----------
-        tree : BinaryTree
-            BinaryTree to extract nodes from.
+def file_stats(paths):
+    """
+    Return the size and modification time of each file in paths, or None for
+    files which do not exist.
 
-        Returns
-        -------
-        None
-        """
+    Parameters
+    ----------
+    paths : list of strings
+        Paths of files.
 
-        nodelist.append(tree.val)
-        try:
-            _get_nodes(tree.left)
-        except AttributeError:
-            nodelist.append(tree.left)
+    Returns
+    -------
+    list
+        (path, size, modification time) for each file.
+    """
+
+    stats = []
+
+    for path in paths:
         try:
-            _get_nodes(tree.right)
-        except AttributeError:
-            nodelist.append(tree.right)
+            st = os.stat(path)
+        except OSError:
+            stats.append((path, None, None))
+        else:
+            stats.append((path, st.st_size, st.st_mtime))
+
+    return stats
+
+
+def nodes(tree):
+    """
+    Return a list of values at every node of a tree.
 
-    _get_nodes(tree)
+    Parameters
+    ----------
+    tree : BinaryTree
+        BinaryTree to extract nodes from.
 
-    return nodelist
+    Returns
+    -------
+    nodelist : list
+        List of values at tree nodes, each node preceding its children.
+    """
+
+    return tree.preorder()
 
 
 def maenumerate(marr):
@@ -168,3 +286,122 @@ def corrcoef(x, y=None, rowvar=True, fweights=None, aweights=None):
         np.clip(c.imag, -1, 1, out=c.imag)
 
     return c
+
+
+class WeightedCovariance(object):
+    """
+    Weighted mean and covariance of a set of variables, accumulated from
+    chunks of observations.
+
+    Parameters
+    ----------
+    n_features : int
+        Number of variables.
+
+    Attributes
+    ----------
+    sum_w, sum_w2 : float
+        Sum of weights and of squared weights.
+    mean : array, shape=[n_features]
+        Weighted mean of each variable.
+    comoment : array, shape=[n_features, n_features]
+        Weighted sum of the products of deviations from the mean.
+
+    Notes
+    -----
+    Each chunk is centred on its own mean before being combined with the
+    accumulated moments using the pairwise update of Chan et al., so that
+    memory use does not depend on the number of observations and precision is
+    not lost to large means. Accumulators of separate chunks or workers can be
+    merged.
+    """
+
+    def __init__(self, n_features):
+        self.sum_w = 0.
+        self.sum_w2 = 0.
+        self.mean = np.zeros(n_features)
+        self.comoment = np.zeros((n_features, n_features))
+
+    def _combine(self, sum_w, sum_w2, mean, comoment):
+        """Add the moments of another set of observations"""
+
+        total = self.sum_w + sum_w
+        if total == 0:
+            return
+
+        delta = mean - self.mean
+        self.comoment += comoment + (np.outer(delta, delta) *
+                                     self.sum_w * sum_w / total)
+        self.mean += delta * sum_w / total
+        self.sum_w = total
+        self.sum_w2 += sum_w2
+
+    def update(self, X, w=None):
+        """
+        Add a chunk of observations.
+
+        Parameters
+        ----------
+        X : array-like, shape=[n_samples, n_features]
+            Observations, one per row.
+        w : array-like, shape=[n_samples], optional
+            Weights of the observations. If None, observations are equally
+            weighted.
+
+        Returns
+        -------
+        self
+        """
+
+        X = np.asarray(X, dtype=np.float64)
+        w = (np.ones(len(X)) if w is None
+             else np.asarray(w, dtype=np.float64))
+
+        sum_w = w.sum()
+        if sum_w == 0:
+            return self
+
+        mean = np.dot(w, X) / sum_w
+        Xc = X - mean
+        self._combine(sum_w, np.dot(w, w), mean,
+                      np.dot(Xc.T * w, Xc))
+
+        return self
+
+    def merge(self, other):
+        """
+        Combine with the accumulator of another set of observations.
+
+        Parameters
+        ----------
+        other : WeightedCovariance
+            Accumulator of the same variables.
+
+        Returns
+        -------
+        WeightedCovariance
+            Accumulator of the observations of both.
+        """
+
+        merged = WeightedCovariance(len(self.mean))
+        merged._combine(self.sum_w, self.sum_w2, self.mean, self.comoment)
+        merged._combine(other.sum_w, other.sum_w2, other.mean, other.comoment)
+        return merged
+
+    def covariance(self):
+        """
+        Return the covariance matrix, normalised as np.cov with aweights.
+        """
+
+        return self.comoment / (self.sum_w - self.sum_w2 / self.sum_w)
+
+    def correlation(self):
+        """
+        Return the matrix of Pearson correlation coefficients.
+        """
+
+        stddev = np.sqrt(np.diag(self.comoment))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            c = self.comoment / stddev[:, None] / stddev[None, :]
+
+        return np.clip(c, -1, 1)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import unittest
+
+from context import tact
+from tact import batch
+
+
+class ExpandMatrixTests(unittest.TestCase):
+    """
+    Tests for batch.expand_matrix
+    """
+
+    def test_product(self):
+        """
+        Check one set of options is made for every combination of values.
+        """
+        overrides = batch.expand_matrix({"classifier": ["bdt_xgb", "mlp"],
+                                         "seed": [1, 2, 3]})
+        self.assertEqual(len(overrides), 6)
+        self.assertEqual(overrides[0], {"classifier": "bdt_xgb", "seed": 1})
+        self.assertEqual(overrides[-1], {"classifier": "mlp", "seed": 3})
+        self.assertEqual(len({(o["classifier"], o["seed"])
+                              for o in overrides}), 6)
+
+    def test_dotted_keys(self):
+        """
+        Check dotted keys give nested options, sharing their parents.
+        """
+        overrides = batch.expand_matrix({"mlp.model_params.epochs": [10],
+                                         "mlp.validation_split": [0.1]})
+        self.assertEqual(overrides, [{"mlp": {"model_params": {"epochs": 10},
+                                              "validation_split": 0.1}}])
+
+    def test_empty(self):
+        """
+        Check an empty matrix gives a single empty set of options.
+        """
+        self.assertEqual(batch.expand_matrix({}), [{}])
+
+
+class ReadBatchTests(unittest.TestCase):
+    """
+    Tests for batch.read_batch
+    """
+
+    def read(self, text):
+        return batch.read_batch(io.StringIO(
+            "base: {input_dir: in/, classifier: mlp}\n" + text))
+
+    def test_runs(self):
+        """
+        Check a run is made for every entry in configs and point in the
+        matrix, each with its own nested options.
+        """
+        cfgs, workers, log_dir = self.read(
+            "workers: 2\n"
+            "configs: [{classifier: bdt_grad, plot_dir: a/, root_dir: a/},\n"
+            "          {classifier: random_forest, plot_dir: b/,\n"
+            "           root_dir: b/}]\n"
+            "matrix: {channel: [ee, mumu], root_out.bins: [5]}\n")
+        self.assertEqual(workers, 2)
+        self.assertIsNone(log_dir)
+        self.assertEqual([(c["classifier"], c["channel"]) for c in cfgs],
+                         [("bdt_grad", "ee"), ("bdt_grad", "mumu"),
+                          ("random_forest", "ee"), ("random_forest", "mumu")])
+        self.assertTrue(all(c["root_out"]["bins"] == 5 for c in cfgs))
+        cfgs[0]["root_out"]["bins"] = 1
+        self.assertEqual(cfgs[1]["root_out"]["bins"], 5)
+
+    def test_documented_example(self):
+        """
+        Check the example in the module docstring gives a run for every
+        channel and matrix point, each writing to its own directories.
+        """
+        cfgs, workers, log_dir = self.read(
+            "workers: 4\n"
+            "log_dir: logs/\n"
+            "configs:\n"
+            "    - channel: ee\n"
+            "      selection: \"Channel == 1\"\n"
+            "    - channel: mumu\n"
+            "      selection: \"Channel == 0\"\n"
+            "matrix:\n"
+            "    classifier: [bdt_xgb, mlp]\n"
+            "    bdt_xgb.n_estimators: [100, 500]\n")
+        self.assertEqual((workers, log_dir), (4, "logs/"))
+        self.assertEqual(len(cfgs), 8)
+        self.assertEqual(cfgs[0]["plot_dir"],
+                         "plots/bdt_xgb.n_estimators=100,classifier=bdt_xgb/")
+        self.assertEqual(cfgs[-1]["mva_dir"],
+                         "mva/bdt_xgb.n_estimators=500,classifier=mlp/")
+        self.assertEqual(cfgs[-1]["bdt_xgb"], {"n_estimators": 500})
+        self.assertEqual(len({c["root_dir"] for c in cfgs}), 4)
+
+    def test_single_point(self):
+        """
+        Check the output directories are unchanged by a matrix with one point.
+        """
+        cfgs, _, _ = self.read("matrix: {seed: [1]}\n")
+        self.assertEqual(cfgs[0]["plot_dir"], "plots/")
+
+    def test_same_output(self):
+        """
+        Check a ValueError is raised if runs would write the same output.
+        """
+        self.assertRaises(ValueError, self.read,
+                          "configs: [{channel: ee}, {channel: ee}]\n")
+        self.assertRaises(ValueError, self.read,
+                          "configs: [{channel: ee, root_dir: a/},\n"
+                          "          {channel: ee, root_dir: a/,\n"
+                          "           plot_dir: b/, mva_dir: b/}]\n")
+
+    def test_different_output(self):
+        """
+        Check runs in the same channel are allowed if their output
+        directories differ.
+        """
+        cfgs, _, _ = self.read(
+            "configs: [{channel: ee},\n"
+            "          {channel: ee, plot_dir: b/, root_dir: b/,\n"
+            "           mva_dir: b/}]\n")
+        self.assertEqual(len(cfgs), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import unittest
+
+import numpy as np
+
+from context import tact
+from tact import binning
+
+np.random.seed(52)
+
+
+class RecursiveMedianTests(unittest.TestCase):
+    """
+    Tests for binning.recursive_median
+    """
+
+    def setUp(self):
+        self.x = np.random.rand(10000)
+        self.cat = np.random.randint(2, size=10000)
+        self.w = np.random.rand(10000)
+
+    def test_bins_meet_thresholds(self):
+        """
+        Check every bin contains enough signal and background.
+        """
+        bins = binning.recursive_median(self.x, self.cat, self.w,
+                                        s_num_thresh=50, b_num_thresh=50)
+        idx = np.digitize(self.x, bins[1:-1])
+
+        for i in range(len(bins) - 1):
+            self.assertGreaterEqual(
+                self.w[(idx == i) & (self.cat == 1)].sum(), 50)
+            self.assertGreaterEqual(
+                self.w[(idx == i) & (self.cat == 0)].sum(), 50)
+
+    def test_splits_at_median(self):
+        """
+        Check the first split is made at the median.
+        """
+        tree = binning._recursive_median_tree(self.x, self.cat, self.w)
+        self.assertEqual(tree.values[0], np.median(self.x))
+
+    def test_no_split(self):
+        """
+        Check only the outer edges are returned if no split is possible.
+        """
+        bins = binning.recursive_median(self.x, self.cat, self.w,
+                                        s_num_thresh=1e6)
+        self.assertEqual(bins, [self.x.min(), self.x.max()])
+
+
+class OptimalTests(unittest.TestCase):
+    """
+    Tests for binning.optimal
+    """
+
+    def setUp(self):
+        self.cat = np.random.randint(2, size=10000)
+        self.x = np.where(self.cat == 1, np.random.beta(5, 2, 10000),
+                          np.random.beta(2, 5, 10000))
+        self.w = np.random.rand(10000)
+
+    def test_better_than_equal_bins(self):
+        """
+        Check the optimal binning is at least as significant as equal-width
+        bins on the same grid, without thresholds.
+        """
+        def significance(edges):
+            s, _ = np.histogram(self.x[self.cat == 1], edges,
+                                weights=self.w[self.cat == 1])
+            b, _ = np.histogram(self.x[self.cat == 0], edges,
+                                weights=self.w[self.cat == 0])
+            return binning.squared_significance(s, b).sum()
+
+        edges = binning.optimal(self.x, self.cat, self.w, bins=5,
+                                fine_bins=50, s_num_thresh=0,
+                                b_num_thresh=0, s_err_thresh=np.inf,
+                                b_err_thresh=np.inf)
+
+        self.assertLessEqual(len(edges), 6)
+        self.assertGreaterEqual(significance(edges),
+                                significance(np.linspace(0, 1, 6)))
+
+    def test_no_binning_meets_thresholds(self):
+        """
+        Check a single bin is returned if no binning meets the thresholds.
+        """
+        np.testing.assert_array_equal(
+            binning.optimal(self.x, self.cat, self.w, s_num_thresh=1e6),
+            [0, 1])
+
+
+class BinEdgesTests(unittest.TestCase):
+    """
+    Tests for binning.bin_edges
+    """
+
+    def test_quantile(self):
+        """
+        Check the quantile strategy gives bins of equal weight, spanning the
+        range.
+        """
+        x = np.random.uniform(0.1, 0.9, size=10000)
+        w = np.random.uniform(0.5, 1.5, size=10000)
+        cat = np.random.randint(2, size=10000)
+
+        edges = binning.bin_edges(x, cat, w, strategy="quantile", bins=5)
+
+        self.assertEqual(len(edges), 6)
+        self.assertEqual((edges[0], edges[-1]), (0, 1))
+        fractions = np.histogram(x, edges, weights=w)[0] / w.sum()
+        np.testing.assert_allclose(fractions, 0.2, atol=1.5 / 10000)
+
+
+class RecursiveKMeansTests(unittest.TestCase):
+    """
+    Tests for binning.recursive_kmeans
+    """
+
+    def setUp(self):
+        self.x = np.random.beta(2, 5, size=2000).reshape(-1, 1)
+        self.cat = np.random.randint(2, size=2000)
+
+    def test_split_at_least_as_good_as_sklearn(self):
+        """
+        Check the first split of one-dimensional data has a within-cluster
+        sum of squares no larger than found by scikit-learn's KMeans, which
+        may converge to a local minimum.
+        """
+        from sklearn.cluster import KMeans
+
+        tree = binning.recursive_kmeans(self.x, self.cat)
+        km = KMeans(n_clusters=2, random_state=52).fit(self.x)
+
+        root = tree.values[0]
+        labels = root.predict(self.x)
+        inertia = sum(((self.x[labels == i] -
+                        root.cluster_centers_[i]) ** 2).sum()
+                      for i in (0, 1))
+
+        self.assertLessEqual(inertia, km.inertia_ * (1 + 1e-12))
+
+    def test_predict_matches_bin_edges(self):
+        """
+        Check predicted clusters are the same as the bins given by the bin
+        edges.
+        """
+        tree, edges = binning.recursive_kmeans(self.x, self.cat,
+                                               s_num_thresh=20,
+                                               b_num_thresh=20,
+                                               bin_edges=True)
+        labels = binning.predict_kmeans_tree(tree, self.x)
+        idx = np.digitize(self.x.ravel(), edges[1:-1])
+
+        self.assertEqual(len(np.unique(labels)), len(edges) - 1)
+        for i in np.unique(idx):
+            self.assertEqual(len(np.unique(labels[idx == i])), 1)
+
+
+class PredictKMeansTreeTests(unittest.TestCase):
+    """
+    Tests for binning.predict_kmeans_tree
+    """
+
+    def test_same_as_walking_tree(self):
+        """
+        Check labels of multi-dimensional data are the same as found by
+        walking the tree one event at a time.
+        """
+        x = np.random.rand(1000, 2)
+        tree = binning.recursive_kmeans(x, np.random.randint(2, size=1000),
+                                        s_num_thresh=30, b_num_thresh=30,
+                                        n_init=1, random_state=52)
+
+        expected = []
+        for event in x:
+            node, depth, label = 0, 0, 0
+            while node != -1:
+                branch = tree.values[node].predict(event.reshape(1, -1))[0]
+                label += branch * 2 ** depth
+                depth += 1
+                node = tree.right[node] if branch else tree.left[node]
+            expected.append(label)
+
+        np.testing.assert_array_equal(binning.predict_kmeans_tree(tree, x),
+                                      expected)
+
+
+class ExpectedSignificanceTests(unittest.TestCase):
+    """
+    Tests for binning.expected_significance
+    """
+
+    def setUp(self):
+        self.x = np.random.rand(10000)
+        self.cat = np.random.randint(2, size=10000)
+        self.w = np.random.rand(10000)
+
+    def test_same_as_histograms(self):
+        """
+        Check each binning gives the significance of its histograms.
+        """
+        edges = [np.linspace(0, 1, 11), np.array([0, 0.2, 0.9, 1]),
+                 binning.bin_edges(self.x, self.cat, self.w,
+                                   strategy="recursive_median")]
+
+        significance, min_s, min_b = binning.expected_significance(
+            self.x, self.cat, self.w, edges)
+
+        for i, e in enumerate(edges):
+            s, _ = np.histogram(self.x[self.cat == 1], bins=e,
+                                weights=self.w[self.cat == 1])
+            b, _ = np.histogram(self.x[self.cat == 0], bins=e,
+                                weights=self.w[self.cat == 0])
+            self.assertAlmostEqual(
+                significance[i],
+                np.sqrt(binning.squared_significance(s, b).sum()))
+            self.assertAlmostEqual(min_s[i], s.min())
+            self.assertAlmostEqual(min_b[i], b.min())
+
+    def test_empty_background_bin(self):
+        """
+        Check binnings with a bin without background are not ranked.
+        """
+        significance, _, _ = binning.expected_significance(
+            self.x, self.cat, self.w, [np.array([0, 0.5, 1, 2])])
+        self.assertTrue(np.isnan(significance[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
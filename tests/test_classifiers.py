@@ -0,0 +1,441 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import copy
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from sklearn.ensemble import (GradientBoostingClassifier,
+                              RandomForestClassifier)
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from context import tact
+from tact import classifiers
+from tact.boosting import HistGradientBoostingClassifier
+
+try:
+    import lightgbm as lgb
+except ImportError:
+    lgb = None
+
+try:
+    import xgboost as xgb
+except ImportError:
+    xgb = None
+
+try:
+    import keras
+except ImportError:
+    keras = None
+
+np.random.seed(52)
+
+
+class FlatForestTests(unittest.TestCase):
+    """
+    Tests for classifiers.FlatForest
+    """
+
+    def setUp(self):
+        self.X = np.random.normal(size=(1000, 4))
+        self.y = (self.X[:, 0] + np.random.normal(size=1000) > 0).astype(int)
+        self.rf = RandomForestClassifier(n_estimators=10, random_state=52)
+        self.rf.fit(self.X, self.y)
+
+    def test_same_probabilities(self):
+        """
+        Check the flattened forest gives the same class probabilities as the
+        original forest.
+        """
+        X = np.random.normal(size=(500, 4))
+        np.testing.assert_allclose(
+            classifiers.FlatForest(self.rf).predict_proba(X),
+            self.rf.predict_proba(X))
+
+    def test_same_predictions(self):
+        """
+        Check the flattened forest predicts the same classes as the original
+        forest.
+        """
+        X = np.random.normal(size=(500, 4))
+        np.testing.assert_array_equal(
+            classifiers.FlatForest(self.rf).predict(X), self.rf.predict(X))
+
+    def test_stump(self):
+        """
+        Check trees consisting of a single leaf are handled.
+        """
+        rf = RandomForestClassifier(n_estimators=2).fit(self.X,
+                                                        np.zeros(1000))
+        np.testing.assert_array_equal(
+            classifiers.FlatForest(rf).predict_proba(self.X), 1)
+
+    def test_warm_start_raises(self):
+        """
+        Check warm starting from a flattened forest raises a ValueError.
+        """
+        mva = make_pipeline(classifiers.FlatForest(self.rf))
+        self.assertRaises(ValueError, classifiers.random_forest, self.X, [],
+                          self.y, warm_start=mva)
+
+
+class FlatGradientBoostingTests(unittest.TestCase):
+    """
+    Tests for classifiers.FlatGradientBoosting
+    """
+
+    def setUp(self):
+        self.X = np.random.normal(size=(1000, 4))
+        self.y = (self.X[:, 0] + np.random.normal(size=1000) > 0).astype(int)
+        self.bdt = GradientBoostingClassifier(n_estimators=20, max_depth=3,
+                                              random_state=52)
+        self.bdt.fit(self.X, self.y)
+
+    def test_same_probabilities(self):
+        """
+        Check the flattened classifier gives the same class probabilities as
+        the original classifier.
+        """
+        X = np.random.normal(size=(500, 4))
+        np.testing.assert_allclose(
+            classifiers.FlatGradientBoosting(self.bdt).predict_proba(X),
+            self.bdt.predict_proba(X))
+
+    def test_flatten_forests(self):
+        """
+        Check flatten_forests flattens a gradient boosted classifier at the
+        end of a pipeline, which then cannot be warm started.
+        """
+        mva = classifiers.flatten_forests(make_pipeline(self.bdt))
+        self.assertIsInstance(mva.steps[-1][1],
+                              classifiers.FlatGradientBoosting)
+        self.assertRaises(ValueError, classifiers.bdt_grad, self.X, [],
+                          self.y, warm_start=mva)
+
+    def test_raises_on_exponential_loss(self):
+        """
+        Check a classifier trained with another loss is not flattened.
+        """
+        bdt = GradientBoostingClassifier(loss="exponential", n_estimators=2)
+        bdt.fit(self.X, self.y)
+        self.assertRaises(ValueError, classifiers.FlatGradientBoosting, bdt)
+
+
+class CachedDatasetTests(unittest.TestCase):
+    """
+    Tests for classifiers.cached_dataset and classifiers.fit_preprocessors
+    """
+
+    class Dataset(object):
+        """Dataset saved as a text file"""
+
+        def __init__(self, data):
+            self.data = data
+
+        def save_binary(self, path):
+            with open(path, "w") as f:
+                f.write(self.data)
+
+        @classmethod
+        def load(cls, path):
+            with open(path) as f:
+                return cls(f.read())
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "dataset.bin")
+        self.constructed = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def construct(self):
+        self.constructed += 1
+        return self.Dataset("binned")
+
+    def test_hit(self):
+        """
+        Check a dataset is only constructed by the first call.
+        """
+        for _ in range(2):
+            dataset = classifiers.cached_dataset(self.path, self.construct,
+                                                 self.Dataset.load)
+            self.assertEqual(dataset.data, "binned")
+        self.assertEqual(self.constructed, 1)
+        self.assertEqual(os.listdir(self.dir), ["dataset.bin"])
+
+    def test_fit_preprocessors(self):
+        """
+        Check preprocessors are fitted in sequence on the transformed data.
+        """
+        X = np.random.normal(3, 2, size=(100, 2))
+        pre = [StandardScaler(), StandardScaler(with_std=False)]
+        Xt = classifiers.fit_preprocessors(pre, X, None)
+        np.testing.assert_allclose(Xt, (X - X.mean(axis=0)) / X.std(axis=0),
+                                   atol=1e-12)
+        np.testing.assert_allclose(pre[1].mean_, 0, atol=1e-12)
+
+
+@unittest.skipIf(lgb is None, "requires lightgbm")
+class LGBMCacheTests(unittest.TestCase):
+    """
+    Tests for the cache option of classifiers.bdt_lgbm
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = os.path.join(self.dir, "sample_")
+        self.X = np.random.normal(size=(500, 3))
+        self.y = (self.X[:, 0] + np.random.normal(size=500) > 0).astype(int)
+        self.params = {"n_estimators": 5, "min_child_samples": 5}
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def train(self, X, **kwargs):
+        """Train with the cache and return the wrapped booster"""
+        return classifiers.bdt_lgbm(X, [], self.y, cache=self.cache,
+                                    **dict(self.params, **kwargs)).steps[-1][1]
+
+    def test_hit(self):
+        """
+        Check a second call loads the saved dataset and trains the same
+        booster.
+        """
+        bdt = self.train(self.X)
+        files = os.listdir(self.dir)
+        mtime = os.path.getmtime(os.path.join(self.dir, files[0]))
+        cached = self.train(self.X)
+        self.assertEqual(os.listdir(self.dir), files)
+        self.assertEqual(
+            os.path.getmtime(os.path.join(self.dir, files[0])), mtime)
+        np.testing.assert_array_equal(cached.predict_proba(self.X),
+                                      bdt.predict_proba(self.X))
+
+    def test_miss(self):
+        """
+        Check changing a parameter affecting binning, or the cache prefix
+        identifying the data, saves a new dataset.
+        """
+        self.train(self.X)
+        self.train(self.X, min_child_samples=10)
+        self.assertEqual(len(os.listdir(self.dir)), 2)
+        self.cache = os.path.join(self.dir, "other_sample_")
+        self.train(self.X[::-1])
+        self.assertEqual(len(os.listdir(self.dir)), 3)
+
+    def test_same_as_estimator(self):
+        """
+        Check the cached booster predicts the same probabilities as
+        LGBMClassifier, and wrapping its booster does too.
+        """
+        plain = lgb.LGBMClassifier(verbose=-1, **self.params).fit(self.X,
+                                                                  self.y)
+        np.testing.assert_allclose(self.train(self.X).predict_proba(self.X),
+                                   plain.predict_proba(self.X))
+        wrapped = classifiers.LGBMBoosterClassifier(plain.booster_)
+        np.testing.assert_allclose(wrapped.predict_proba(self.X),
+                                   plain.predict_proba(self.X))
+        np.testing.assert_array_equal(wrapped.predict(self.X),
+                                      plain.predict(self.X))
+
+
+@unittest.skipIf(xgb is None, "requires xgboost")
+class XGBBoosterTests(unittest.TestCase):
+    """
+    Tests for classifiers.XGBBoosterClassifier
+    """
+
+    def test_same_as_estimator(self):
+        """
+        Check wrapping the booster of an XGBClassifier predicts the same
+        probabilities and classes.
+        """
+        X = np.random.normal(size=(500, 3))
+        y = (X[:, 0] + np.random.normal(size=500) > 0).astype(int)
+        plain = xgb.XGBClassifier(n_estimators=5).fit(X, y)
+        wrapped = classifiers.XGBBoosterClassifier(plain.get_booster(), 3)
+        np.testing.assert_allclose(wrapped.predict_proba(X),
+                                   plain.predict_proba(X), rtol=1e-6)
+        np.testing.assert_array_equal(wrapped.predict(X), plain.predict(X))
+
+
+@unittest.skipIf(keras is None, "requires keras")
+class MLPTests(unittest.TestCase):
+    """
+    Tests for classifiers.mlp
+    """
+
+    def setUp(self):
+        from keras.layers import Dense, serialize
+        from keras.models import Sequential
+
+        self.dir = tempfile.mkdtemp()
+        self.X = np.random.normal(size=(300, 3))
+        self.y = (self.X[:, 0] + np.random.normal(size=300) > 0).astype(int)
+        self.w = np.random.rand(300)
+
+        # Constant initial weights make training reproducible
+        model = Sequential([Dense(4, activation="relu", input_shape=(3,),
+                                  kernel_initializer="ones"),
+                            Dense(1, activation="sigmoid",
+                                  kernel_initializer="ones")])
+        self.model = serialize(model)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def train(self, **kwargs):
+        np.random.seed(52)
+        return classifiers.mlp(
+            self.X, [StandardScaler()], self.y, copy.deepcopy(self.model),
+            sample_weight=self.w,
+            model_params={"epochs": 2, "batch_size": 16, "verbose": 0},
+            compile_params={"loss": "binary_crossentropy",
+                            "optimizer": "sgd"},
+            memmap_dir=self.dir, **kwargs)
+
+    def test_memmap(self):
+        """
+        Check training from the chunked memory map gives the same classifier
+        as training in memory, and the memory map is deleted.
+        """
+        in_memory = self.train(chunk_size=1000)
+        mapped = self.train(chunk_size=70)
+        self.assertEqual(os.listdir(self.dir), [])
+        np.testing.assert_allclose(mapped.predict_proba(self.X),
+                                   in_memory.predict_proba(self.X),
+                                   rtol=1e-5)
+
+    def test_raises_on_validation_data(self):
+        """
+        Check validation_data is rejected in favour of validation_split.
+        """
+        self.assertRaises(ValueError, classifiers.mlp, self.X, [], self.y,
+                          copy.deepcopy(self.model),
+                          model_params={"validation_data": (self.X, self.y)},
+                          compile_params={"loss": "binary_crossentropy",
+                                          "optimizer": "sgd"})
+
+
+class WarmStartTests(unittest.TestCase):
+    """
+    Tests for the warm_start option of classifiers
+    """
+
+    def setUp(self):
+        self.X = np.random.normal(size=(500, 3))
+        self.y = (self.X[:, 0] + np.random.normal(size=500) > 0).astype(int)
+
+    def test_warm_start_steps_copies(self):
+        """
+        Check warm_start_steps returns copies of the steps of the pipeline.
+        """
+        mva = classifiers.random_forest(self.X, [StandardScaler()], self.y,
+                                        n_estimators=3)
+        pre, rf = classifiers.warm_start_steps(mva, RandomForestClassifier)
+        self.assertEqual(len(pre), 1)
+        self.assertIsNot(pre[0], mva.steps[0][1])
+        self.assertIsNot(rf, mva.steps[-1][1])
+        np.testing.assert_array_equal(pre[0].mean_, mva.steps[0][1].mean_)
+
+    def test_warm_start_steps_raises(self):
+        """
+        Check warm_start_steps raises a ValueError if the final estimator is
+        of the wrong class.
+        """
+        mva = classifiers.random_forest(self.X, [], self.y, n_estimators=3)
+        self.assertRaises(ValueError, classifiers.warm_start_steps, mva,
+                          GradientBoostingClassifier)
+
+    def test_random_forest(self):
+        """
+        Check warm starting a forest with n_estimators=k adds k trees and
+        leaves the original untouched.
+        """
+        mva = classifiers.random_forest(self.X, [], self.y, n_estimators=3)
+        warm = classifiers.random_forest(self.X, [], self.y, warm_start=mva,
+                                         n_estimators=2)
+        rf = mva.steps[-1][1]
+        self.assertEqual(len(warm.steps[-1][1].estimators_), 5)
+        self.assertEqual(len(rf.estimators_), 3)
+        self.assertEqual(rf.n_estimators, 3)
+        self.assertFalse(rf.warm_start)
+        for old, new in zip(rf.estimators_, warm.steps[-1][1].estimators_):
+            np.testing.assert_array_equal(old.tree_.threshold,
+                                          new.tree_.threshold)
+
+    def test_bdt_grad(self):
+        """
+        Check warm starting a gradient boosted classifier with n_estimators=k
+        adds k stages and leaves the original untouched.
+        """
+        mva = classifiers.bdt_grad(self.X, [], self.y, n_estimators=3)
+        warm = classifiers.bdt_grad(self.X, [], self.y, warm_start=mva,
+                                    n_estimators=2)
+        bdt = mva.steps[-1][1]
+        self.assertEqual(warm.steps[-1][1].n_estimators_, 5)
+        self.assertEqual(bdt.n_estimators_, 3)
+        self.assertFalse(bdt.warm_start)
+
+
+class HistGradientBoostingTests(unittest.TestCase):
+    """
+    Tests for boosting.HistGradientBoostingClassifier
+    """
+
+    def setUp(self):
+        self.X = np.random.normal(size=(2000, 3))
+        self.y = (self.X[:, 0] > 0).astype(int)
+        self.w = np.random.rand(2000)
+
+    def test_separable(self):
+        """
+        Check a sample separable by a single cut is classified correctly.
+        """
+        bdt = HistGradientBoostingClassifier(n_estimators=20)
+        bdt.fit(self.X, self.y, sample_weight=self.w)
+        self.assertTrue((bdt.predict(self.X) == self.y).mean() > 0.99)
+        self.assertEqual(np.argmax(bdt.feature_importances_), 0)
+
+    def test_warm_start(self):
+        """
+        Check adding stages with warm_start gives the same classifier as
+        training all stages at once.
+        """
+        bdt = HistGradientBoostingClassifier(n_estimators=10)
+        bdt.fit(self.X, self.y, sample_weight=self.w)
+        warm = HistGradientBoostingClassifier(n_estimators=5)
+        warm.fit(self.X, self.y, sample_weight=self.w)
+        warm.set_params(n_estimators=10, warm_start=True)
+        warm.fit(self.X, self.y, sample_weight=self.w)
+        np.testing.assert_allclose(warm.predict_proba(self.X),
+                                   bdt.predict_proba(self.X))
+
+    def test_negative_weights(self):
+        """
+        Check predictions are finite when negative weights take the weighted
+        fraction of signal outside (0, 1), or a class has no weight.
+        """
+        for w in (np.where(self.y == 1, 1., -0.5), self.y.astype(float)):
+            bdt = HistGradientBoostingClassifier(n_estimators=5)
+            bdt.fit(self.X, self.y, sample_weight=w)
+            self.assertTrue(np.isfinite(bdt.init_score_))
+            self.assertTrue(np.isfinite(bdt.predict_proba(self.X)).all())
+
+    def test_raises_on_multiclass(self):
+        """
+        Check a ValueError is raised if there are more than two classes.
+        """
+        self.assertRaises(ValueError, HistGradientBoostingClassifier().fit,
+                          self.X, np.arange(2000) % 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import copy
+import io
+import os
+import sys
+import unittest
+
+from context import tact
+from tact import config
+
+
+class ConfigTests(unittest.TestCase):
+    """
+    Tests for config.make_config, config.load_config and config.read_config
+    """
+
+    def setUp(self):
+        self.defaults = copy.deepcopy(config.DEFAULTS)
+
+    def tearDown(self):
+        self.assertEqual(config.DEFAULTS, self.defaults)
+
+    def test_defaults(self):
+        """
+        Check options not given take their default values, and the defaults
+        are not modified.
+        """
+        cfg = config.make_config({"input_dir": "in/", "channel": "ee",
+                                  "bdt_hist": {"max_depth": 5}})
+        self.assertEqual(cfg["channel"], "ee")
+        self.assertEqual(cfg["bdt_hist"], {"max_depth": 5})
+        self.assertEqual(cfg["test_fraction"],
+                         config.DEFAULTS["test_fraction"])
+        self.assertEqual(cfg["root_out"], config.DEFAULTS["root_out"])
+
+    def test_nested(self):
+        """
+        Check nested options are merged with the defaults of their section.
+        """
+        cfg = config.make_config({"input_dir": "in/",
+                                  "root_out": {"bins": 7}})
+        self.assertEqual(cfg["root_out"]["bins"], 7)
+        self.assertEqual(cfg["root_out"]["strategy"],
+                         config.DEFAULTS["root_out"]["strategy"])
+
+    def test_independent(self):
+        """
+        Check configurations do not share nested dicts with each other or the
+        defaults.
+        """
+        cfg1 = config.load_config(io.StringIO("{input_dir: in/, channel: ee}"))
+        cfg2 = config.load_config(io.StringIO("{input_dir: in/, channel: mm}"))
+        cfg1["root_out"]["bins"] = 3
+        cfg1["mlp"]["model_params"]["epochs"] = 3
+        self.assertIsNot(cfg1["root_out"], cfg2["root_out"])
+        self.assertEqual(cfg2["root_out"]["bins"],
+                         config.DEFAULTS["root_out"]["bins"])
+        self.assertEqual(cfg2["mlp"]["model_params"], {})
+        self.assertEqual(config.cfg["mlp"]["model_params"], {})
+
+    def test_base(self):
+        """
+        Check options are added to a given base configuration, which is not
+        modified.
+        """
+        base = config.make_config({"input_dir": "in/", "channel": "ee",
+                                   "root_out": {"bins": 7}})
+        saved = copy.deepcopy(base)
+        cfg = config.make_config({"root_out": {"strategy": "quantile"}}, base)
+        self.assertEqual(cfg["channel"], "ee")
+        self.assertEqual(cfg["root_out"]["bins"], 7)
+        self.assertEqual(cfg["root_out"]["strategy"], "quantile")
+        self.assertEqual(base, saved)
+
+    def test_paths(self):
+        """
+        Check "~" is expanded in paths.
+        """
+        cfg = config.make_config({"input_dir": "~/in/",
+                                  "plot_dir": "~/plots/",
+                                  "cache_dir": "~/cache/"})
+        self.assertEqual(cfg["input_dir"], os.path.expanduser("~/in/"))
+        self.assertEqual(cfg["plot_dir"], os.path.expanduser("~/plots/"))
+        self.assertEqual(cfg["cache_dir"], os.path.expanduser("~/cache/"))
+
+    def test_read_config(self):
+        """
+        Check read_config returns the configuration read from stdin without
+        modifying the defaults.
+        """
+        argv, stdin = sys.argv, sys.stdin
+        sys.argv = ["tact", "--stdin"]
+        sys.stdin = io.StringIO("{input_dir: in/, seed: 3}")
+        try:
+            cfg = config.read_config()
+        finally:
+            sys.argv, sys.stdin = argv, stdin
+        self.assertEqual(cfg["seed"], 3)
+        self.assertEqual(config.cfg["seed"], config.DEFAULTS["seed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,8 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import io
+import sys
 import unittest
 
 import numpy as np
@@ -77,6 +79,59 @@ class ECDFTests(unittest.TestCase):
         self.assertRaises(ValueError, metrics.ecdf, self.a, -self.w)
 
 
+class ECDFClassTests(unittest.TestCase):
+    """
+    Tests for metrics.ECDF
+    """
+
+    def setUp(self):
+        self.x = np.round(np.random.rand(1000), 2)
+        self.w = np.random.rand(1000)
+        self.v = np.linspace(-0.5, 1.5, 1001)
+
+    def test_merge(self):
+        """
+        Check merging ECDFs of chunks gives the ECDF of the whole sample.
+        """
+        merged = metrics.ECDF(self.x[:300], self.w[:300]).merge(
+            metrics.ECDF(self.x[300:], self.w[300:]))
+        whole = metrics.ECDF(self.x, self.w)
+        np.testing.assert_allclose(merged(self.v), whole(self.v), atol=1e-12)
+        self.assertAlmostEqual(merged.n_eff, whole.n_eff)
+
+    def test_save_load(self):
+        """
+        Check a saved ECDF is loaded unchanged.
+        """
+        f = io.BytesIO()
+        ecdf = metrics.ECDF(self.x, self.w)
+        ecdf.save(f)
+        f.seek(0)
+        loaded = metrics.ECDF.load(f)
+        np.testing.assert_array_equal(loaded(self.v), ecdf(self.v))
+        self.assertEqual(loaded.n_eff, ecdf.n_eff)
+
+    def test_quantile(self):
+        """
+        Check quantiles are the smallest values reaching each probability.
+        """
+        ecdf = metrics.ECDF(np.arange(10))
+        np.testing.assert_array_equal(ecdf.quantile([0, 0.1, 0.15, 1]),
+                                      [0, 0, 1, 9])
+
+    def test_ks_2samp(self):
+        """
+        Check ks_2samp gives the same result for ECDFs and samples.
+        """
+        b = np.random.rand(800)
+        bw = np.random.rand(800)
+        expected = metrics.ks_2samp(self.x, b, self.w, bw)
+        result = metrics.ks_2samp(metrics.ECDF(self.x, self.w),
+                                  metrics.ECDF(b, bw))
+        self.assertAlmostEqual(result[0], expected[0], places=12)
+        self.assertAlmostEqual(result[1], expected[1], places=12)
+
+
 class KS2SampTests(unittest.TestCase):
     """
     Tests for metrics.ks_2samp
@@ -132,6 +187,239 @@ class KS2SampTests(unittest.TestCase):
 
     # TODO create test cases for weighted samples
 
+    def test_ties(self):
+        """
+        Check ECDFs are only compared after all tied observations.
+        """
+        D, _ = metrics.ks_2samp(np.array([0., 1., 1.]), np.array([1., 2.]))
+        self.assertAlmostEqual(D, 0.5)
+
+
+class KS2SampBatchTests(unittest.TestCase):
+    """
+    Tests for metrics.ks_2samp_batch
+    """
+
+    def test_same_as_ks_2samp(self):
+        """
+        Check each group gives the same result as a separate KS test.
+        """
+        a = np.round(np.random.rand(1000), 2)
+        b = np.round(np.random.rand(1200) + 0.05, 2)
+        aw = np.random.rand(1000)
+        bw = np.random.rand(1200)
+        a_groups = np.random.randint(4, size=1000)
+        b_groups = np.random.randint(4, size=1200)
+
+        groups, D, p = metrics.ks_2samp_batch(a, b, a_groups, b_groups,
+                                              aw, bw)
+
+        np.testing.assert_array_equal(groups, np.arange(4))
+        for i in groups:
+            expected = metrics.ks_2samp(a[a_groups == i], b[b_groups == i],
+                                        aw[a_groups == i], bw[b_groups == i])
+            self.assertAlmostEqual(D[i], expected[0], places=12)
+            self.assertAlmostEqual(p[i], expected[1], places=12)
+
+    def test_raises_on_missing_group(self):
+        """
+        Check a ValueError is raised if a group is missing from one sample.
+        """
+        self.assertRaises(ValueError, metrics.ks_2samp_batch,
+                          np.random.rand(10), np.random.rand(10),
+                          np.zeros(10), np.ones(10))
+
+
+class ROCAUCTests(unittest.TestCase):
+    """
+    Tests for metrics.roc_auc
+    """
+
+    def test_sklearn(self):
+        """
+        Check the same value is given as by scikit-learn, for weighted samples
+        with tied responses.
+        """
+        from sklearn.metrics import roc_auc_score
+
+        y = np.random.randint(2, size=1000)
+        score = np.round(np.random.normal(size=1000) + y, 1)
+        w = np.random.rand(1000)
+
+        self.assertAlmostEqual(metrics.roc_auc(y, score, w),
+                               roc_auc_score(y, score, sample_weight=w))
+
+
+class ROCHistogramTests(unittest.TestCase):
+    """
+    Tests for metrics.ROCHistogram
+    """
+
+    def setUp(self):
+        self.y = np.random.randint(2, size=10000)
+        self.score = np.clip(np.random.normal(0.4 + 0.2 * self.y, 0.2), 0, 1)
+        self.w = np.random.rand(10000)
+
+    def test_auc_within_error(self):
+        """
+        Check the AUC is within the error bound of the exact AUC.
+        """
+        roc = metrics.ROCHistogram(bins=100).fill(self.score, self.y, self.w)
+        self.assertLessEqual(
+            abs(roc.auc() - metrics.roc_auc(self.y, self.score, self.w)),
+            roc.auc_error())
+
+    def test_merge(self):
+        """
+        Check merging histograms of chunks gives the histogram of the whole
+        sample.
+        """
+        merged = metrics.ROCHistogram().fill(
+            self.score[:3000], self.y[:3000], self.w[:3000]).merge(
+                metrics.ROCHistogram().fill(
+                    self.score[3000:], self.y[3000:], self.w[3000:]))
+        whole = metrics.ROCHistogram().fill(self.score, self.y, self.w)
+        self.assertAlmostEqual(merged.auc(), whole.auc(), places=12)
+
+    def test_curve(self):
+        """
+        Check the curve has at most max_points points and runs from (0, 0) to
+        (1, 1).
+        """
+        fpr, tpr = metrics.ROCHistogram().fill(self.score, self.y,
+                                               self.w).curve(max_points=50)
+        self.assertLessEqual(len(fpr), 50)
+        self.assertEqual((fpr[0], tpr[0]), (0, 0))
+        self.assertAlmostEqual(fpr[-1], 1)
+        self.assertAlmostEqual(tpr[-1], 1)
+        self.assertTrue((np.diff(fpr) >= 0).all())
+
+    def test_raises_on_empty_class(self):
+        """
+        Check the AUC and curve raise a ValueError if a class has no events
+        or zero total weight.
+        """
+        for roc in (metrics.ROCHistogram().fill(self.score, np.ones(10000)),
+                    metrics.ROCHistogram().fill(self.score, self.y,
+                                                self.w * self.y)):
+            self.assertRaises(ValueError, roc.auc)
+            self.assertRaises(ValueError, roc.auc_error)
+            self.assertRaises(ValueError, roc.curve)
+
+
+class BootstrapTests(unittest.TestCase):
+    """
+    Tests for metrics.bootstrap_auc and metrics.bootstrap_ks_2samp
+    """
+
+    def setUp(self):
+        self.y = np.random.randint(2, size=2000)
+        self.score = np.round(np.random.normal(0.4 + 0.2 * self.y, 0.2), 2)
+        self.w = np.random.rand(2000)
+
+    def replicate_weights(self, n_bootstrap, block_size, random_state):
+        """
+        Multiplicities of the events in each replicate.
+        """
+        return np.concatenate([
+            metrics._poisson_weights(seed, size, len(self.y))
+            for seed, size in metrics._bootstrap_blocks(
+                n_bootstrap, len(self.y), block_size,
+                np.random.RandomState(random_state))])
+
+    def test_auc_replicates(self):
+        """
+        Check the AUC of each replicate is that of the resampled events.
+        """
+        auc = metrics.bootstrap_auc(self.y, self.score, self.w,
+                                    n_bootstrap=7, block_size=5000,
+                                    random_state=1)
+        p = self.replicate_weights(7, 5000, 1)
+        np.testing.assert_allclose(
+            auc, [metrics.roc_auc(self.y, self.score, self.w * pi)
+                  for pi in p], rtol=1e-12)
+
+    def test_ks_replicates(self):
+        """
+        Check the KS test of each replicate is that of the resampled events.
+        """
+        a = self.y == 1
+        D, pvalue = metrics.bootstrap_ks_2samp(
+            self.score[a], self.score[~a], self.w[a], self.w[~a],
+            n_bootstrap=5, block_size=5000, random_state=2)
+        # Replicate weights are those of the events of a followed by b
+        p = self.replicate_weights(5, 5000, 2)
+        expected = np.array([metrics.ks_2samp(
+            self.score[a], self.score[~a], self.w[a] * pi[:a.sum()],
+            self.w[~a] * pi[a.sum():]) for pi in p])
+        np.testing.assert_allclose(D, expected[:, 0], rtol=1e-10)
+        np.testing.assert_allclose(pvalue, expected[:, 1], rtol=1e-8)
+
+    def test_parallel(self):
+        """
+        Check the replicates do not depend on the number of processes.
+        """
+        kwargs = dict(n_bootstrap=10, block_size=4000, random_state=3)
+        np.testing.assert_array_equal(
+            metrics.bootstrap_auc(self.y, self.score, self.w, **kwargs),
+            metrics.bootstrap_auc(self.y, self.score, self.w, n_jobs=2,
+                                  **kwargs))
+
+
+class PermutationImportanceTests(unittest.TestCase):
+    """
+    Tests for metrics.permutation_importance
+    """
+
+    def test_irrelevant_feature(self):
+        """
+        Check a feature not used by the classifier has no importance, and a
+        feature it depends on does.
+        """
+        from sklearn.linear_model import LogisticRegression
+
+        df = pd.DataFrame(np.random.normal(size=(2000, 2)),
+                          columns=["a", "b"])
+        y = (df.a + np.random.normal(size=2000) > 0).astype(int)
+        lr = LogisticRegression().fit(df[["a"]].assign(b=0), y)
+
+        importances, errors = metrics.permutation_importance(
+            lr, df, y, n_bootstrap=10, batch_size=500, random_state=52)
+
+        self.assertGreater(importances[0], 5 * errors[0])
+        self.assertEqual(importances[1], 0)
+
+
+class PrintMetricsTests(unittest.TestCase):
+    """
+    Tests for metrics.print_metrics
+    """
+
+    def test_missing_class(self):
+        """
+        Check the KS test is skipped, rather than failing, for a class
+        missing from one of the samples.
+        """
+        from sklearn.linear_model import LogisticRegression
+
+        X = np.random.normal(size=(400, 2))
+        y = (X[:, 0] > 0).astype(int)
+        lr = LogisticRegression().fit(X, y)
+
+        stdout = sys.stdout
+        sys.stdout = io.StringIO() if sys.version_info[0] > 2 \
+            else io.BytesIO()
+        try:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                metrics.print_metrics(lr, X, X[y == 0], y, y[y == 0],
+                                      bootstrap_params={"n_bootstrap": 5})
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+
+        self.assertIn("No signal events in one of the samples", output)
+        self.assertNotIn("No background events", output)
+
 
 if __name__ == "__main__":
     unittest.main()
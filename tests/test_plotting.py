@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import matplotlib
+matplotlib.use("Agg")
+
+import numpy as np
+import pandas as pd
+from context import tact
+from tact import plotting
+
+np.random.seed(52)
+
+
+class FeatureHistogramsTests(unittest.TestCase):
+    """
+    Tests for plotting.feature_histograms
+    """
+
+    def test_numpy(self):
+        """
+        Check the histograms match numpy's, with a constant column, a range
+        override and NaNs, when computed in chunks.
+        """
+
+        n = 1000
+        df = pd.DataFrame({"a": np.random.normal(size=n),
+                           "b": np.full(n, 3.),
+                           "c": np.random.uniform(-2, 2, size=n)})
+        df.loc[::7, "a"] = np.nan
+        cat = np.random.randint(2, size=n)
+        w = np.random.uniform(size=n)
+        ranges = {"c": (-1, 1)}
+
+        edges, hist_sig, hist_bkg = plotting.feature_histograms(
+            df, cat, w, bins=8, ranges=ranges, chunk_size=300)
+
+        for i, col in enumerate(df.columns):
+            x = df[col].values
+            finite = ~np.isnan(x)
+            lo, hi = ranges.get(col, (np.nanmin(x), np.nanmax(x)))
+            if lo == hi:
+                lo, hi = lo - 0.5, hi + 0.5
+            for label, hist in ((1, hist_sig), (0, hist_bkg)):
+                sel = finite & (cat == label)
+                expected, expected_edges = np.histogram(
+                    x[sel], bins=8, range=(lo, hi), weights=w[sel],
+                    density=True)
+                np.testing.assert_allclose(edges[i], expected_edges)
+                np.testing.assert_allclose(hist[i], expected)
+
+    def test_range_quantiles(self):
+        """
+        Check columns without a range span the given weighted quantiles.
+        """
+
+        from tact.metrics import ECDF
+
+        df = pd.DataFrame({"a": np.random.standard_cauchy(size=1000),
+                           "b": np.random.normal(size=1000)})
+        w = np.random.uniform(size=1000)
+
+        edges, _, _ = plotting.feature_histograms(
+            df, np.random.randint(2, size=1000), w, ranges={"b": (-1, 1)},
+            range_quantiles=(0.01, 0.99))
+
+        np.testing.assert_allclose(
+            edges[0][[0, -1]], ECDF(df.a, w).quantile([0.01, 0.99]))
+        np.testing.assert_allclose(edges[1][[0, -1]], [-1, 1])
+
+
+class PlotterTests(unittest.TestCase):
+    """
+    Tests for plotting.Plotter
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.df = pd.DataFrame(np.random.normal(size=(100, 2)),
+                               columns=["a", "b"])
+        self.cat = np.random.randint(2, size=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def plot(self, plotter):
+        """
+        Request two plots from plotter and wait for them, returning the names
+        of the files written.
+        """
+
+        plotting.make_variable_histograms(
+            self.df, self.cat, filename=os.path.join(self.tmp_dir, "vars.png"),
+            plotter=plotter)
+        plotting.make_correlation_plots(
+            self.df, self.cat,
+            filename=os.path.join(self.tmp_dir, "corr_{}.png"),
+            plotter=plotter)
+        plotter.join()
+
+        return sorted(os.listdir(self.tmp_dir))
+
+    def test_modes(self):
+        """
+        Check plots and their bundles are written in the sync and async modes,
+        and nothing is written when plots are off.
+        """
+
+        expected = ["corr_all.npz", "corr_all.png", "corr_bkg.npz",
+                    "corr_bkg.png", "corr_sig.npz", "corr_sig.png",
+                    "vars.npz", "vars.png"]
+        for mode in ("sync", "async"):
+            self.assertEqual(self.plot(plotting.Plotter(mode)), expected)
+            shutil.rmtree(self.tmp_dir)
+            os.mkdir(self.tmp_dir)
+        self.assertEqual(self.plot(plotting.Plotter("off")), [])
+
+    def test_terminate(self):
+        """
+        Check a Plotter can be terminated, and then joined.
+        """
+
+        plotter = plotting.Plotter("async")
+        plotter.terminate()
+        plotter.join()
+        self.assertRaises(ValueError, plotting.Plotter, "later")
+
+
+class BundleTests(unittest.TestCase):
+    """
+    Tests for plotting.save_bundle, plotting.load_bundle and plotting.replot
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def path(self, *names):
+        return os.path.join(self.tmp_dir, *names)
+
+    def test_replot(self):
+        """
+        Check the bundle of every kind of plot can be redrawn in another
+        format, with the histogram of each variable saved individually.
+        """
+
+        df = pd.DataFrame(np.random.normal(size=(100, 2)),
+                          columns=["a", "b/c"])
+        cat = np.random.randint(2, size=100)
+        x = np.random.uniform(size=(4, 50))
+
+        plotting.make_variable_histograms(df, cat,
+                                          filename=self.path("vars.png"))
+        plotting.make_corelation_plot(df, filename=self.path("corr.png"),
+                                      cmap="RdBu")
+        plotting.make_response_plot(*x, filename=self.path("response.png"))
+        plotting.make_roc_curve(x[0], x[1], np.arange(50) % 2,
+                                np.arange(50) % 2,
+                                filename=self.path("roc.png"))
+        np.savez(self.path("responses.npz"), MVA=x[0])
+
+        function, filename, data = plotting.load_bundle(
+            self.path("corr.npz"))
+        self.assertIs(function, plotting.draw_correlation_plot)
+        self.assertEqual(filename, self.path("corr.png"))
+        self.assertEqual(data["columns"], ["a", "b/c"])
+        self.assertEqual(data["cmap"], "RdBu")
+
+        filenames = plotting.replot([self.tmp_dir], fmt="pdf",
+                                    individual=True)
+
+        expected = [self.path(name) for name in ("corr.pdf", "response.pdf",
+                                                 "roc.pdf", "vars.pdf")]
+        self.assertEqual(filenames, expected)
+        for filename in expected + [self.path("features", "a.pdf"),
+                                    self.path("features", "b_c.pdf")]:
+            self.assertTrue(os.path.isfile(filename), filename)
+        self.assertRaises(ValueError, plotting.load_bundle,
+                          self.path("responses.npz"))
+
+    def test_rejects_objects(self):
+        """
+        Check data which could only be loaded by unpickling are not saved.
+        """
+
+        self.assertRaises(ValueError, plotting.save_bundle,
+                          plotting.draw_correlation_plot,
+                          self.path("corr.png"), corr=np.eye(2),
+                          columns=["a", "b"], cmap=object())
+        self.assertFalse(os.path.exists(self.path("corr.npz")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import unittest
+
+from context import tact
+from tact import resources
+
+
+class ConfigureTests(unittest.TestCase):
+    """
+    Tests for resources.configure
+    """
+
+    def setUp(self):
+        # Pretend to run on a machine with a given number of cores, without
+        # changing the thread limits of this process
+        self.available_cores = resources.available_cores
+        self.limit_threads = resources.limit_threads
+        self.limits = []
+        resources.limit_threads = lambda n: self.limits.append(n) or []
+
+    def tearDown(self):
+        resources.available_cores = self.available_cores
+        resources.limit_threads = self.limit_threads
+
+    def configure(self, available, **kwargs):
+        resources.available_cores = lambda: available
+        return resources.configure(**kwargs)
+
+    def test_defaults(self):
+        """
+        Check every stage may use every available core by default.
+        """
+        for available in (1, 4, 32):
+            self.assertEqual(self.configure(available),
+                             {"cores": available,
+                              "classifier_threads": available,
+                              "blas_threads": available})
+        self.assertEqual(self.limits, [1, 4, 32])
+
+    def test_cores(self):
+        """
+        Check the total is limited to the available cores, and stages
+        default to it.
+        """
+        self.assertEqual(self.configure(8, cores=2),
+                         {"cores": 2, "classifier_threads": 2,
+                          "blas_threads": 2})
+        self.assertEqual(self.configure(2, cores=8)["cores"], 2)
+
+    def test_stage_budgets(self):
+        """
+        Check stage budgets are kept if possible, and reduced to the total
+        otherwise.
+        """
+        allocation = self.configure(16, cores=8, classifier_threads=4,
+                                    blas_threads=32)
+        self.assertEqual(allocation, {"cores": 8, "classifier_threads": 4,
+                                      "blas_threads": 8})
+        self.assertEqual(self.limits, [8])
+        self.assertEqual(self.configure(1, classifier_threads=4),
+                         {"cores": 1, "classifier_threads": 1,
+                          "blas_threads": 1})
+
+
+class ThreadsTests(unittest.TestCase):
+    """
+    Tests for resources.with_threads and resources.limit_threads
+    """
+
+    def test_with_threads(self):
+        """
+        Check the thread count is added unless given explicitly, without
+        changing the parameters.
+        """
+        params = {"max_depth": 3}
+        self.assertEqual(resources.with_threads(params, 4),
+                         {"max_depth": 3, "n_jobs": 4})
+        self.assertEqual(params, {"max_depth": 3})
+        self.assertEqual(resources.with_threads({"n_jobs": 2}, 4),
+                         {"n_jobs": 2})
+
+    def test_environment(self):
+        """
+        Check limit_threads sets the thread count for libraries loaded later.
+        """
+        saved = {var: os.environ.get(var)
+                 for var in resources.THREAD_ENV_VARS}
+        loaded_libraries = resources.loaded_libraries
+        resources.loaded_libraries = set
+        try:
+            self.assertEqual(resources.limit_threads(3), [])
+            for var in resources.THREAD_ENV_VARS:
+                self.assertEqual(os.environ[var], "3")
+        finally:
+            resources.loaded_libraries = loaded_libraries
+            for var, value in saved.items():
+                if value is None:
+                    del os.environ[var]
+                else:
+                    os.environ[var] = value
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+from context import tact
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from tact import classifiers, serve
+
+
+class ServeTests(unittest.TestCase):
+    """
+    Tests for serve.make_server and serve.Client over a Unix socket
+    """
+
+    def setUp(self):
+        np.random.seed(52)
+        X = np.random.normal(size=(200, 3))
+        y = (X[:, 0] + X[:, 1] > 0).astype(int)
+        self.mva = make_pipeline(StandardScaler(), LogisticRegression())
+        self.mva.fit(X, y)
+
+        self.tmp_dir = tempfile.mkdtemp()
+        named = os.path.join(self.tmp_dir, "named")
+        plain = os.path.join(self.tmp_dir, "plain")
+        classifiers.save_classifier(self.mva, {"features": ["a", "b", "c"]},
+                                    named, mmap=True)
+        classifiers.save_classifier(self.mva, None, plain, mmap=True)
+
+        self.socket_path = os.path.join(self.tmp_dir, "tact.sock")
+        self.server = serve.make_server({"named": named + ".joblib",
+                                         "plain": plain + ".joblib"},
+                                        socket_path=self.socket_path,
+                                        max_wait=0.5)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def evaluate_concurrently(self, name, Xs, delays):
+        """
+        Evaluate each of Xs on its own connection after the given delays,
+        returning the response or exception of each.
+        """
+
+        results = [None] * len(Xs)
+
+        def request(i):
+            time.sleep(delays[i])
+            client = serve.Client(self.socket_path)
+            try:
+                results[i] = client.evaluate(name, Xs[i])
+            except Exception as e:
+                results[i] = e
+            finally:
+                client.close()
+
+        threads = [threading.Thread(target=request, args=(i,))
+                   for i in range(len(Xs))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    def test_evaluate(self):
+        """
+        Check responses match the classifier for both float types, and
+        several requests may be made on one connection.
+        """
+
+        X = np.random.normal(size=(20, 3))
+        expected = self.mva.predict_proba(X)[:, 1]
+
+        client = serve.Client(self.socket_path)
+        try:
+            for name in ("named", "plain"):
+                np.testing.assert_allclose(client.evaluate(name, X),
+                                           expected)
+                np.testing.assert_allclose(
+                    client.evaluate(name, X.astype(np.float32)), expected,
+                    rtol=1e-5)
+            stats = client.stats("named")
+        finally:
+            client.close()
+
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["events"], 40)
+        self.assertEqual(stats["errors"], 0)
+
+    def test_batching(self):
+        """
+        Check concurrent requests are evaluated together and each receives
+        its own responses.
+        """
+
+        Xs = [np.random.normal(size=(n, 3)) for n in (1, 5, 10, 20)]
+        results = self.evaluate_concurrently("named", Xs, [0] * len(Xs))
+
+        for X, result in zip(Xs, results):
+            np.testing.assert_allclose(result,
+                                       self.mva.predict_proba(X)[:, 1])
+        stats = self.server.stats("named")
+        self.assertEqual(stats["requests"], 4)
+        self.assertLess(stats["batches"], 4)
+
+    def test_error(self):
+        """
+        Check a request with the wrong number of features receives an error
+        reply, without failing the requests batched with it or closing the
+        connection.
+        """
+
+        for name in ("named", "plain"):
+            Xs = [np.random.normal(size=(10, 3)),
+                  np.random.normal(size=(10, 2)),
+                  np.random.normal(size=(10, 3))]
+            results = self.evaluate_concurrently(name, Xs, [0, 0.1, 0.1])
+
+            self.assertIsInstance(results[1], RuntimeError)
+            for i in (0, 2):
+                np.testing.assert_allclose(
+                    results[i], self.mva.predict_proba(Xs[i])[:, 1])
+            self.assertEqual(self.server.models[name].n_features, 3)
+
+            client = serve.Client(self.socket_path)
+            try:
+                self.assertRaises(RuntimeError, client.evaluate, name,
+                                  np.zeros((1, 4)))
+                self.assertEqual(len(client.evaluate(name, np.zeros((1, 3)))),
+                                 1)
+                self.assertEqual(client.stats(name)["errors"], 2)
+            finally:
+                client.close()
+
+    def test_unknown_model(self):
+        """
+        Check a request for an unknown classifier receives an error reply.
+        """
+
+        client = serve.Client(self.socket_path)
+        try:
+            self.assertRaises(RuntimeError, client.evaluate, "missing",
+                              np.zeros((1, 3)))
+        finally:
+            client.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import subprocess
+import sys
+import unittest
+
+# Runs tact.main with the given arguments, then prints the heavy modules which
+# were imported
+SCRIPT = """
+import sys
+from tact import tact
+try:
+    tact.main()
+finally:
+    print("Imported:", " ".join(m for m in ("ROOT", "sklearn", "matplotlib")
+                                if m in sys.modules))
+"""
+
+
+class CommandLineTests(unittest.TestCase):
+    """
+    Tests for the tact command line
+    """
+
+    def tact(self, *args):
+        """
+        Run tact with args in a new process, returning its exit status and
+        standard output.
+        """
+
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            [os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))]
+            + [p for p in [env.get("PYTHONPATH")] if p])
+        process = subprocess.Popen([sys.executable, "-c", SCRIPT] +
+                                   list(args), stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, env=env)
+        stdout, _ = process.communicate()
+
+        return process.returncode, stdout.decode("utf-8")
+
+    def test_help(self):
+        """
+        Check the help message is shown wherever the option is given, without
+        importing ROOT, scikit-learn or matplotlib.
+        """
+
+        for args in (["--help"], ["-h"], ["--timings", "--help"],
+                     ["replot", "--help"]):
+            status, stdout = self.tact(*args)
+            self.assertEqual(status, 0, args)
+            self.assertTrue(stdout.startswith("mva_analysis.py"), args)
+            self.assertEqual(stdout.splitlines()[-1].strip(), "Imported:",
+                             args)
+
+    def test_usage(self):
+        """
+        Check the usage message is shown, with a nonzero exit status, if
+        arguments are missing or an option is not recognised.
+        """
+
+        for args in ([], ["--timings"], ["--verbose", "config.yaml"]):
+            status, stdout = self.tact(*args)
+            self.assertEqual(status, 1, args)
+            self.assertEqual(stdout.splitlines()[-1].strip(), "Imported:",
+                             args)
+
+
+if __name__ == "__main__":
+    unittest.main()
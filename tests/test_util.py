@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from context import tact
+from tact import util
+
+
+class BinaryTreeTests(unittest.TestCase):
+    """
+    Tests for util.BinaryTree
+    """
+
+    def setUp(self):
+        #     2
+        #    / \
+        #   1   4
+        #  /   / \
+        # 0   3   5
+        self.tree = util.BinaryTree()
+        root = self.tree.add(2)
+        left = self.tree.add(1, root)
+        self.tree.add(0, left)
+        right = self.tree.add(4, root, right=True)
+        self.tree.add(3, right)
+        self.tree.add(5, right, right=True)
+
+    def test_preorder(self):
+        """
+        Check parents are visited before their children, left first.
+        """
+        self.assertEqual(util.nodes(self.tree), [2, 1, 0, 4, 3, 5])
+
+    def test_inorder(self):
+        """
+        Check an in-order traversal of a search tree is sorted.
+        """
+        self.assertEqual(self.tree.inorder(), list(range(6)))
+
+    def test_empty(self):
+        """
+        Check an empty tree has no nodes.
+        """
+        self.assertEqual(util.nodes(util.BinaryTree()), [])
+        self.assertEqual(util.BinaryTree().inorder(), [])
+
+    def test_pickle(self):
+        """
+        Check a tree survives pickling.
+        """
+        tree = pickle.loads(pickle.dumps(self.tree))
+        self.assertEqual(tree.inorder(), self.tree.inorder())
+        self.assertEqual(list(tree.left), list(self.tree.left))
+
+    def test_deep(self):
+        """
+        Check trees deeper than the recursion limit can be traversed.
+        """
+        tree = util.BinaryTree()
+        node = None
+        for i in range(sys.getrecursionlimit() + 10):
+            node = tree.add(i, node, right=True)
+        self.assertEqual(tree.inorder(), util.nodes(tree))
+
+
+class CacheKeyTests(unittest.TestCase):
+    """
+    Tests for util.cache_key and util.file_stats
+    """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "histofile_tZq.root")
+        with open(self.path, "w") as f:
+            f.write("events")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_same_arguments(self):
+        """
+        Check equal arguments give the same key, regardless of dict order.
+        """
+        self.assertEqual(util.cache_key(["a", "b"], {"x": 1, "y": 2}),
+                         util.cache_key(["a", "b"], {"y": 2, "x": 1}))
+
+    def test_different_arguments(self):
+        """
+        Check a change to any argument changes the key.
+        """
+        key = util.cache_key(["a", "b"], {"x": 1})
+        self.assertNotEqual(key, util.cache_key(["a", "c"], {"x": 1}))
+        self.assertNotEqual(key, util.cache_key(["a", "b"], {"x": 2}))
+        self.assertNotEqual(key, util.cache_key(["a", "b"]))
+
+    def test_changed_file(self):
+        """
+        Check changing an input file changes the key of its statistics.
+        """
+        key = util.cache_key(util.file_stats([self.path]))
+        self.assertEqual(key, util.cache_key(util.file_stats([self.path])))
+        with open(self.path, "a") as f:
+            f.write(" and more events")
+        self.assertNotEqual(key, util.cache_key(util.file_stats([self.path])))
+
+    def test_missing_file(self):
+        """
+        Check files which do not exist are given no size or time.
+        """
+        missing = os.path.join(self.dir, "missing.root")
+        self.assertEqual(util.file_stats([missing]), [(missing, None, None)])
+        self.assertEqual(util.file_stats([self.path])[0][:2], (self.path, 6))
+
+
+class WeightedCovarianceTests(unittest.TestCase):
+    """
+    Tests for util.WeightedCovariance
+    """
+
+    def setUp(self):
+        np.random.seed(52)
+        self.X = np.random.normal(size=(5000, 4)) + 1000
+        self.X[:, 1] += self.X[:, 0]
+        self.w = np.random.rand(5000)
+
+    def test_chunks(self):
+        """
+        Check accumulating chunks gives the covariance of the whole sample.
+        """
+        cov = util.WeightedCovariance(4)
+        for start in range(0, 5000, 700):
+            cov.update(self.X[start:start + 700], self.w[start:start + 700])
+        np.testing.assert_allclose(
+            cov.covariance(), np.cov(self.X, rowvar=False, aweights=self.w),
+            rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(
+            cov.correlation(),
+            util.corrcoef(self.X, rowvar=False, aweights=self.w),
+            rtol=1e-9, atol=1e-12)
+
+    def test_merge(self):
+        """
+        Check merging accumulators gives the covariance of both samples.
+        """
+        merged = util.WeightedCovariance(4).update(
+            self.X[:1000], self.w[:1000]).merge(
+                util.WeightedCovariance(4).update(self.X[1000:],
+                                                  self.w[1000:]))
+        np.testing.assert_allclose(
+            merged.covariance(),
+            np.cov(self.X, rowvar=False, aweights=self.w),
+            rtol=1e-9, atol=1e-12)
+
+
+if __name__ == "__main__":
+    unittest.main()